@@ -1,5 +1,4 @@
 import os
-import shutil
 
 from django.contrib import messages
 from django.contrib.auth.decorators import login_required
@@ -11,6 +10,7 @@ from pod.completion.models import Contributor, Document
 from pod.main.utils import display_message_with_icon
 from pod.speaker.models import JobVideo
 from pod.video.models import Video
+from pod.video_encode_transcript.fingerprint import link_file
 
 
 def generate_unique_slug(base_slug: str) -> str:
@@ -31,7 +31,7 @@ def generate_unique_slug(base_slug: str) -> str:
 
 def duplicate_source_file(new_id: int, source_path: str, source_name: str) -> str:
     """
-    Copies the source video file and returns the new file name.
+    Clones or copies the source video file and returns the new file name.
     Args:
         new_id (int): The id of the duplicated video.
         source_path (str): The source path of the initial video.
@@ -48,8 +48,8 @@ def duplicate_source_file(new_id: int, source_path: str, source_name: str) -> st
         new_source_path = os.path.join(os.path.dirname(source_path), new_name)
         # New file name (Ex: videos/xxxx/video_lqweSNT.mp4)
         new_source_name = os.path.join(os.path.dirname(source_name), new_name)
-        # Copy the source file
-        shutil.copyfile(source_path, new_source_path)
+        # Clone the source file on copy-on-write filesystems, else copy it
+        link_file(source_path, new_source_path)
 
         # Return the new file name
         return new_source_name
@@ -2,10 +2,15 @@
 
 from django.core.management.base import BaseCommand
 from pod.live.models import HeartBeat, Event
+from pod.live.utils import get_redis_heartbeat_viewers
+from django.contrib.auth.models import User
+from django.db.models import F
+from django.db.models.functions import Greatest
 from django.utils import timezone
 from django.conf import settings
 
 VIEW_EXPIRATION_DELAY = getattr(settings, "VIEW_EXPIRATION_DELAY", 60)
+USE_REDIS_HEARTBEAT = getattr(settings, "USE_REDIS_HEARTBEAT", False)
 
 
 class Command(BaseCommand):
@@ -27,6 +32,10 @@ class Command(BaseCommand):
             finished_event.viewers.set([])
 
         # Maj des viewers des events en cours
+        if USE_REDIS_HEARTBEAT:
+            self.persist_redis_heartbeats()
+            return
+
         events = Event.objects.all()
 
         for event in events:
@@ -39,3 +48,14 @@ class Command(BaseCommand):
                         users.append(hb.user)
                 event.viewers.set(users)
                 event.save()
+
+    def persist_redis_heartbeats(self):
+        """Save the viewers and max viewers of the current events kept in Redis."""
+        now = timezone.now()
+        events = Event.objects.filter(start_date__lte=now, end_date__gte=now)
+        for event in events:
+            count, user_ids, max_viewers = get_redis_heartbeat_viewers(event.id)
+            event.viewers.set(User.objects.filter(id__in=user_ids))
+            Event.objects.filter(id=event.id).update(
+                max_viewers=Greatest(F("max_viewers"), max_viewers)
+            )
@@ -2,6 +2,7 @@
 
 import json
 from http import HTTPStatus
+from unittest.mock import patch
 
 import httmock
 from django.conf import settings
@@ -37,6 +38,87 @@ PWD = "pod1234pod"  # nosec
 # ggignore-end
 
 
+class FakeRedis:
+    """Minimal in-memory replacement of the Redis commands used for heartbeats."""
+
+    def __init__(self):
+        self.zsets = {}
+        self.hashes = {}
+        self.values = {}
+
+    def pipeline(self):
+        return FakeRedisPipeline(self)
+
+    def zadd(self, key, mapping):
+        self.zsets.setdefault(key, {}).update(mapping)
+
+    def zcount(self, key, minimum, maximum):
+        return len(
+            [score for score in self.zsets.get(key, {}).values() if score >= minimum]
+        )
+
+    def zrangebyscore(self, key, minimum, maximum):
+        limit = float(maximum.strip("("))
+        return [
+            member for member, score in self.zsets.get(key, {}).items() if score < limit
+        ]
+
+    def zremrangebyscore(self, key, minimum, maximum):
+        for member in self.zrangebyscore(key, minimum, maximum):
+            del self.zsets[key][member]
+
+    def zcard(self, key):
+        return len(self.zsets.get(key, {}))
+
+    def hset(self, key, field, value):
+        self.hashes.setdefault(key, {})[field] = str(value).encode()
+
+    def hdel(self, key, *fields):
+        for field in fields:
+            self.hashes.get(key, {}).pop(field, None)
+
+    def hvals(self, key):
+        return list(self.hashes.get(key, {}).values())
+
+    def expire(self, key, seconds):
+        pass
+
+    def get(self, key):
+        return self.values.get(key)
+
+    def set(self, key, value, ex=None):
+        self.values[key] = str(value).encode()
+
+    def delete(self, key):
+        return int(self.values.pop(key, None) is not None)
+
+    def eval(self, script, numkeys, heartbeats_key, max_key, minimum, expiration):
+        """Run the max viewers script of `add_redis_heartbeat`."""
+        count = self.zcount(heartbeats_key, minimum, "+inf")
+        max_viewers = int(self.get(max_key) or 0)
+        if count > max_viewers:
+            max_viewers = count
+            self.set(max_key, count, ex=expiration)
+        return [count, max_viewers]
+
+
+class FakeRedisPipeline:
+    """Pipeline of FakeRedis, running the commands at execute."""
+
+    def __init__(self, redis):
+        self.redis = redis
+        self.commands = []
+
+    def __getattr__(self, name):
+        return lambda *args, **kwargs: self.commands.append((name, args, kwargs))
+
+    def execute(self):
+        return [
+            getattr(self.redis, name)(*args, **kwargs)
+            for name, args, kwargs in self.commands
+        ]
+
+
 class LiveViewsTestCase(TestCase):
     """Test case for Pod Live views."""
 
@@ -349,6 +431,46 @@ class LiveViewsTestCase(TestCase):
         self.assertEqual(eventOne.viewers.count(), 1)  # the anonymous in not set
         print(" --->  test_heartbeat number of logged viewers after command: OK!")
 
+    def test_heartbeat_redis(self):
+        """Test the heartbeats kept in Redis."""
+        redis = FakeRedis()
+        user = User.objects.create(
+            username="randomviewer", first_name="Jean", last_name="Viewer"
+        )
+        heartbeat_url = reverse("live:heartbeat")
+        with patch("pod.live.views.USE_REDIS_HEARTBEAT", True), patch(
+            "pod.live.management.commands.live_viewcounter.USE_REDIS_HEARTBEAT", True
+        ), patch("pod.live.utils.get_redis_connection", return_value=redis):
+            response = self.client.get(
+                "%s?key=anonymous_key&eventid=1" % heartbeat_url,
+                **{"HTTP_X_REQUESTED_WITH": "XMLHttpRequest"},
+            )
+            self.assertEqual(response.json(), {"viewers": 1, "viewers_list": []})
+            self.client.force_login(user)
+            for i in range(2):
+                response = self.client.get(
+                    "%s?key=logged_user_key&eventid=1" % heartbeat_url,
+                    **{"HTTP_X_REQUESTED_WITH": "XMLHttpRequest"},
+                )
+            self.assertEqual(response.json(), {"viewers": 2, "viewers_list": []})
+            # The max viewers are raised in Redis by the script
+            self.assertEqual(list(redis.values.values()), [b"2"])
+            # Nothing written in the database for each heartbeat
+            self.assertFalse(HeartBeat.objects.exists())
+            self.assertEqual(Event.objects.get(id=1).max_viewers, 2)
+            # The anonymous viewer leaves
+            redis.zsets[list(redis.zsets)[0]]["anonymous_key"] -= 3600
+            call_command("live_viewcounter")
+            event = Event.objects.get(id=1)
+            self.assertEqual(list(event.viewers.all()), [user])
+            self.assertEqual(event.max_viewers, 2)
+            response = self.client.get(
+                "%s?key=logged_user_key&eventid=1" % heartbeat_url,
+                **{"HTTP_X_REQUESTED_WITH": "XMLHttpRequest"},
+            )
+            self.assertEqual(response.json()["viewers"], 1)
+        print(" --->  test_heartbeat_redis: OK!")
+
     def test_edit_events(self):
         """Test if event edit works correctly."""
         self.client = Client()
@@ -5,15 +5,18 @@ import logging
 import os
 import os.path
 import re
+import time
 from datetime import datetime
 from time import sleep
 
 import bleach
 from django.conf import settings
 from django.contrib import messages
+from django.core.cache import cache
 from django.core.exceptions import PermissionDenied
 from django.core.mail import EmailMultiAlternatives, mail_managers
 from django.utils.translation import gettext_lazy as _
+from django_redis import get_redis_connection
 
 from pod.main.views import TEMPLATE_VISIBLE_SETTINGS
 
@@ -29,6 +32,8 @@ DEBUG = getattr(settings, "DEBUG", True)
 
 EVENT_CHECK_MAX_ATTEMPT = getattr(settings, "EVENT_CHECK_MAX_ATTEMPT", 10)
 
+VIEW_EXPIRATION_DELAY = getattr(settings, "VIEW_EXPIRATION_DELAY", 60)
+
 logger = logging.getLogger(__name__)
 
 
@@ -265,3 +270,93 @@ def check_permission(request):
     if not (request.user.is_superuser or request.user.has_perm("live.acces_live_pages")):
         messages.add_message(request, messages.ERROR, _("You cannot view this page."))
         raise PermissionDenied
+
+
+def get_heartbeat_keys(event_id) -> tuple:
+    """Return the Redis keys of the heartbeats, viewers and max viewers of an event.
+
+    The heartbeats are a sorted set of the viewer keys, scored by their last
+    heartbeat time, and the viewers a hash of the viewer keys to the user ids.
+    """
+    return (
+        cache.make_key("live_heartbeats:%s" % event_id),
+        cache.make_key("live_viewers:%s" % event_id),
+        cache.make_key("live_max_viewers:%s" % event_id),
+    )
+
+
+# Count the viewers and raise their max number in one atomic step,
+# so that concurrent heartbeats cannot lower it.
+MAX_VIEWERS_SCRIPT = """
+local count = redis.call('zcount', KEYS[1], ARGV[1], '+inf')
+local max_viewers = tonumber(redis.call('get', KEYS[2]) or 0)
+if count > max_viewers then
+    max_viewers = count
+    redis.call('set', KEYS[2], count, 'EX', ARGV[2])
+end
+return {count, max_viewers}
+"""
+
+
+def add_redis_heartbeat(event_id, viewkey, user_id=None) -> tuple:
+    """Save the heartbeat of a viewer of an event in Redis.
+
+    Return the number of viewers of the event, and their max number
+    since the last persistence in the database (see `live_viewcounter`).
+    """
+    heartbeats_key, viewers_key, max_key = get_heartbeat_keys(event_id)
+    now = time.time()
+    # The keys of a finished event expire by themselves.
+    expiration = VIEW_EXPIRATION_DELAY * 10
+    pipe = get_redis_connection("default").pipeline()
+    pipe.zadd(heartbeats_key, {viewkey: now})
+    pipe.expire(heartbeats_key, expiration)
+    if user_id:
+        pipe.hset(viewers_key, viewkey, user_id)
+        pipe.expire(viewers_key, expiration)
+    pipe.eval(
+        MAX_VIEWERS_SCRIPT,
+        2,
+        heartbeats_key,
+        max_key,
+        now - VIEW_EXPIRATION_DELAY,
+        expiration,
+    )
+    *_, (count, max_viewers) = pipe.execute()
+    return int(count), int(max_viewers)
+
+
+def get_redis_heartbeat_count(event_id) -> tuple:
+    """Return the number of viewers of an event in Redis, and their max number."""
+    heartbeats_key, viewers_key, max_key = get_heartbeat_keys(event_id)
+    pipe = get_redis_connection("default").pipeline()
+    pipe.zcount(heartbeats_key, time.time() - VIEW_EXPIRATION_DELAY, "+inf")
+    pipe.get(max_key)
+    count, max_viewers = pipe.execute()
+    return count, max(count, int(max_viewers or 0))
+
+
+def get_redis_heartbeat_viewers(event_id) -> tuple:
+    """Remove the expired heartbeats of an event in Redis.
+
+    Return the number of viewers, the ids of the logged viewers,
+    and the max number of viewers since the last call.
+    """
+    heartbeats_key, viewers_key, max_key = get_heartbeat_keys(event_id)
+    redis = get_redis_connection("default")
+    limit = time.time() - VIEW_EXPIRATION_DELAY
+    expired = redis.zrangebyscore(heartbeats_key, "-inf", "(%s" % limit)
+    pipe = redis.pipeline()
+    pipe.zremrangebyscore(heartbeats_key, "-inf", "(%s" % limit)
+    if expired:
+        pipe.hdel(viewers_key, *expired)
+    pipe.zcard(heartbeats_key)
+    pipe.hvals(viewers_key)
+    pipe.get(max_key)
+    pipe.delete(max_key)
+    *_, count, user_ids, max_viewers, deleted = pipe.execute()
+    return (
+        count,
+        set(int(user_id) for user_id in user_ids),
+        max(count, int(max_viewers or 0)),
+    )
@@ -48,6 +48,8 @@ from .pilotingInterface import (
     CREATE_VIDEO_OPENCAST,
 )
 from .utils import (
+    add_redis_heartbeat,
+    get_redis_heartbeat_count,
     send_email_confirmation,
     get_event_id_and_broadcaster_id,
     check_exists,
@@ -59,6 +61,7 @@ from ..main.views import in_maintenance
 from ..video.models import Video, Type
 
 HEARTBEAT_DELAY = getattr(settings, "HEARTBEAT_DELAY", 45)
+USE_REDIS_HEARTBEAT = getattr(settings, "USE_REDIS_HEARTBEAT", False)
 
 USE_MEETING = getattr(settings, "USE_MEETING", False)
 USE_MEETING_WEBINAR = getattr(settings, "USE_MEETING_WEBINAR", False)
@@ -184,9 +187,12 @@ def manage_heartbeat(broadcaster_id, event_id, key, current_user):
     # Admin's supervision only
     if broadcaster_id is not None:
         # find current event with broadcaster id
-        Event.objects.filter()
-        query = Event.objects.filter(broadcaster_id=broadcaster_id)
-        ids = [evt.id for evt in query if evt.is_current()]
+        now = timezone.now()
+        ids = list(
+            Event.objects.filter(
+                broadcaster_id=broadcaster_id, start_date__lte=now, end_date__gte=now
+            ).values_list("id", flat=True)[:2]
+        )
 
         # no current event
         if len(ids) != 1:
@@ -205,33 +211,49 @@ def manage_heartbeat(broadcaster_id, event_id, key, current_user):
     # save viewer's heartbeat
     if event_id is not None:
         current_event = get_object_or_404(Event, id=event_id)
-        viewer_heartbeat, created = HeartBeat.objects.get_or_create(
-            viewkey=key, event_id=event_id
-        )
-        if created and not current_user.is_anonymous:
-            viewer_heartbeat.user = current_user
-        viewer_heartbeat.last_heartbeat = timezone.now()
-        viewer_heartbeat.save()
-
-    viewers = current_event.viewers.values("first_name", "last_name", "is_superuser")
+        if USE_REDIS_HEARTBEAT:
+            heartbeats_count, max_viewers = add_redis_heartbeat(
+                current_event.id,
+                key,
+                None if current_user.is_anonymous else current_user.id,
+            )
+        else:
+            viewer_heartbeat, created = HeartBeat.objects.get_or_create(
+                viewkey=key, event_id=event_id
+            )
+            if created and not current_user.is_anonymous:
+                viewer_heartbeat.user = current_user
+            viewer_heartbeat.last_heartbeat = timezone.now()
+            viewer_heartbeat.save()
 
     can_see = (
         current_user.is_superuser
         or current_user == current_event.owner
         or current_user in current_event.additional_owners.all()
     )
+    viewers = (
+        current_event.viewers.values("first_name", "last_name", "is_superuser")
+        if can_see
+        else []
+    )
 
-    heartbeats_count = HeartBeat.objects.filter(event_id=current_event.id).count()
+    if not USE_REDIS_HEARTBEAT:
+        heartbeats_count = HeartBeat.objects.filter(event_id=current_event.id).count()
+        max_viewers = heartbeats_count
+    elif event_id is None:
+        heartbeats_count, max_viewers = get_redis_heartbeat_count(current_event.id)
 
-    if current_event.max_viewers < heartbeats_count:
-        current_event.max_viewers = heartbeats_count
-        current_event.save()
+    if current_event.max_viewers < max_viewers:
+        # Only updated when the max is exceeded, without saving the whole event
+        Event.objects.filter(id=current_event.id, max_viewers__lt=max_viewers).update(
+            max_viewers=max_viewers
+        )
 
     return HttpResponse(
         json.dumps(
             {
                 "viewers": heartbeats_count,
-                "viewers_list": list(viewers) if can_see else [],
+                "viewers_list": list(viewers),
             }
         ),
         mimetype,
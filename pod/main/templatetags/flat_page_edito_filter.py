@@ -11,13 +11,14 @@ from django import template
 from django.conf import settings
 from django.contrib.sites.shortcuts import get_current_site
 from django.core.cache import cache
-from django.db.models import Q, Sum
+from django.db.models import F, Q, Sum
 from django.template import loader
 from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
 
 from pod.live.models import Event
 from pod.video.models import Video
+from pod.video.utils import annotate_views
 from pod.playlist.models import PlaylistContent
 
 register = template.Library()
@@ -29,6 +30,7 @@ __DEFAULT_NB_CARD__ = 5
 __DEFAULT_TITLE__ = ""
 
 VIDEO_RECENT_VIEWCOUNT = getattr(settings, "VIDEO_RECENT_VIEWCOUNT", 180)
+USE_VIDEO_VIEW_COUNTERS = getattr(settings, "USE_VIDEO_VIEW_COUNTERS", False)
 EDITO_CACHE_TIMEOUT = getattr(settings, "EDITO_CACHE_TIMEOUT", 300)
 EDITO_CACHE_PREFIX = getattr(settings, "EDITO_CACHE_PREFIX", "edito_cache_")
 
@@ -235,13 +237,31 @@ def render_most_view(uniq_id, params, current_site, debug_elts):
     """Render block with most view videos."""
     debug_elts.append("Call function render_most_view")
 
-    d = date.today() - timezone.timedelta(days=VIDEO_RECENT_VIEWCOUNT)
-    query = Video.objects.filter(
-        Q(encoding_in_progress=False)
-        & Q(is_draft=False)
-        & Q(viewcount__date__gte=d)
-        & Q(sites=current_site)
-    ).annotate(nombre=Sum("viewcount"))
+    if USE_VIDEO_VIEW_COUNTERS:
+        # Sorted on the recent views counter of the videos
+        query = (
+            annotate_views(
+                Video.objects.filter(
+                    Q(encoding_in_progress=False)
+                    & Q(is_draft=False)
+                    & Q(sites=current_site)
+                )
+            )
+            .filter(view_counter__recent_views__gt=0)
+            .annotate(nombre=F("view_counter__recent_views"))
+        )
+    else:
+        d = date.today() - timezone.timedelta(days=VIDEO_RECENT_VIEWCOUNT)
+        query = (
+            Video.objects.filter(
+                Q(encoding_in_progress=False)
+                & Q(is_draft=False)
+                & Q(viewcount__date__gte=d)
+                & Q(sites=current_site)
+            )
+            .annotate(nombre=Sum("viewcount__count"))
+            .annotate(recent_views_count=F("nombre"))
+        )
 
     query = add_filter(params, debug_elts, query)
 
@@ -337,8 +357,10 @@ def render_last_view(uniq_id, params, current_site, debug_elts):
     """Render block with last view videos."""
     debug_elts.append("Call function render_last_view")
 
-    query = Video.objects.filter(
-        Q(encoding_in_progress=False) & Q(is_draft=False) & Q(sites=current_site)
+    query = annotate_views(
+        Video.objects.filter(
+            Q(encoding_in_progress=False) & Q(is_draft=False) & Q(sites=current_site)
+        )
     )
 
     query = add_filter(params, debug_elts, query)
@@ -1,14 +1,15 @@
 """Esup-Pod playlists signals."""
 
 from django.contrib.sites.models import Site
-from django.db.models.signals import m2m_changed
+from django.db.models.signals import m2m_changed, post_delete, post_save
 from django.dispatch import receiver
 from django.utils.translation import gettext_lazy as _
 
 from pod.authentication.models import Owner
+from pod.video.view_count import add_playlist_content_stats
 
 from .apps import FAVORITE_PLAYLIST_NAME
-from .models import Playlist
+from .models import Playlist, PlaylistContent
 
 
 @receiver(m2m_changed, sender=Owner.sites.through)
@@ -33,3 +34,16 @@ def update_favorite_playlist(sender, instance, action, reverse, model, pk_set, *
                     editable=False,
                     site=site,
                 )
+
+
+@receiver(post_save, sender=PlaylistContent)
+def count_playlist_content_addition(sender, instance, created, **kwargs):
+    """Count the addition of a video in a playlist in the video statistics."""
+    if created:
+        add_playlist_content_stats(instance)
+
+
+@receiver(post_delete, sender=PlaylistContent)
+def count_playlist_content_removal(sender, instance, **kwargs):
+    """Remove a video removed from a playlist from the video statistics."""
+    add_playlist_content_stats(instance, -1)
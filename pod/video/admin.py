@@ -23,6 +23,7 @@ from .models import VideoVersion
 from .models import Category, VideoAccessToken
 
 
+from .utils import annotate_views
 from .forms import VideoForm, VideoVersionForm
 from .forms import ChannelForm
 from .forms import ThemeForm
@@ -244,7 +245,7 @@ class VideoAdmin(admin.ModelAdmin):
                 transcript_video(item.id)
 
     def get_queryset(self, request):
-        qs = super().get_queryset(request)
+        qs = annotate_views(super().get_queryset(request))
         if not request.user.is_superuser:
             qs = qs.filter(sites=get_current_site(request))
         return qs
@@ -18,6 +18,7 @@ import csv
 import os
 
 from pod.video.models import Video, VideoToDelete
+from pod.video.utils import annotate_views
 
 from datetime import date, timedelta
 
@@ -141,9 +142,11 @@ class Command(BaseCommand):
 
     def get_video_archived_deleted_treatment(self):  # tuple[dict, dict]
         """Get video with deadline out of time and delete them."""
-        vids = Video.objects.filter(
-            sites=get_current_site(None), date_delete__lt=date.today()
-        ).exclude(owner__username=ARCHIVE_OWNER_USERNAME)
+        vids = annotate_views(
+            Video.objects.filter(
+                sites=get_current_site(None), date_delete__lt=date.today()
+            ).exclude(owner__username=ARCHIVE_OWNER_USERNAME)
+        )
 
         list_video_deleted_by_establishment = {}
         list_video_deleted_by_establishment.setdefault("other", {})
@@ -19,6 +19,7 @@ from django.utils.translation import activate
 from django.utils.translation import gettext as _
 
 from pod.video.models import Video, Notes, AdvancedNotes, Comment, ViewCount
+from pod.video.utils import annotate_views
 from pod.chapter.models import Chapter
 from pod.completion.models import Contributor, Document, Overlay, Track
 from pod.enrichment.models import Enrichment
@@ -232,9 +233,11 @@ class Command(BaseCommand):
         csv_data = read_archived_csv()
 
         # Get videos
-        vids = Video.objects.filter(
-            owner__username=ARCHIVE_OWNER_USERNAME,
-            date_delete__lte=datetime.now() - timedelta(days=ARCHIVE_HOW_MANY_DAYS),
+        vids = annotate_views(
+            Video.objects.filter(
+                owner__username=ARCHIVE_OWNER_USERNAME,
+                date_delete__lte=datetime.now() - timedelta(days=ARCHIVE_HOW_MANY_DAYS),
+            )
         )
 
         print(
@@ -0,0 +1,29 @@
+"""Esup-Pod command to write the buffered view counts in the database."""
+
+from django.core.management.base import BaseCommand
+
+from pod.video import view_count
+
+
+class Command(BaseCommand):
+    """Write the view counts buffered in Redis in the ViewCount table.
+
+    To be run periodically by cron when VIEW_COUNT_BUFFER is "redis",
+    e.g. every minute.
+    """
+
+    help = "Write the buffered view counts in the database."
+
+    def handle(self, *args, **options) -> None:
+        """Flush the view counts buffer."""
+        if view_count.VIEW_COUNT_BUFFER != "redis":
+            # The views counted in memory are only reachable by their process
+            self.stdout.write(
+                self.style.WARNING(
+                    "Nothing to flush: the views are only buffered with "
+                    'VIEW_COUNT_BUFFER = "redis".'
+                )
+            )
+            return
+        added = view_count.flush_view_counts()
+        self.stdout.write(self.style.SUCCESS("%s view(s) added." % added))
@@ -0,0 +1,30 @@
+"""Esup-Pod command to compute the aggregated video statistics."""
+
+from django.core.management.base import BaseCommand
+
+from pod.video.view_count import rebuild_stats_rollup
+
+
+class Command(BaseCommand):
+    """Compute the VideoStatsRollup table from the view counts and playlists.
+
+    To be run once when USE_STATS_ROLLUP is enabled: the table is then
+    updated with each view and playlist addition.
+    """
+
+    help = "Compute the video statistics aggregated by day, month and year."
+
+    def add_arguments(self, parser) -> None:
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=1000,
+            help="Number of rows read and written by query (default: 1000).",
+        )
+
+    def handle(self, *args, **options) -> None:
+        """Rebuild the video statistics."""
+        count = rebuild_stats_rollup(options["batch_size"])
+        self.stdout.write(
+            self.style.SUCCESS("%s video statistics rollup(s) computed." % count)
+        )
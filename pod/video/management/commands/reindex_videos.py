@@ -2,21 +2,32 @@
 
 from django.core.management.base import BaseCommand
 from pod.video.models import Video
-from pod.video_search.models import index_video
+from pod.video_search.utils import bulk_index_es
+from pod.video_search.utils import ES_BULK_CHUNK_SIZE, ES_BULK_THREAD_COUNT
+from pod.video_search.client import close_es_client, format_es_metrics
 
 
-def reindex_all_videos(dry_run: bool) -> int:
-    """Reindex all videos."""
+def reindex_all_videos(dry_run: bool, **kwargs) -> int:
+    """Reindex all videos, neither draft nor being encoded, with bulk requests."""
     print("\nReindexing all videos...")
-    videos = Video.objects.all()
-    nb_videos = 0
-    for vid in videos:
-        print(".", end="")
-        if not dry_run:
-            index_video(vid)
-        nb_videos += 1
-    print("")
-    return nb_videos
+    videos = Video.objects.filter(is_draft=False, encoding_in_progress=False)
+    if dry_run:
+        return videos.count()
+    report = bulk_index_es(videos, progress=print_progress, **kwargs)
+    for error in report["errors"]:
+        print("Video not indexed: %s" % error)
+    for line in format_es_metrics():
+        print(line)
+    close_es_client()
+    return report["indexed"]
+
+
+def print_progress(report) -> None:
+    """Print the progress of a bulk indexation."""
+    print(
+        "%s videos indexed (%.1f videos/s), last video id: %s"
+        % (report["indexed"], report["rate"], report["last_id"])
+    )
 
 
 class Command(BaseCommand):
@@ -32,12 +43,35 @@ class Command(BaseCommand):
             action="store_true",
             default=False,
         )
+        parser.add_argument(
+            "--batch-size",
+            help="Number of videos sent in each bulk request.",
+            type=int,
+            default=ES_BULK_CHUNK_SIZE,
+        )
+        parser.add_argument(
+            "--workers",
+            help="Number of bulk requests sent in parallel.",
+            type=int,
+            default=ES_BULK_THREAD_COUNT,
+        )
+        parser.add_argument(
+            "--resume-from",
+            help="Resume an interrupted reindexation after this video id.",
+            type=int,
+            default=0,
+        )
 
     def handle(self, *args, **options) -> None:
         """Handle the clean_video_files command call."""
         if options["dry"]:
             print("Simulation mode ('dry'). Nothing will be deleted.")
-        self.nb_reindexed = reindex_all_videos(options["dry"])
+        self.nb_reindexed = reindex_all_videos(
+            options["dry"],
+            chunk_size=options["batch_size"],
+            thread_count=options["workers"],
+            resume_from=options["resume_from"],
+        )
 
         self.print_resume(options["dry"])
 
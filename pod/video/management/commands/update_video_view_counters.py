@@ -0,0 +1,28 @@
+"""Esup-Pod command to update the total and recent views of the videos."""
+
+from django.core.management.base import BaseCommand
+
+from pod.video.view_count import update_video_view_counters
+
+
+class Command(BaseCommand):
+    """Recompute the view counters of the videos (USE_VIDEO_VIEW_COUNTERS).
+
+    To be run each day by cron, to remove the old views from the recent views,
+    and once with `--full` when USE_VIDEO_VIEW_COUNTERS is enabled.
+    """
+
+    help = "Update the total and recent views of the videos."
+
+    def add_arguments(self, parser) -> None:
+        parser.add_argument(
+            "--full",
+            action="store_true",
+            default=False,
+            help="Rebuild the total views too, from all the view counts.",
+        )
+
+    def handle(self, *args, **options) -> None:
+        """Update the view counters."""
+        count = update_video_view_counters(full=options["full"])
+        self.stdout.write(self.style.SUCCESS("%s video view counter(s) updated." % count))
@@ -61,6 +61,7 @@ RESTRICT_EDIT_VIDEO_ACCESS_TO_STAFF_ONLY = getattr(
     settings, "RESTRICT_EDIT_VIDEO_ACCESS_TO_STAFF_ONLY", False
 )
 VIDEO_RECENT_VIEWCOUNT = getattr(settings, "VIDEO_RECENT_VIEWCOUNT", 180)
+USE_VIDEO_VIEW_COUNTERS = getattr(settings, "USE_VIDEO_VIEW_COUNTERS", False)
 VIDEOS_DIR = getattr(settings, "VIDEOS_DIR", "videos")
 SITE_ID = getattr(settings, "SITE_ID", 1)
 
@@ -942,13 +943,23 @@ class Video(models.Model):
     @property
     def viewcount(self):
         """Get the view counter of a video."""
+        if hasattr(self, "views_count"):
+            # annotated by pod.video.utils.annotate_views
+            return self.views_count
+        if USE_VIDEO_VIEW_COUNTERS:
+            return self.get_view_counter().total_views
         return self.get_viewcount()
 
     viewcount.fget.short_description = _("Sum of view")
+    viewcount.fget.admin_order_field = "views_count"
 
     @property
     def recentViewcount(self):
         """Get the recent view counter of a video."""
+        if hasattr(self, "recent_views_count"):
+            return self.recent_views_count
+        if USE_VIDEO_VIEW_COUNTERS:
+            return self.get_view_counter().recent_views
         return self.get_viewcount(VIDEO_RECENT_VIEWCOUNT)
 
     recentViewcount.fget.short_description = _(
@@ -1158,6 +1169,13 @@ class Video(models.Model):
                 else:
                     return version["url"]
 
+    def get_view_counter(self):
+        """Get the total and recent view counters of a video."""
+        try:
+            return self.view_counter
+        except ObjectDoesNotExist:
+            return VideoViewCounter(video=self)
+
     def get_viewcount(self, from_nb_day=0):
         """Get the view counter of a video."""
         if from_nb_day > 0:
@@ -1277,7 +1295,12 @@ class Video(models.Model):
                     dict_entry.append(video_object)
         return dict_src
 
-    def get_json_to_index(self) -> str:
+    def get_json_to_index(self, thumbnail_url=None) -> str:
+        """Get the JSON document of the video to index in ElasticSearch.
+
+        Related objects are read with `.all()`, so that they can be prefetched
+        when building documents for many videos.
+        """
         try:
             current_site = Site.objects.get_current()
             data_to_dump = {
@@ -1296,22 +1319,30 @@ class Video(models.Model):
                     else None
                 ),
                 "description": "%s" % self.description,
-                "thumbnail": "%s" % self.get_thumbnail_url(),
+                "thumbnail": "%s" % (thumbnail_url or self.get_thumbnail_url()),
                 "duration": "%s" % self.duration,
-                "tags": list(self.tags.all().values("name", "slug")),
+                "tags": [{"name": t.name, "slug": t.slug} for t in self.tags.all()],
                 "type": {"title": self.type.title, "slug": self.type.slug},
-                "disciplines": list(
-                    self.discipline.all()
-                    .filter(site=current_site)
-                    .values("title", "slug")
-                ),
-                "channels": list(
-                    self.channel.all().filter(site=current_site).values("title", "slug")
-                ),
-                "themes": list(self.theme.all().values("title", "slug")),
-                "contributors": list(self.contributor_set.values("name", "role")),
-                "chapters": list(self.chapter_set.values("title", "slug")),
-                "overlays": list(self.overlay_set.values("title", "slug")),
+                "disciplines": [
+                    {"title": d.title, "slug": d.slug}
+                    for d in self.discipline.all()
+                    if d.site_id == current_site.id
+                ],
+                "channels": [
+                    {"title": c.title, "slug": c.slug}
+                    for c in self.channel.all()
+                    if c.site_id == current_site.id
+                ],
+                "themes": [{"title": t.title, "slug": t.slug} for t in self.theme.all()],
+                "contributors": [
+                    {"name": c.name, "role": c.role} for c in self.contributor_set.all()
+                ],
+                "chapters": [
+                    {"title": c.title, "slug": c.slug} for c in self.chapter_set.all()
+                ],
+                "overlays": [
+                    {"title": o.title, "slug": o.slug} for o in self.overlay_set.all()
+                ],
                 "full_url": self.get_full_url(),
                 "is_restricted": self.is_restricted,
                 "password": True if self.password != "" else False,
@@ -1566,6 +1597,73 @@ class ViewCount(models.Model):
         verbose_name_plural = _("View counts")
 
 
+class VideoViewCounter(models.Model):
+    """Total and recent views of a video, to sort and list videos by popularity.
+
+    Updated with the view counts; the recent views are recomputed each day
+    by the `update_video_view_counters` command.
+    """
+
+    video = models.OneToOneField(
+        Video,
+        verbose_name=_("Video"),
+        primary_key=True,
+        related_name="view_counter",
+        editable=False,
+        on_delete=models.CASCADE,
+    )
+    total_views = models.IntegerField(
+        _("Sum of view"), default=0, editable=False, db_index=True
+    )
+    recent_views = models.IntegerField(
+        _("Sum of recent views"), default=0, editable=False, db_index=True
+    )
+
+    class Meta:
+        verbose_name = _("Video view counter")
+        verbose_name_plural = _("Video view counters")
+
+
+class VideoStatsRollup(models.Model):
+    """Views and playlist additions of a video, aggregated by day, month or year."""
+
+    PERIODS = (
+        ("day", _("Day")),
+        ("month", _("Month")),
+        ("year", _("Year")),
+    )
+
+    video = models.ForeignKey(
+        Video, verbose_name=_("Video"), editable=False, on_delete=models.CASCADE
+    )
+    period = models.CharField(_("Period"), max_length=5, choices=PERIODS)
+    date = models.DateField(_("Start date of the period"), editable=False)
+    views = models.IntegerField(_("Number of view"), default=0, editable=False)
+    playlist_additions = models.IntegerField(
+        _("Number of playlist additions"), default=0, editable=False
+    )
+    favorite_additions = models.IntegerField(
+        _("Number of favorite additions"), default=0, editable=False
+    )
+
+    class Meta:
+        unique_together = ("video", "period", "date")
+        indexes = [models.Index(fields=["period", "date"])]
+        verbose_name = _("Video statistics")
+        verbose_name_plural = _("Video statistics")
+
+
+class ViewCountFlush(models.Model):
+    """Record a flushed buffer of view counts, to add its views only once."""
+
+    flush_id = models.CharField(_("Flush id"), max_length=64, unique=True)
+    date = models.DateTimeField(_("Date"), auto_now_add=True, db_index=True)
+
+    class Meta:
+        verbose_name = _("View count flush")
+        verbose_name_plural = _("View count flushes")
+
+
 class UserMarkerTime(models.Model):
     """Record the time of video played by a user."""
 
@@ -4,13 +4,15 @@
 """
 
 from unittest import skipUnless
+from unittest.mock import patch
 from django.http import JsonResponse
 from datetime import date
 from django.conf import settings
 from django.test import TestCase, Client
 from django.urls import reverse, NoReverseMatch
 from pod.authentication.models import User
-from pod.video.models import Channel, Theme, Video, Type
+from pod.video.models import Channel, Theme, Video, Type, ViewCount
+from pod.video.view_count import rebuild_stats_rollup
 from pod.video.views import get_all_views_count, stats_view
 from django.contrib.sites.models import Site
 from pod.authentication.models import AccessGroup
@@ -257,6 +259,24 @@ class TestStatsView(TestCase):
         # the content contains the title of the video and expected data
         self.assertEqual(response.content, expected_content)
 
+    @skipUnless(USE_STATS_VIEW, "Require activate URL video_stats_view")
+    def test_stats_view_POST_request_channel_rollup(self) -> None:
+        ViewCount.objects.create(video=self.video, date=TODAY, count=3)
+        ViewCount.objects.create(video=self.video2, date=date(2020, 1, 1), count=2)
+        rebuild_stats_rollup()
+        response = self.client.post(self.stat_channel_url)
+        self.assertEqual(response.status_code, 200)
+        # Same statistics from the rollups, with a constant number of queries
+        with patch("pod.video.views.USE_STATS_ROLLUP", True):
+            with self.assertNumQueries(3):
+                rollup_response = self.client.post(self.stat_channel_url)
+            self.assertEqual(rollup_response.content, response.content)
+            # One more video in the channel, no more query
+            self.video3.channel.set([self.channel])
+            with self.assertNumQueries(3):
+                rollup_response = self.client.post(self.stat_channel_url)
+        self.assertEqual(len(rollup_response.json()), 4)
+
     @skipUnless(USE_STATS_VIEW, "Require activate URL video_stats_view")
     def test_stats_view_POST_request_videos(self) -> None:
         stat_url_videos = reverse("video:video_stats_view")
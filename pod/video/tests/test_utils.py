@@ -7,6 +7,8 @@ from django.contrib.auth.models import User
 
 from pod.video.models import Channel, Theme, Video, Type
 from pod.video.utils import pagination_data, get_headband, change_owner, get_videos
+from pod.video.utils import has_audio
+from pod.video_encode_transcript.models import VideoStreamInfo
 
 
 class VideoTestUtils(TestCase):
@@ -86,3 +88,11 @@ class VideoTestUtils(TestCase):
         actual = get_videos(self.v.title, self.user.id, search="not found")
         expected = {**expected, "count": 0, "page_infos": "0/0", "results": []}
         self.assertEqual(json.loads(actual.content.decode("utf-8")), expected)
+
+    def test_has_audio(self) -> None:
+        # No encoding info: an audio track is assumed
+        self.assertTrue(has_audio(self.v))
+        VideoStreamInfo.objects.create(video=self.v, has_video=True, has_audio=False)
+        with self.assertNumQueries(1):
+            self.assertFalse(has_audio(self.v))
+        print(" --->  test_has_audio ok")
@@ -0,0 +1,307 @@
+"""Unit tests for Esup-Pod buffered video view counts.
+
+*  run with 'python manage.py test pod.video.tests.test_view_count'
+"""
+
+from datetime import date, timedelta
+from io import StringIO
+from unittest.mock import patch
+
+from django.contrib.auth.models import User
+from django.contrib.sites.models import Site
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import TestCase
+from django.urls import reverse
+
+from pod.main.templatetags.flat_page_edito_filter import render_most_view
+from pod.playlist.apps import FAVORITE_PLAYLIST_NAME
+from pod.playlist.models import Playlist, PlaylistContent
+
+from ..models import Channel, Type, Video, VideoViewCounter, ViewCount, ViewCountFlush
+from ..utils import annotate_views, sort_videos_list
+from ..view_count import MemoryViewCountBuffer, add_view_counts, count_view
+from ..view_count import get_videos_views_count, rebuild_stats_rollup
+from ..view_count import update_video_view_counters
+from ..views import get_all_views_count
+
+
+class FakeRedis:
+    """Minimal in-memory replacement of the Redis hash commands used."""
+
+    def __init__(self):
+        self.data = {}
+
+    def hincrby(self, key, field, amount):
+        self.data.setdefault(key, {})
+        self.data[key][field] = self.data[key].get(field, 0) + amount
+
+    def exists(self, key):
+        return key in self.data
+
+    def rename(self, key, new_key):
+        self.data[new_key] = self.data.pop(key)
+
+    def scan_iter(self, match):
+        return [key for key in list(self.data) if key.startswith(match[:-1])]
+
+    def hgetall(self, key):
+        return {
+            field.encode(): str(count).encode() for field, count in self.data[key].items()
+        }
+
+    def delete(self, key):
+        self.data.pop(key, None)
+
+
+class ViewCountBufferTestCase(TestCase):
+    """TestCase for the buffered video view counts."""
+
+    fixtures = [
+        "initial_data.json",
+    ]
+
+    def setUp(self) -> None:
+        """Set up required objects for next tests."""
+        user = User.objects.create(username="pod", password="pod1234pod")
+        self.video = Video.objects.create(
+            title="Video1",
+            owner=user,
+            video="test1.mp4",
+            type=Type.objects.get(id=1),
+        )
+
+    def test_add_view_counts(self) -> None:
+        today = date.today()
+        added = add_view_counts({(self.video.id, today): 3, (9999, today): 2})
+        # The views of a deleted video are ignored
+        self.assertEqual(added, 3)
+        add_view_counts({(self.video.id, today): 2})
+        self.assertEqual(ViewCount.objects.get(video=self.video, date=today).count, 5)
+        print("--> test_add_view_counts ok! ")
+
+    @patch("pod.video.view_count.USE_STATS_ROLLUP", False)
+    @patch("pod.video.view_count.USE_VIDEO_VIEW_COUNTERS", False)
+    def test_direct_count_view(self) -> None:
+        count_view(self.video.id)
+        # The video is read by the view: only the view count of the day is updated
+        with self.assertNumQueries(1):
+            count_view(self.video.id)
+        self.assertEqual(self.video.get_viewcount(), 2)
+        print("--> test_direct_count_view ok! ")
+
+    def test_memory_buffer(self) -> None:
+        buffer = MemoryViewCountBuffer(interval=60)
+        with patch("pod.video.view_count.memory_buffer", buffer), patch(
+            "pod.video.view_count.VIEW_COUNT_BUFFER", "memory"
+        ):
+            url = reverse("video:video_count", kwargs={"id": self.video.id})
+            for i in range(3):
+                self.client.post(url, {})
+            # Not written before the flush
+            self.assertEqual(self.video.get_viewcount(), 0)
+            # The command cannot reach the memory of the process
+            out = StringIO()
+            call_command("flush_view_counts", stdout=out)
+            self.assertIn("Nothing to flush", out.getvalue())
+            self.assertEqual(self.video.get_viewcount(), 0)
+            buffer.flush()
+            self.assertEqual(self.video.get_viewcount(), 3)
+            # Flushed at the first view after the interval
+            buffer.interval = 0
+            self.client.post(url, {})
+            self.assertEqual(self.video.get_viewcount(), 4)
+        print("--> test_memory_buffer ok! ")
+
+    def test_redis_buffer(self) -> None:
+        redis = FakeRedis()
+        with patch(
+            "pod.video.view_count.get_redis_connection", return_value=redis
+        ), patch("pod.video.view_count.VIEW_COUNT_BUFFER", "redis"):
+            url = reverse("video:video_count", kwargs={"id": self.video.id})
+            self.client.post(url, {})
+            self.client.post(url, {})
+            self.assertEqual(self.video.get_viewcount(), 0)
+            # A buffer left by an interrupted flush, already written
+            flush_key = cache.make_key("view_count_flush:") + "done"
+            redis.data[flush_key] = {"%s:2024-01-01" % self.video.id: 5}
+            ViewCountFlush.objects.create(flush_id="done")
+            call_command("flush_view_counts", stdout=StringIO())
+            self.assertEqual(self.video.get_viewcount(), 2)
+            self.assertEqual(redis.data, {})
+            self.assertEqual(ViewCountFlush.objects.count(), 2)
+            # Nothing more to flush
+            call_command("flush_view_counts", stdout=StringIO())
+            self.assertEqual(self.video.get_viewcount(), 2)
+        print("--> test_redis_buffer ok! ")
+
+
+class VideoStatsRollupTestCase(TestCase):
+    """TestCase for the aggregated video statistics."""
+
+    fixtures = [
+        "initial_data.json",
+    ]
+
+    def setUp(self) -> None:
+        """Set up required objects for next tests."""
+        self.user = User.objects.create(username="pod", password="pod1234pod")
+        self.videos = [
+            Video.objects.create(
+                title="Video%s" % i,
+                owner=self.user,
+                video="test%s.mp4" % i,
+                type=Type.objects.get(id=1),
+            )
+            for i in range(2)
+        ]
+        self.today = date.today()
+        for days, count in ((0, 2), (1, 3), (40, 4), (400, 5)):
+            ViewCount.objects.create(
+                video=self.videos[0],
+                date=self.today - timedelta(days=days),
+                count=count,
+            )
+        self.playlist = Playlist.objects.create(name="Test Playlist", owner=self.user)
+        self.favorites = Playlist.objects.create(
+            name=FAVORITE_PLAYLIST_NAME, owner=self.user
+        )
+        PlaylistContent.objects.create(playlist=self.playlist, video=self.videos[0])
+        PlaylistContent.objects.create(playlist=self.favorites, video=self.videos[0])
+
+    def assertSameStats(self, date_filter) -> None:
+        """Check the rollups give the same statistics as the detailed tables."""
+        stats = get_videos_views_count(Video.objects.all(), date_filter)
+        for video in self.videos:
+            self.assertEqual(stats[video.id], get_all_views_count(video.id, date_filter))
+
+    def test_rebuild_stats_rollup(self) -> None:
+        rebuild_stats_rollup()
+        self.assertSameStats(self.today)
+        self.assertEqual(
+            get_videos_views_count([self.videos[0].id], self.today)[self.videos[0].id][
+                "since_created"
+            ],
+            14,
+        )
+        self.assertSameStats(self.today - timedelta(days=40))
+        # The statistics of the videos of a channel are read with one query
+        channel = Channel.objects.create(title="Channel")
+        for video in self.videos:
+            video.channel.add(channel)
+        with self.assertNumQueries(1):
+            stats = get_videos_views_count(
+                Video.objects.filter(channel=channel), self.today
+            )
+        self.assertEqual(stats[self.videos[0].id]["since_created"], 14)
+        print("--> test_rebuild_stats_rollup ok! ")
+
+    def test_stats_rollup_update(self) -> None:
+        rebuild_stats_rollup()
+        with patch("pod.video.view_count.USE_STATS_ROLLUP", True):
+            add_view_counts({(self.videos[1].id, self.today): 2})
+            add_view_counts({(self.videos[0].id, self.today): 1})
+            PlaylistContent.objects.create(playlist=self.favorites, video=self.videos[1])
+            PlaylistContent.objects.filter(playlist=self.playlist).delete()
+        self.assertSameStats(self.today)
+        print("--> test_stats_rollup_update ok! ")
+
+
+class VideoViewCounterTestCase(TestCase):
+    """TestCase for the total and recent views of the videos."""
+
+    fixtures = [
+        "initial_data.json",
+    ]
+
+    def setUp(self) -> None:
+        """Set up required objects for next tests."""
+        user = User.objects.create(username="pod", password="pod1234pod")
+        self.videos = [
+            Video.objects.create(
+                title="Video%s" % i,
+                owner=user,
+                video="test%s.mp4" % i,
+                type=Type.objects.get(id=1),
+            )
+            for i in range(3)
+        ]
+        today = date.today()
+        ViewCount.objects.create(video=self.videos[0], date=today, count=2)
+        ViewCount.objects.create(
+            video=self.videos[0], date=today - timedelta(days=1000), count=5
+        )
+        ViewCount.objects.create(video=self.videos[1], date=today, count=4)
+
+    def test_annotate_views(self) -> None:
+        update_video_view_counters(full=True)
+        for use_counters in (False, True):
+            with patch("pod.video.utils.USE_VIDEO_VIEW_COUNTERS", use_counters):
+                videos = annotate_views(Video.objects.all())
+                with self.assertNumQueries(1):
+                    views = {
+                        video.id: (video.viewcount, video.recentViewcount)
+                        for video in videos
+                    }
+                self.assertEqual(
+                    views,
+                    {
+                        video.id: (video.get_viewcount(), video.get_viewcount(180))
+                        for video in self.videos
+                    },
+                )
+                sorted_videos = sort_videos_list(Video.objects.all(), "viewcount")
+                self.assertEqual(
+                    list(sorted_videos),
+                    [self.videos[0], self.videos[1], self.videos[2]],
+                )
+        print("--> test_annotate_views ok! ")
+
+    def test_most_viewed_videos(self) -> None:
+        Video.objects.update(is_draft=False, encoding_in_progress=False)
+        params = {
+            "nb-element": 5,
+            "multi-carousel-nb-card": 5,
+            "title": "",
+            "template": "block/card_list.html",
+            "auto-slide": False,
+            "show-restricted": True,
+            "view-videos-from-non-visible-channels": True,
+            "show-passworded": True,
+        }
+        for use_counters in (False, True):
+            with patch(
+                "pod.main.templatetags.flat_page_edito_filter.USE_VIDEO_VIEW_COUNTERS",
+                use_counters,
+            ), patch("pod.video.utils.USE_VIDEO_VIEW_COUNTERS", use_counters):
+                update_video_view_counters(full=True)
+                debug_elts = []
+                render_most_view("most", params, Site.objects.get_current(), debug_elts)
+            # Sorted on the sum of the recent views, read with the videos
+            views = [elt for elt in debug_elts if "RECENT_VIW_COUNT" in elt]
+            self.assertEqual(len(views), 2)
+            self.assertIn("[ID:%s]" % self.videos[1].id, views[0])
+            self.assertIn("[RECENT_VIW_COUNT:4]", views[0])
+            self.assertIn("[RECENT_VIW_COUNT:2]", views[1])
+        print("--> test_most_viewed_videos ok! ")
+
+    def test_update_video_view_counters(self) -> None:
+        self.assertEqual(update_video_view_counters(full=True), 2)
+        counter = VideoViewCounter.objects.get(video=self.videos[0])
+        self.assertEqual((counter.total_views, counter.recent_views), (7, 2))
+        with patch("pod.video.view_count.USE_VIDEO_VIEW_COUNTERS", True):
+            add_view_counts({(self.videos[2].id, date.today()): 3})
+            add_view_counts({(self.videos[0].id, date.today()): 1})
+        counter.refresh_from_db()
+        self.assertEqual((counter.total_views, counter.recent_views), (8, 3))
+        self.assertEqual(
+            VideoViewCounter.objects.get(video=self.videos[2]).recent_views, 3
+        )
+        # The recent views are recomputed without the views too old
+        ViewCount.objects.filter(video=self.videos[1]).update(
+            date=date.today() - timedelta(days=1000)
+        )
+        update_video_view_counters()
+        counter = VideoViewCounter.objects.get(video=self.videos[1])
+        self.assertEqual((counter.total_views, counter.recent_views), (4, 0))
+        print("--> test_update_video_view_counters ok! ")
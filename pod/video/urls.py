@@ -15,6 +15,7 @@ from .views import (
     video_count,
     video_marker,
     video_version,
+    video_queue,
     get_render_categories_list,
     add_category,
     edit_category,
@@ -79,6 +80,7 @@ urlpatterns = [
         r"^marker/(?P<id>[\d]+)/(?P<time>[\d]+)/$", video_marker, name="video_marker"
     ),
     re_path(r"^version/(?P<id>[\d]+)/$", video_version, name="video_version"),
+    re_path(r"^queue/(?P<slug>[\-\d\w]+)/$", video_queue, name="video_queue"),
     re_path(
         "api/chunked_upload_complete/",
         PodChunkedUploadCompleteView.as_view(),
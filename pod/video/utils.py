@@ -6,17 +6,20 @@ import json
 import re
 import shutil
 import logging
+from datetime import date, timedelta
 from math import ceil
 
 from django.urls import reverse
 from django.conf import settings
 from django.http import JsonResponse
-from django.db.models import Q, Count
+from django.db.models import Q, Count, F, OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce
 from django.utils.translation import gettext_lazy as _
 from pod.video_encode_transcript.models import EncodingVideo, EncodingAudio
-from pod.video_encode_transcript.models import PlaylistVideo
+from pod.video_encode_transcript.models import PlaylistVideo, VideoStreamInfo
 from django.contrib.auth import get_user_model
-from .models import Video, Category, Type, Discipline
+from .models import Video, Category, Type, Discipline, ViewCount
+from .models import USE_VIDEO_VIEW_COUNTERS, VIDEO_RECENT_VIEWCOUNT
 
 logger = logging.getLogger(__name__)
 User = get_user_model()
@@ -238,6 +241,39 @@ def get_tag_cloud() -> list:
     return tags_sorted[:NUMBER_TAGS_CLOUD]
 
 
+def annotate_views(videos):
+    """Annotate a queryset of videos with their total and recent views.
+
+    Add `views_count` and `recent_views_count`, used by the `viewcount` and
+    `recentViewcount` properties of the videos, in the query of the videos:
+    from the view counters with USE_VIDEO_VIEW_COUNTERS,
+    else with subqueries summing the view counts of each video, whose cost
+    grows with the number of days viewed.
+    """
+    if USE_VIDEO_VIEW_COUNTERS:
+        return videos.annotate(
+            views_count=Coalesce(F("view_counter__total_views"), 0),
+            recent_views_count=Coalesce(F("view_counter__recent_views"), 0),
+        )
+    recent_date = date.today() - timedelta(days=VIDEO_RECENT_VIEWCOUNT)
+    view_counts = (
+        ViewCount.objects.filter(video_id=OuterRef("id")).order_by().values("video_id")
+    )
+    return videos.annotate(
+        views_count=Coalesce(
+            Subquery(view_counts.annotate(total=Sum("count")).values("total")), 0
+        ),
+        recent_views_count=Coalesce(
+            Subquery(
+                view_counts.filter(date__gte=recent_date)
+                .annotate(total=Sum("count"))
+                .values("total")
+            ),
+            0,
+        ),
+    )
+
+
 def sort_videos_list(videos_list: list, sort_field: str, sort_direction: str = ""):
     """Return videos list sorted by sort_field.
 
@@ -268,6 +304,10 @@ def sort_videos_list(videos_list: list, sort_field: str, sort_direction: str = "
         "rank",
         "order",
     }:
+        if sort_field == "viewcount":
+            videos_list = annotate_views(videos_list)
+            sort_field = "views_count"
+
         if sort_field in {"title", "title_fr", "title_en"}:
             sort_field = Lower(sort_field)
             if not sort_direction:
@@ -337,6 +377,9 @@ def has_audio(video) -> bool:
     Returns:
         bool: True if the video has an audio track, False otherwise.
     """
+    stream_info = VideoStreamInfo.objects.filter(video=video).first()
+    if stream_info is not None:
+        return stream_info.has_audio
     try:
         # Get the path of the video file
         video_path = video.video.path
@@ -0,0 +1,385 @@
+"""Esup-Pod buffered video view counts.
+
+Instead of updating the ViewCount row of a video at each player start,
+the views can be accumulated per video and day (VIEW_COUNT_BUFFER):
+
+- "redis": in a hash of the Redis server of the default cache, flushed to the
+  database by the `flush_view_counts` command, run periodically by cron.
+- "memory": in the process, flushed at its first view after
+  VIEW_COUNT_FLUSH_INTERVAL and when the process exits normally. The views
+  of a killed process (SIGKILL, uWSGI harakiri or reload) are lost, and the
+  `flush_view_counts` command cannot reach them.
+
+A flushed Redis buffer is renamed with a unique id, recorded in the database
+(ViewCountFlush) in the same transaction as the counts: a flush interrupted
+before or after the commit is done again or skipped, so each view is only
+counted once.
+
+With USE_STATS_ROLLUP, the views and playlist additions are also aggregated
+by day, month and year in VideoStatsRollup, to answer the statistics
+of many videos in a few queries. The `rebuild_stats_rollup` command
+initializes this table from the ViewCount and PlaylistContent tables.
+
+With USE_VIDEO_VIEW_COUNTERS, the total and recent views of each video
+are kept in VideoViewCounter, to list and sort videos by popularity.
+"""
+
+from collections import defaultdict
+from datetime import date, timedelta
+from django.conf import settings
+from django.core.cache import cache
+from django.db import IntegrityError, transaction
+from django.db.models import F, OuterRef, Q, Subquery, Sum
+from django.db.models.functions import Coalesce
+from django.db.models.query import QuerySet
+from django.utils import timezone
+
+import atexit
+import logging
+import threading
+import time
+import uuid
+
+from pod.playlist.apps import FAVORITE_PLAYLIST_NAME
+from pod.playlist.models import PlaylistContent
+
+from .models import Video, VideoStatsRollup, VideoViewCounter, ViewCount
+from .models import ViewCountFlush, USE_VIDEO_VIEW_COUNTERS, VIDEO_RECENT_VIEWCOUNT
+
+logger = logging.getLogger(__name__)
+
+VIEW_COUNT_BUFFER = getattr(settings, "VIEW_COUNT_BUFFER", "")
+VIEW_COUNT_FLUSH_INTERVAL = getattr(settings, "VIEW_COUNT_FLUSH_INTERVAL", 60)
+USE_STATS_ROLLUP = getattr(settings, "USE_STATS_ROLLUP", False)
+
+# Redis keys of the buffer, and of the buffers being flushed.
+BUFFER_KEY = "view_count_buffer"
+FLUSH_KEY_PREFIX = "view_count_flush:"
+# Days during which the ids of the flushed buffers are kept.
+FLUSH_ID_KEEP_DAYS = 7
+
+
+# Keys of the statistics of a video (see get_videos_views_count) by rollup field.
+STATS_PREFIXES = {
+    "views": "",
+    "playlist_additions": "playlist_",
+    "favorite_additions": "fav_",
+}
+
+
+def get_period_starts(day) -> list:
+    """Return the (period, start date) of the day, month and year of a date."""
+    return [
+        ("day", day),
+        ("month", day.replace(day=1)),
+        ("year", day.replace(month=1, day=1)),
+    ]
+
+
+def add_stats_rollup(video_id, day, **counts) -> None:
+    """Add counts (views, playlist_additions...) to the rollups of a video and date."""
+    increments = {field: F(field) + count for field, count in counts.items()}
+    for period, start in get_period_starts(day):
+        rollups = VideoStatsRollup.objects.filter(
+            video_id=video_id, period=period, date=start
+        )
+        if rollups.update(**increments):
+            continue
+        try:
+            with transaction.atomic():
+                VideoStatsRollup.objects.create(
+                    video_id=video_id, period=period, date=start, **counts
+                )
+        except IntegrityError:
+            rollups.update(**increments)
+
+
+def add_playlist_content_stats(content, count=1) -> None:
+    """Count the addition (1) or removal (-1) of a video in a playlist."""
+    if not USE_STATS_ROLLUP:
+        return
+    counts = {"playlist_additions": count}
+    if content.playlist.name == FAVORITE_PLAYLIST_NAME:
+        counts["favorite_additions"] = count
+    add_stats_rollup(content.video_id, timezone.localdate(content.date_added), **counts)
+
+
+def rebuild_stats_rollup(batch_size=1000) -> int:
+    """Compute the whole VideoStatsRollup table from ViewCount and PlaylistContent.
+
+    Return the number of rollups.
+    """
+    rollups = {}
+
+    def add(video_id, day, field, count):
+        for period, start in get_period_starts(day):
+            rollup = rollups.setdefault(
+                (video_id, period, start),
+                VideoStatsRollup(video_id=video_id, period=period, date=start),
+            )
+            setattr(rollup, field, getattr(rollup, field) + count)
+
+    view_counts = ViewCount.objects.values_list("video_id", "date", "count")
+    for video_id, day, count in view_counts.iterator(chunk_size=batch_size):
+        add(video_id, day, "views", count)
+    contents = PlaylistContent.objects.values_list(
+        "video_id", "date_added", "playlist__name"
+    )
+    for video_id, date_added, name in contents.iterator(chunk_size=batch_size):
+        day = timezone.localdate(date_added)
+        add(video_id, day, "playlist_additions", 1)
+        if name == FAVORITE_PLAYLIST_NAME:
+            add(video_id, day, "favorite_additions", 1)
+    with transaction.atomic():
+        VideoStatsRollup.objects.all().delete()
+        VideoStatsRollup.objects.bulk_create(rollups.values(), batch_size=batch_size)
+    return len(rollups)
+
+
+def get_videos_views_count(videos, date_filter) -> dict:
+    """Return the statistics of videos at a date, by video id.
+
+    `videos` is a list of video ids or a queryset of videos (the videos of
+    a channel or a theme). The statistics are taken from VideoStatsRollup
+    with one query, giving the day and month rollups of the date and the
+    year rollups, summed for the totals since the creation.
+    Each video has the same keys as `get_all_views_count`, with 0 as default.
+    """
+    if isinstance(videos, QuerySet):
+        videos = videos.values("id")
+    empty = {}
+    for prefix in STATS_PREFIXES.values():
+        for period in ("day", "month", "year", "since_created"):
+            empty[prefix + period] = 0
+    stats = defaultdict(lambda: dict(empty))
+    period_starts = dict(get_period_starts(date_filter))
+    periods = Q(period="year")
+    for period in ("day", "month"):
+        periods |= Q(period=period, date=period_starts[period])
+    rollups = VideoStatsRollup.objects.filter(periods, video_id__in=videos).values(
+        "video_id", "period", "date", *STATS_PREFIXES
+    )
+    for rollup in rollups:
+        video_stats = stats[rollup["video_id"]]
+        for field, prefix in STATS_PREFIXES.items():
+            if rollup["period"] == "year":
+                video_stats[prefix + "since_created"] += rollup[field]
+            if rollup["date"] == period_starts[rollup["period"]]:
+                video_stats[prefix + rollup["period"]] = rollup[field]
+    return stats
+
+
+def add_view_counts(counts, check_videos=True) -> int:
+    """Add view counts {(video_id, date): count} to the ViewCount table.
+
+    Return the number of added views; the views of deleted videos are ignored,
+    unless `check_videos` is False (the caller has just read the videos).
+    """
+    video_ids = set(video_id for video_id, day in counts)
+    if check_videos:
+        video_ids = set(
+            Video.objects.filter(id__in=video_ids).values_list("id", flat=True)
+        )
+    added = 0
+    for (video_id, day), count in counts.items():
+        if video_id not in video_ids or count <= 0:
+            continue
+        updated = ViewCount.objects.filter(video_id=video_id, date=day).update(
+            count=F("count") + count
+        )
+        if not updated:
+            try:
+                with transaction.atomic():
+                    ViewCount.objects.create(video_id=video_id, date=day, count=count)
+            except IntegrityError:
+                ViewCount.objects.filter(video_id=video_id, date=day).update(
+                    count=F("count") + count
+                )
+        if USE_STATS_ROLLUP:
+            add_stats_rollup(video_id, day, views=count)
+        if USE_VIDEO_VIEW_COUNTERS:
+            add_video_view_counter(video_id, day, count)
+        added += count
+    return added
+
+
+def get_recent_views_date() -> date:
+    """Return the first day of the recent views (VIDEO_RECENT_VIEWCOUNT)."""
+    return date.today() - timedelta(days=VIDEO_RECENT_VIEWCOUNT)
+
+
+def add_video_view_counter(video_id, day, count) -> None:
+    """Add views of a date to the total and recent views of a video."""
+    recent = count if day >= get_recent_views_date() else 0
+    counters = VideoViewCounter.objects.filter(video_id=video_id)
+    increments = {
+        "total_views": F("total_views") + count,
+        "recent_views": F("recent_views") + recent,
+    }
+    if counters.update(**increments):
+        return
+    try:
+        with transaction.atomic():
+            VideoViewCounter.objects.create(
+                video_id=video_id, total_views=count, recent_views=recent
+            )
+    except IntegrityError:
+        counters.update(**increments)
+
+
+def update_video_view_counters(full=False, batch_size=1000) -> int:
+    """Recompute the view counters of the videos from the view counts.
+
+    By default, only the recent views are recomputed, to remove the views
+    older than VIDEO_RECENT_VIEWCOUNT days. With `full`, all counters
+    are rebuilt. Return the number of updated counters.
+    """
+    recent_date = get_recent_views_date()
+    if full:
+        totals = (
+            ViewCount.objects.order_by()
+            .values("video_id")
+            .annotate(
+                total=Sum("count"),
+                recent=Coalesce(Sum("count", filter=Q(date__gte=recent_date)), 0),
+            )
+        )
+        counters = [
+            VideoViewCounter(
+                video_id=total["video_id"],
+                total_views=total["total"],
+                recent_views=total["recent"],
+            )
+            for total in totals.iterator(chunk_size=batch_size)
+        ]
+        with transaction.atomic():
+            VideoViewCounter.objects.all().delete()
+            VideoViewCounter.objects.bulk_create(counters, batch_size=batch_size)
+        return len(counters)
+    recent_views = (
+        ViewCount.objects.filter(video_id=OuterRef("video_id"), date__gte=recent_date)
+        .order_by()
+        .values("video_id")
+        .annotate(total=Sum("count"))
+        .values("total")
+    )
+    return VideoViewCounter.objects.filter(recent_views__gt=0).update(
+        recent_views=Coalesce(Subquery(recent_views), 0)
+    )
+
+
+def get_redis_connection():
+    """Return the Redis connection of the default cache."""
+    from django_redis import get_redis_connection
+
+    return get_redis_connection("default")
+
+
+class MemoryViewCountBuffer:
+    """View counts buffer of a process, flushed at regular intervals."""
+
+    def __init__(self, interval):
+        self.interval = interval
+        self.counts = {}
+        self.last_flush = time.monotonic()
+        self.lock = threading.Lock()
+
+    def add(self, video_id, day) -> None:
+        """Count a view of the video, and flush the buffer if the interval is over."""
+        with self.lock:
+            self.counts[(video_id, day)] = self.counts.get((video_id, day), 0) + 1
+            flush = time.monotonic() - self.last_flush >= self.interval
+        if flush:
+            self.flush()
+
+    def flush(self) -> int:
+        """Write the buffered counts in the database, return the number of views."""
+        with self.lock:
+            counts, self.counts = self.counts, {}
+            self.last_flush = time.monotonic()
+        if not counts:
+            return 0
+        try:
+            with transaction.atomic():
+                return add_view_counts(counts)
+        except Exception as e:
+            logger.error("An error occured during view counts flush: %s" % e)
+            # Keep the counts for the next flush
+            with self.lock:
+                for key, count in counts.items():
+                    self.counts[key] = self.counts.get(key, 0) + count
+            return 0
+
+
+memory_buffer = MemoryViewCountBuffer(VIEW_COUNT_FLUSH_INTERVAL)
+if VIEW_COUNT_BUFFER == "memory":
+    atexit.register(memory_buffer.flush)
+
+
+def count_view(video_id) -> None:
+    """Count a view of the video today, buffered according to VIEW_COUNT_BUFFER.
+
+    The video must exist: the buffered views of deleted videos are ignored
+    at the flush, the direct ones are not checked again.
+    """
+    day = date.today()
+    if VIEW_COUNT_BUFFER == "memory":
+        memory_buffer.add(video_id, day)
+    elif VIEW_COUNT_BUFFER == "redis":
+        get_redis_connection().hincrby(
+            cache.make_key(BUFFER_KEY), "%s:%s" % (video_id, day.isoformat()), 1
+        )
+    else:
+        add_view_counts({(video_id, day): 1}, check_videos=False)
+
+
+def flush_redis_view_counts() -> int:
+    """Write the view counts buffered in Redis in the database.
+
+    Return the number of added views.
+    """
+    redis = get_redis_connection()
+    buffer_key = cache.make_key(BUFFER_KEY)
+    flush_prefix = cache.make_key(FLUSH_KEY_PREFIX)
+    if redis.exists(buffer_key):
+        # New views are counted in a new buffer during the flush.
+        try:
+            redis.rename(buffer_key, "%s%s" % (flush_prefix, uuid.uuid4()))
+        except Exception as e:
+            # Renamed by another flush in the meantime
+            logger.warning("View counts buffer not renamed: %s" % e)
+    added = 0
+    # The buffers of an interrupted flush are flushed too.
+    for flush_key in redis.scan_iter(match="%s*" % flush_prefix):
+        flush_key = flush_key.decode() if isinstance(flush_key, bytes) else flush_key
+        counts = {}
+        for field, count in redis.hgetall(flush_key).items():
+            field = field.decode() if isinstance(field, bytes) else field
+            video_id, day = field.split(":")
+            counts[(int(video_id), date.fromisoformat(day))] = int(count)
+        try:
+            with transaction.atomic():
+                flush, created = ViewCountFlush.objects.get_or_create(
+                    flush_id=flush_key[len(flush_prefix) :]
+                )
+                if created:
+                    added += add_view_counts(counts)
+        except IntegrityError:
+            # Flushed at the same time by another process
+            continue
+        redis.delete(flush_key)
+    ViewCountFlush.objects.filter(
+        date__lt=timezone.now() - timedelta(days=FLUSH_ID_KEEP_DAYS)
+    ).delete()
+    return added
+
+
+def flush_view_counts() -> int:
+    """Write the view counts buffered in Redis in the database.
+
+    Return the number of added views. The views buffered in memory
+    belong to each process, which flushes them itself: nothing is added.
+    """
+    if VIEW_COUNT_BUFFER == "redis":
+        return flush_redis_view_counts()
+    return 0
@@ -31,7 +31,6 @@ from django.db.models import (
     BooleanField,
     Case,
     Count,
-    F,
     Min,
     Q,
     QuerySet,
@@ -120,6 +119,7 @@ from .utils import (
     pagination_data,
     sort_videos_list,
 )
+from .view_count import count_view, get_videos_views_count
 
 # from django.contrib.auth.hashers import check_password
 
@@ -211,6 +211,7 @@ HIDE_USER_FILTER = getattr(settings, "HIDE_USER_FILTER", False)
 USE_TRANSCRIPTION = getattr(settings, "USE_TRANSCRIPTION", False)
 USE_OBSOLESCENCE = getattr(settings, "USE_OBSOLESCENCE", False)
 USE_RUNNER_MANAGER = getattr(settings, "USE_RUNNER_MANAGER", False)
+USE_STATS_ROLLUP = getattr(settings, "USE_STATS_ROLLUP", False)
 
 if USE_TRANSCRIPTION:
     from ..video_encode_transcript import transcript
@@ -1294,25 +1295,57 @@ def toggle_render_video_when_is_playlist_player(request):
 
 def _get_video_queue_context(video: Video | None) -> dict:
     """Return queue context for a video waiting for encoding."""
+    empty_context = {
+        "video_task_queue_rank": None,
+        "video_task_queue_total": None,
+        "video_task_queue_eta": None,
+    }
     if not USE_RUNNER_MANAGER or not video or not video.id:
-        return {"video_task_queue_rank": None, "video_task_queue_total": None}
+        return empty_context
 
     if not video.video or video.get_encoding_step != "":
-        return {"video_task_queue_rank": None, "video_task_queue_total": None}
+        return empty_context
 
+    from pod.video_encode_transcript.task_eta import get_video_encoding_eta
     from pod.video_encode_transcript.task_queue import (
         get_video_pending_encoding_queue_info,
-        refresh_pending_task_ranks,
     )
 
-    refresh_pending_task_ranks()
     rank, total = get_video_pending_encoding_queue_info(video)
+    eta = get_video_encoding_eta(video)
     return {
         "video_task_queue_rank": rank,
         "video_task_queue_total": total,
+        "video_task_queue_eta": (
+            timezone.now() + timedelta(seconds=eta) if eta is not None else None
+        ),
     }
 
 
+@login_required(redirect_field_name="referrer")
+def video_queue(request: WSGIRequest, slug: str) -> JsonResponse:
+    """Return the queue rank and the estimated end of the encoding of a video."""
+    video = get_object_or_404(Video, slug=slug, sites=get_current_site(request))
+    if (
+        request.user != video.owner
+        and not (request.user.is_superuser or request.user.has_perm("video.change_video"))
+        and (request.user not in video.additional_owners.all())
+    ):
+        return JsonResponse({"error": _("You cannot edit this video.")}, status=403)
+    context = _get_video_queue_context(video)
+    eta = context["video_task_queue_eta"]
+    return JsonResponse(
+        {
+            "rank": context["video_task_queue_rank"],
+            "total": context["video_task_queue_total"],
+            "eta": eta.isoformat() if eta else None,
+            "eta_seconds": (
+                max(0, int((eta - timezone.now()).total_seconds())) if eta else None
+            ),
+        }
+    )
+
+
 def render_video(
     request,
     id,
@@ -2436,17 +2469,7 @@ def video_count(request, id):
     """View to store the video count."""
     video = get_object_or_404(Video, id=id)
     if request.method == "POST":
-        try:
-            view_count = ViewCount.objects.get(video=video, date=date.today())
-        except ViewCount.DoesNotExist:
-            try:
-                with transaction.atomic():
-                    ViewCount.objects.create(video=video, count=1)
-                    return HttpResponse("ok")
-            except IntegrityError:
-                view_count = ViewCount.objects.get(video=video, date=date.today())
-        view_count.count = F("count") + 1
-        view_count.save(update_fields=["count"])
+        count_view(video.id)
         return HttpResponse("ok")
     messages.add_message(request, messages.ERROR, _("You cannot access to this view."))
     raise PermissionDenied
@@ -2604,6 +2627,8 @@ def video_oembed(request):
 
 
 def get_all_views_count(v_id, date_filter=date.today()):
+    if USE_STATS_ROLLUP:
+        return get_videos_views_count([v_id], date_filter)[v_id]
     all_views = {}
 
     # view count in day
@@ -2834,12 +2859,24 @@ def stats_view(request, slug=None, slug_t=None):
         if isinstance(date_filter, str):
             date_filter = parse(date_filter).date()
 
+        if isinstance(videos, QuerySet):
+            # the slug is deferred by get_available_videos, read it with the title
+            videos = videos.defer(None).only("id", "title", "slug")
+        if USE_STATS_ROLLUP:
+            views_count = get_videos_views_count(
+                videos if isinstance(videos, QuerySet) else [v.id for v in videos],
+                date_filter,
+            )
         data = list(
             map(
                 lambda v: {
                     "title": v.title,
                     "slug": v.slug,
-                    **get_all_views_count(v.id, date_filter),
+                    **(
+                        views_count[v.id]
+                        if USE_STATS_ROLLUP
+                        else get_all_views_count(v.id, date_filter)
+                    ),
                 },
                 videos,
             )
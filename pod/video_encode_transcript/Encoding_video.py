@@ -1,16 +1,21 @@
 """Esup-Pod video encoding."""
 
 import argparse
+import hashlib
 import json
 import logging
 import os
+import shutil
 import time
 import unicodedata
+from concurrent.futures import ThreadPoolExecutor
+from glob import glob
 
 from webvtt import Caption, WebVTT
 
 if __name__ == "__main__":
     from encoding_settings import (
+        FFMPEG_ADAPTIVE_LADDER,
         FFMPEG_AUDIO_BITRATE,
         FFMPEG_CMD,
         FFMPEG_CREATE_OVERVIEW,
@@ -39,18 +44,39 @@ if __name__ == "__main__":
         FFMPEG_NB_THUMBNAIL,
         FFMPEG_PRESET,
         FFMPEG_PROFILE,
-        FFPROBE_CMD,
-        FFPROBE_GET_INFO,
+        FFMPEG_SEGMENT_AUDIO_ENCODE,
+        FFMPEG_SEGMENT_CONCAT,
+        FFMPEG_SEGMENT_DURATION,
+        FFMPEG_SEGMENT_ENCODE,
+        FFMPEG_SEGMENT_HLS,
+        FFMPEG_SEGMENT_SPLIT,
+        FFMPEG_SEGMENT_WORKERS,
+        FFMPEG_SINGLE_PASS,
+        FFMPEG_SINGLE_PASS_FILTER,
+        FFMPEG_SINGLE_PASS_HLS_ENCODE,
+        FFMPEG_SINGLE_PASS_MP3_ENCODE,
+        FFMPEG_SINGLE_PASS_MP4_ENCODE,
+        FFMPEG_SINGLE_PASS_OVERVIEW,
+        FFMPEG_SINGLE_PASS_OVERVIEW_FILTER,
+        FFMPEG_SINGLE_PASS_THUMBNAIL,
+        FFMPEG_SINGLE_PASS_THUMBNAIL_FILTER,
     )
     from encoding_utils import (
         check_file,
+        get_adaptive_ladder,
+        get_complexity_command,
         get_dressing_position_value,
-        get_info_from_video,
+        get_file_signature,
         get_list_rendition,
+        get_probe_cache_key,
+        get_probe_command,
+        get_video_complexity,
         launch_cmd,
+        probe_file,
     )
 else:
     from .encoding_settings import (
+        FFMPEG_ADAPTIVE_LADDER,
         FFMPEG_AUDIO_BITRATE,
         FFMPEG_CMD,
         FFMPEG_CREATE_OVERVIEW,
@@ -79,15 +105,35 @@ else:
         FFMPEG_NB_THUMBNAIL,
         FFMPEG_PRESET,
         FFMPEG_PROFILE,
-        FFPROBE_CMD,
-        FFPROBE_GET_INFO,
+        FFMPEG_SEGMENT_AUDIO_ENCODE,
+        FFMPEG_SEGMENT_CONCAT,
+        FFMPEG_SEGMENT_DURATION,
+        FFMPEG_SEGMENT_ENCODE,
+        FFMPEG_SEGMENT_HLS,
+        FFMPEG_SEGMENT_SPLIT,
+        FFMPEG_SEGMENT_WORKERS,
+        FFMPEG_SINGLE_PASS,
+        FFMPEG_SINGLE_PASS_FILTER,
+        FFMPEG_SINGLE_PASS_HLS_ENCODE,
+        FFMPEG_SINGLE_PASS_MP3_ENCODE,
+        FFMPEG_SINGLE_PASS_MP4_ENCODE,
+        FFMPEG_SINGLE_PASS_OVERVIEW,
+        FFMPEG_SINGLE_PASS_OVERVIEW_FILTER,
+        FFMPEG_SINGLE_PASS_THUMBNAIL,
+        FFMPEG_SINGLE_PASS_THUMBNAIL_FILTER,
     )
     from .encoding_utils import (
         check_file,
+        get_adaptive_ladder,
+        get_complexity_command,
         get_dressing_position_value,
-        get_info_from_video,
+        get_file_signature,
         get_list_rendition,
+        get_probe_cache_key,
+        get_probe_command,
+        get_video_complexity,
         launch_cmd,
+        probe_file,
     )
 
 __author__ = "Nicolas CAN <nicolas.can@univ-lille.fr>"
@@ -106,8 +152,6 @@ try:
     from django.conf import settings
 
     FFMPEG_CMD = getattr(settings, "FFMPEG_CMD", FFMPEG_CMD)
-    FFPROBE_CMD = getattr(settings, "FFPROBE_CMD", FFPROBE_CMD)
-    FFPROBE_GET_INFO = getattr(settings, "FFPROBE_GET_INFO", FFPROBE_GET_INFO)
     FFMPEG_CRF = getattr(settings, "FFMPEG_CRF", FFMPEG_CRF)
     FFMPEG_PRESET = getattr(settings, "FFMPEG_PRESET", FFMPEG_PRESET)
     FFMPEG_PROFILE = getattr(settings, "FFMPEG_PROFILE", FFMPEG_PROFILE)
@@ -160,6 +204,53 @@ try:
     FFMPEG_DRESSING_AUDIO = getattr(
         settings, "FFMPEG_DRESSING_AUDIO", FFMPEG_DRESSING_AUDIO
     )
+    FFMPEG_SINGLE_PASS = getattr(settings, "FFMPEG_SINGLE_PASS", FFMPEG_SINGLE_PASS)
+    FFMPEG_ADAPTIVE_LADDER = getattr(
+        settings, "FFMPEG_ADAPTIVE_LADDER", FFMPEG_ADAPTIVE_LADDER
+    )
+    FFMPEG_SINGLE_PASS_FILTER = getattr(
+        settings, "FFMPEG_SINGLE_PASS_FILTER", FFMPEG_SINGLE_PASS_FILTER
+    )
+    FFMPEG_SINGLE_PASS_HLS_ENCODE = getattr(
+        settings, "FFMPEG_SINGLE_PASS_HLS_ENCODE", FFMPEG_SINGLE_PASS_HLS_ENCODE
+    )
+    FFMPEG_SINGLE_PASS_MP3_ENCODE = getattr(
+        settings, "FFMPEG_SINGLE_PASS_MP3_ENCODE", FFMPEG_SINGLE_PASS_MP3_ENCODE
+    )
+    FFMPEG_SINGLE_PASS_MP4_ENCODE = getattr(
+        settings, "FFMPEG_SINGLE_PASS_MP4_ENCODE", FFMPEG_SINGLE_PASS_MP4_ENCODE
+    )
+    FFMPEG_SINGLE_PASS_OVERVIEW = getattr(
+        settings, "FFMPEG_SINGLE_PASS_OVERVIEW", FFMPEG_SINGLE_PASS_OVERVIEW
+    )
+    FFMPEG_SINGLE_PASS_OVERVIEW_FILTER = getattr(
+        settings, "FFMPEG_SINGLE_PASS_OVERVIEW_FILTER", FFMPEG_SINGLE_PASS_OVERVIEW_FILTER
+    )
+    FFMPEG_SINGLE_PASS_THUMBNAIL = getattr(
+        settings, "FFMPEG_SINGLE_PASS_THUMBNAIL", FFMPEG_SINGLE_PASS_THUMBNAIL
+    )
+    FFMPEG_SINGLE_PASS_THUMBNAIL_FILTER = getattr(
+        settings,
+        "FFMPEG_SINGLE_PASS_THUMBNAIL_FILTER",
+        FFMPEG_SINGLE_PASS_THUMBNAIL_FILTER,
+    )
+    FFMPEG_SEGMENT_AUDIO_ENCODE = getattr(
+        settings, "FFMPEG_SEGMENT_AUDIO_ENCODE", FFMPEG_SEGMENT_AUDIO_ENCODE
+    )
+    FFMPEG_SEGMENT_CONCAT = getattr(
+        settings, "FFMPEG_SEGMENT_CONCAT", FFMPEG_SEGMENT_CONCAT
+    )
+    FFMPEG_SEGMENT_DURATION = getattr(
+        settings, "FFMPEG_SEGMENT_DURATION", FFMPEG_SEGMENT_DURATION
+    )
+    FFMPEG_SEGMENT_ENCODE = getattr(
+        settings, "FFMPEG_SEGMENT_ENCODE", FFMPEG_SEGMENT_ENCODE
+    )
+    FFMPEG_SEGMENT_HLS = getattr(settings, "FFMPEG_SEGMENT_HLS", FFMPEG_SEGMENT_HLS)
+    FFMPEG_SEGMENT_SPLIT = getattr(settings, "FFMPEG_SEGMENT_SPLIT", FFMPEG_SEGMENT_SPLIT)
+    FFMPEG_SEGMENT_WORKERS = getattr(
+        settings, "FFMPEG_SEGMENT_WORKERS", FFMPEG_SEGMENT_WORKERS
+    )
     DEBUG = getattr(settings, "DEBUG", True)
 except ImportError:  # pragma: no cover
     DEBUG = True
@@ -169,6 +260,36 @@ logger = logging.getLogger(__name__)
 if DEBUG:
     logger.setLevel(logging.DEBUG)
 
+CHECKPOINT_FILE = "checkpoint.json"
+# Attributes set by each encoding stage, restored from the checkpoint
+STAGE_ATTRIBUTES = {
+    "probe": [
+        "duration",
+        "list_video_track",
+        "list_audio_track",
+        "list_subtitle_track",
+        "list_image_track",
+        "probe_info",
+        "complexity",
+    ],
+    "dressing": ["video_file"],
+    "single_pass": [
+        "duration",
+        "list_mp4_files",
+        "list_hls_files",
+        "list_mp3_files",
+        "list_thumbnail_files",
+        "list_overview_files",
+    ],
+    "segments": ["list_mp4_files", "list_hls_files"],
+    "video": ["duration", "list_mp4_files"],
+    "hls": ["list_hls_files"],
+    "audio": ["duration", "list_mp3_files", "list_m4a_files"],
+    "thumbnails": ["list_thumbnail_files"],
+    "overview": ["list_overview_files"],
+    "subtitles": ["list_subtitle_files"],
+}
+
 
 class Encoding_video:
     """Encoding video object."""
@@ -196,6 +317,10 @@ class Encoding_video:
     cutting_stop = 0
     json_dressing = None
     dressing_input = ""
+    single_pass = True
+    probe_info = {}
+    complexity = None
+    checkpoint = {}
 
     def __init__(
         self,
@@ -205,6 +330,7 @@ class Encoding_video:
         stop=0,
         json_dressing=None,
         dressing_input="",
+        single_pass=None,
     ) -> None:
         """Initialize a new Encoding_video object."""
         self.id = id
@@ -230,6 +356,10 @@ class Encoding_video:
         self.cutting_stop = stop or 0
         self.json_dressing = json_dressing
         self.dressing_input = dressing_input
+        self.probe_info = {}
+        self.complexity = None
+        self.checkpoint = {}
+        self.single_pass = FFMPEG_SINGLE_PASS if single_pass is None else single_pass
 
     def is_video(self) -> bool:
         """Check if current encoding correspond to a video."""
@@ -244,14 +374,11 @@ class Encoding_video:
     def get_video_data(self) -> None:
         """Get alls tracks from video source and put it in object passed in parameter."""
         msg = "--> get_info_video\n"
-        probe_cmd = FFPROBE_GET_INFO % {
-            "ffprobe": FFPROBE_CMD,
-            "select_streams": "",
-            "source": '"' + self.video_file + '" ',
-        }
+        probe_cmd = get_probe_command(self.video_file)
         msg += probe_cmd + "\n"
         duration = 0
-        info, return_msg = get_info_from_video(probe_cmd)
+        info, return_msg = probe_file(self.video_file)
+        self.probe_info = info or {}
         msg += json.dumps(info, indent=2)
         msg += " \n"
         msg += return_msg + "\n"
@@ -268,16 +395,32 @@ class Encoding_video:
         if self.cutting_start != 0 or self.cutting_stop != 0:
             duration = self.cutting_stop - self.cutting_start
         self.duration = duration
-        streams = info.get("streams", [])
+        streams = info.get("streams", []) if info else []
         for stream in streams:
             self.add_stream(stream)
+        if FFMPEG_ADAPTIVE_LADDER and self.is_video():
+            self.analyse_complexity()
+
+    def analyse_complexity(self) -> None:
+        """Analyse the complexity of the video track to adapt the renditions."""
+        complexity_command = get_complexity_command(self.video_file)
+        self.complexity, return_msg = get_video_complexity(self.video_file, self.duration)
+        msg = return_msg + json.dumps(self.complexity, indent=2)
+        self.add_encoding_log("complexity_command", complexity_command, True, msg)
+
+    def get_rendition_ladder(self):
+        """Get the renditions to encode, adapted to the complexity of the source."""
+        list_rendition = get_list_rendition()
+        if self.complexity and self.is_video():
+            in_height = list(self.list_video_track.items())[0][1]["height"]
+            list_rendition = get_adaptive_ladder(
+                list_rendition, self.complexity, in_height, FFMPEG_CRF
+            )
+        return list_rendition
 
     def fix_duration(self, input_file) -> None:
         msg = "--> get_info_video\n"
-        probe_cmd = 'ffprobe -v quiet -show_entries format=duration -hide_banner  \
-                    -of default=noprint_wrappers=1:nokey=1 -print_format json -i \
-                    "{}"'.format(input_file)
-        info, return_msg = get_info_from_video(probe_cmd)
+        info, return_msg = probe_file(input_file)
         msg += json.dumps(info, indent=2)
         msg += " \n"
         msg += return_msg + "\n"
@@ -335,7 +478,7 @@ class Encoding_video:
 
     def get_mp4_command(self) -> str:
         mp4_command = "%s " % FFMPEG_CMD
-        list_rendition = get_list_rendition()
+        list_rendition = self.get_rendition_ladder()
         # remove rendition if encode_mp4 == False
         for rend in list_rendition.copy():
             if list_rendition[rend]["encode_mp4"] is False:
@@ -356,7 +499,7 @@ class Encoding_video:
             "preset": FFMPEG_PRESET,
             "profile": FFMPEG_PROFILE,
             "level": FFMPEG_LEVEL,
-            "crf": FFMPEG_CRF,
+            "crf": first_item[1].get("crf", FFMPEG_CRF),
             "maxrate": first_item[1]["maxrate"],
             "bufsize": first_item[1]["maxrate"],
             "ba": first_item[1]["audio_bitrate"],
@@ -385,7 +528,7 @@ class Encoding_video:
                     "preset": FFMPEG_PRESET,
                     "profile": FFMPEG_PROFILE,
                     "level": FFMPEG_LEVEL,
-                    "crf": FFMPEG_CRF,
+                    "crf": list_rendition[rend].get("crf", FFMPEG_CRF),
                     "maxrate": list_rendition[rend]["maxrate"],
                     "bufsize": list_rendition[rend]["maxrate"],
                     "ba": list_rendition[rend]["audio_bitrate"],
@@ -396,7 +539,7 @@ class Encoding_video:
 
     def get_hls_command(self) -> str:
         hls_command = "%s " % FFMPEG_CMD
-        list_rendition = get_list_rendition()
+        list_rendition = self.get_rendition_ladder()
         hls_command += FFMPEG_INPUT % {
             "input": self.video_file,
             "nb_threads": FFMPEG_NB_THREADS,
@@ -407,7 +550,8 @@ class Encoding_video:
             "preset": FFMPEG_PRESET,
             "profile": FFMPEG_PROFILE,
             "level": FFMPEG_LEVEL,
-            "crf": FFMPEG_CRF,
+            # the crf of the adaptive ladder is the same for all the renditions
+            "crf": next(iter(list_rendition.values()), {}).get("crf", FFMPEG_CRF),
         }
         hls_command += hls_common_params
         in_height = list(self.list_video_track.items())[0][1]["height"]
@@ -654,15 +798,23 @@ class Encoding_video:
 
     def encode_video_part(self) -> None:
         """Encode the video part of a file."""
+        self.encode_mp4_part()
+        self.encode_hls_part()
+
+    def encode_mp4_part(self) -> None:
+        """Encode the MP4 renditions of a video."""
         mp4_command = self.get_mp4_command()
         return_value, return_msg = launch_cmd(mp4_command)
         self.add_encoding_log("mp4_command", mp4_command, return_value, return_msg)
         if not return_value:
             self.error_encoding = True
         if self.duration == 0:
-            list_rendition = get_list_rendition()
+            list_rendition = self.get_rendition_ladder()
             first_item = list_rendition.popitem(last=False)
             self.fix_duration(self.list_mp4_files[first_item[0]])
+
+    def encode_hls_part(self) -> None:
+        """Encode the HLS renditions of a video."""
         hls_command = self.get_hls_command()
         return_value, return_msg = launch_cmd(hls_command)
         if return_value:
@@ -670,7 +822,7 @@ class Encoding_video:
         self.add_encoding_log("hls_command", hls_command, return_value, return_msg)
 
     def create_main_livestream(self) -> None:
-        list_rendition = get_list_rendition()
+        list_rendition = self.get_rendition_ladder()
         livestream_content = ""
         for index, rend in enumerate(list_rendition):
             rend_livestream = os.path.join(
@@ -775,7 +927,7 @@ class Encoding_video:
 
     def get_first_item(self):
         """Get the first mp4 render from setting."""
-        list_rendition = get_list_rendition()
+        list_rendition = self.get_rendition_ladder()
         for rend in list_rendition.copy():
             if list_rendition[rend]["encode_mp4"] is False:
                 list_rendition.pop(rend)
@@ -789,14 +941,8 @@ class Encoding_video:
         if not first_item or first_item[0] not in self.list_mp4_files:
             logger.error("No MP4 rendition available to create overview.")
             return
-        # overview combine for 160x90
-        in_height = list(self.list_video_track.items())[0][1]["height"]
-        in_width = list(self.list_video_track.items())[0][1]["width"]
-        image_height = 90
-        coef = in_height / image_height
-        image_width = int(in_width / coef)
+        image_width, image_height, nb_img = self.get_overview_size()
         input_file = self.list_mp4_files[first_item[0]]
-        nb_img = 100 if self.duration >= 100 else 10
 
         overviewimagefilename = os.path.join(self.output_dir, "overview.png")
         overview_image_command = (
@@ -819,7 +965,23 @@ class Encoding_video:
         return_value, output_message = launch_cmd(overview_image_command)
         if not return_value or not check_file(overviewimagefilename):
             logger.error(f"FFmpeg failed with output: {output_message}")
+        self.save_overview(overviewimagefilename, image_width, image_height, nb_img)
 
+    def get_overview_size(self) -> tuple:
+        """Get the width, height and number of images of the overview."""
+        # overview combine for 160x90
+        in_height = list(self.list_video_track.items())[0][1]["height"]
+        in_width = list(self.list_video_track.items())[0][1]["width"]
+        image_height = 90
+        coef = in_height / image_height
+        image_width = int(in_width / coef)
+        nb_img = 100 if self.duration >= 100 else 10
+        return image_width, image_height, nb_img
+
+    def save_overview(
+        self, overviewimagefilename, image_width, image_height, nb_img
+    ) -> None:
+        """Write the overview VTT file pointing to the overview image."""
         overviewfilename = os.path.join(self.output_dir, "overview.vtt")
         image_url = os.path.basename(overviewimagefilename)
         webvtt = WebVTT()
@@ -849,6 +1011,14 @@ class Encoding_video:
             self.add_encoding_log("create_overview", "", False, "")
 
     def encode_image_part(self) -> None:
+        self.encode_thumbnail_part()
+        # on ne fait pas d'overview pour les videos de moins de 10 secondes
+        # (laisser les 10sec inclus pour laisser les tests passer) --> OK
+        if self.is_video() and self.duration >= 10:
+            self.create_overview()
+
+    def encode_thumbnail_part(self) -> None:
+        """Extract the thumbnails of the image tracks or create them from the video."""
         if len(self.list_image_track) > 0:
             thumbnail_command = self.get_extract_thumbnail_command()
             return_value, return_msg = launch_cmd(thumbnail_command)
@@ -861,10 +1031,386 @@ class Encoding_video:
             self.add_encoding_log(
                 "create_thumbnail_command", thumbnail_command, return_value, return_msg
             )
-        # on ne fait pas d'overview pour les videos de moins de 10 secondes
-        # (laisser les 10sec inclus pour laisser les tests passer) --> OK
-        if self.is_video() and self.duration >= 10:
-            self.create_overview()
+
+    def use_single_pass(self) -> bool:
+        """Check if all the outputs can be encoded from a single decode."""
+        return self.single_pass and self.is_video() and self.duration > 0
+
+    def get_single_pass_renditions(self) -> list:
+        """Get the MP4 and HLS outputs to encode, as (format, rendition, height)."""
+        list_rendition = self.get_rendition_ladder()
+        in_height = list(self.list_video_track.items())[0][1]["height"]
+        first_item = self.get_first_item()
+        outputs = []
+        for index, rend in enumerate(list_rendition):
+            resolution_threshold = rend - rend * (
+                list_rendition[rend]["encoding_resolution_threshold"] / 100
+            )
+            if first_item and rend == first_item[0]:
+                outputs.append(("mp4", rend, rend))
+            elif (
+                list_rendition[rend]["encode_mp4"] is not False
+                and in_height >= resolution_threshold
+            ):
+                outputs.append(("mp4", rend, min(rend, in_height)))
+            if in_height >= resolution_threshold or index == 0:
+                outputs.append(("hls", rend, min(rend, in_height)))
+        return outputs
+
+    def get_single_pass_video_outputs(self, list_rendition, video, audio) -> dict:
+        """Add the MP4 and HLS outputs to the single pass command."""
+        stages = {"mp4_command": [], "hls_command": []}
+        for encode_format, rend, height in self.get_single_pass_renditions():
+            params = {
+                "video": video("scale=-2:%s" % height),
+                "map_audio": '-map "[%s]"' % audio() if audio else "",
+                "libx": FFMPEG_LIBX,
+                "height": height,
+                "preset": FFMPEG_PRESET,
+                "profile": FFMPEG_PROFILE,
+                "level": FFMPEG_LEVEL,
+                "crf": list_rendition[rend].get("crf", FFMPEG_CRF),
+                "maxrate": list_rendition[rend]["maxrate"],
+                "bufsize": list_rendition[rend]["maxrate"],
+                "ba": list_rendition[rend]["audio_bitrate"],
+                "hls_time": FFMPEG_HLS_TIME,
+            }
+            if encode_format == "mp4":
+                params["output"] = os.path.join(self.output_dir, "%sp.mp4" % rend)
+                stages["mp4_command"].append(FFMPEG_SINGLE_PASS_MP4_ENCODE % params)
+                self.list_mp4_files[rend] = params["output"]
+            else:
+                params["output"] = os.path.join(self.output_dir, "%sp.m3u8" % rend)
+                stages["hls_command"].append(FFMPEG_SINGLE_PASS_HLS_ENCODE % params)
+                self.list_hls_files[rend] = params["output"]
+        return stages
+
+    def get_single_pass_image_outputs(self, video) -> dict:
+        """Add the thumbnail and overview outputs to the single pass command."""
+        stages = {}
+        if len(self.list_image_track) == 0:
+            output_file = os.path.join(self.output_dir, "thumbnail")
+            filter_thumbnail = FFMPEG_SINGLE_PASS_THUMBNAIL_FILTER % {
+                "duration": self.duration,
+                "nb_thumbnail": FFMPEG_NB_THUMBNAIL,
+            }
+            stages["create_thumbnail_command"] = [
+                FFMPEG_SINGLE_PASS_THUMBNAIL
+                % {"video": video(filter_thumbnail), "output": output_file}
+            ]
+            for nb in range(0, FFMPEG_NB_THUMBNAIL):
+                num_thumb = str(nb + 1)
+                self.list_thumbnail_files[num_thumb] = "%s_000%s.png" % (
+                    output_file,
+                    num_thumb,
+                )
+        if self.duration >= 10:
+            image_width, image_height, nb_img = self.get_overview_size()
+            filter_overview = FFMPEG_SINGLE_PASS_OVERVIEW_FILTER % {
+                "duration": self.duration,
+                "image_count": nb_img,
+                "width": image_width,
+                "height": image_height,
+            }
+            stages["create_overview"] = [
+                FFMPEG_SINGLE_PASS_OVERVIEW
+                % {
+                    "video": video(filter_overview),
+                    "output": os.path.join(self.output_dir, "overview.png"),
+                }
+            ]
+        return stages
+
+    def get_single_pass_command(self) -> tuple:
+        """
+        Get one ffmpeg command encoding all the outputs from a single decode.
+
+        The decoded video and audio are duplicated with the split and asplit
+        filters to feed every output of the command.
+
+        Returns:
+            tuple: the command and the output parameters of each encoding stage.
+        """
+        video_filters = []
+        audio_labels = []
+
+        def video(filters) -> str:
+            """Add a video output with its filters, return its label."""
+            video_filters.append(filters)
+            return "vout%s" % (len(video_filters) - 1)
+
+        def audio() -> str:
+            """Add an audio output, return its label."""
+            audio_labels.append("a%s" % len(audio_labels))
+            return audio_labels[-1]
+
+        has_audio = len(self.list_audio_track) > 0
+        stages = self.get_single_pass_video_outputs(
+            self.get_rendition_ladder(), video, audio if has_audio else None
+        )
+        if has_audio:
+            output_file = os.path.join(
+                self.output_dir, "audio_%s.mp3" % FFMPEG_AUDIO_BITRATE
+            )
+            stages["mp3_command"] = [
+                FFMPEG_SINGLE_PASS_MP3_ENCODE % {"audio": audio(), "output": output_file}
+            ]
+            self.list_mp3_files[FFMPEG_AUDIO_BITRATE] = output_file
+        stages.update(self.get_single_pass_image_outputs(video))
+
+        filter_complex = ["[0:v:0]split=%s" % len(video_filters)]
+        filter_complex[0] += "".join("[v%s]" % i for i in range(len(video_filters)))
+        for i, filters in enumerate(video_filters):
+            filter_complex.append("[v%s]%s[vout%s]" % (i, filters, i))
+        if has_audio:
+            filter_complex.append(
+                "[0:a:0]asplit=%s%s"
+                % (len(audio_labels), "".join("[%s]" % a for a in audio_labels))
+            )
+        single_pass_command = "%s %s" % (
+            FFMPEG_CMD,
+            self.get_subtime(self.cutting_start, self.cutting_stop),
+        )
+        single_pass_command += FFMPEG_INPUT % {
+            "input": self.video_file,
+            "nb_threads": FFMPEG_NB_THREADS,
+        }
+        single_pass_command += FFMPEG_SINGLE_PASS_FILTER % {
+            "filter": ";".join(filter_complex)
+        }
+        for outputs in stages.values():
+            single_pass_command += "".join(outputs)
+        return single_pass_command, stages
+
+    def encode_single_pass(self) -> None:
+        """Encode the video, audio and image parts of a file from a single decode."""
+        single_pass_command, stages = self.get_single_pass_command()
+        return_value, return_msg = launch_cmd(single_pass_command)
+        self.add_encoding_log(
+            "single_pass_command", single_pass_command, return_value, return_msg
+        )
+        if not return_value:
+            # The filter graph failed: encode the outputs with one command each
+            self.single_pass = False
+            self.list_mp4_files = {}
+            self.list_hls_files = {}
+            self.list_mp3_files = {}
+            self.list_thumbnail_files = {}
+            return
+        # Keep one log entry by encoding stage, as with the separate commands
+        stage_files = {
+            "mp4_command": self.list_mp4_files.values(),
+            "hls_command": self.list_hls_files.values(),
+            "mp3_command": self.list_mp3_files.values(),
+            "create_thumbnail_command": self.list_thumbnail_files.values(),
+            "create_overview": [os.path.join(self.output_dir, "overview.png")],
+        }
+        for title, outputs in stages.items():
+            missing_files = [
+                output_file
+                for output_file in stage_files[title]
+                if not check_file(output_file)
+            ]
+            msg = "Missing files: %s" % ", ".join(missing_files) if missing_files else ""
+            self.add_encoding_log(
+                title, "".join(outputs), return_value and not missing_files, msg
+            )
+        if return_value:
+            self.create_main_livestream()
+        if "create_overview" in stages:
+            self.save_overview(
+                stage_files["create_overview"][0], *self.get_overview_size()
+            )
+        if len(self.list_image_track) > 0:
+            thumbnail_command = self.get_extract_thumbnail_command()
+            return_value, return_msg = launch_cmd(thumbnail_command)
+            self.add_encoding_log(
+                "extract_thumbnail_command", thumbnail_command, return_value, return_msg
+            )
+
+    def use_segments(self) -> bool:
+        """Check if the video is long enough to be encoded by segments."""
+        return (
+            FFMPEG_SEGMENT_DURATION > 0
+            and self.is_video()
+            and self.duration >= 2 * FFMPEG_SEGMENT_DURATION
+            and self.cutting_start == 0
+            and self.cutting_stop == 0
+        )
+
+    def get_segment_split_command(self, segments_dir) -> str:
+        """Get the command splitting the video track at keyframes, without encoding."""
+        split_command = "%s " % FFMPEG_CMD
+        split_command += FFMPEG_INPUT % {
+            "input": self.video_file,
+            "nb_threads": FFMPEG_NB_THREADS,
+        }
+        split_command += FFMPEG_SEGMENT_SPLIT % {
+            "segment_time": FFMPEG_SEGMENT_DURATION,
+            "output": os.path.join(segments_dir, "segment_%04d.mkv"),
+        }
+        return split_command
+
+    def get_segment_encode_command(self, segment_file, renditions) -> str:
+        """Get the command encoding a segment in each rendition from a single decode."""
+        list_rendition = self.get_rendition_ladder()
+        segment_command = "%s " % FFMPEG_CMD
+        segment_command += FFMPEG_INPUT % {
+            "input": segment_file,
+            "nb_threads": FFMPEG_NB_THREADS,
+        }
+        for rend, height in renditions:
+            segment_command += FFMPEG_SEGMENT_ENCODE % {
+                "libx": FFMPEG_LIBX,
+                "height": height,
+                "preset": FFMPEG_PRESET,
+                "profile": FFMPEG_PROFILE,
+                "level": FFMPEG_LEVEL,
+                "crf": list_rendition[rend].get("crf", FFMPEG_CRF),
+                "maxrate": list_rendition[rend]["maxrate"],
+                "bufsize": list_rendition[rend]["maxrate"],
+                "output": "%s_%s_%s.mp4"
+                % (os.path.splitext(segment_file)[0], rend, height),
+            }
+        return segment_command
+
+    def get_segment_audio_command(self, audio_bitrate, output_file) -> str:
+        """Get the command encoding the whole audio track, joined to the segments."""
+        audio_command = "%s " % FFMPEG_CMD
+        audio_command += FFMPEG_INPUT % {
+            "input": self.video_file,
+            "nb_threads": FFMPEG_NB_THREADS,
+        }
+        audio_command += FFMPEG_SEGMENT_AUDIO_ENCODE % {
+            "ba": audio_bitrate,
+            "output": output_file,
+        }
+        return audio_command
+
+    def get_segment_concat_command(self, segment_files, audio_file, output_file) -> str:
+        """Get the command joining the encoded segments and the audio track."""
+        list_file = os.path.join(
+            os.path.dirname(segment_files[0]),
+            "%s.txt" % os.path.splitext(os.path.basename(output_file))[0],
+        )
+        with open(list_file, "w") as file:
+            for segment_file in segment_files:
+                file.write("file '%s'\n" % segment_file)
+        concat_command = "%s " % FFMPEG_CMD
+        concat_command += FFMPEG_SEGMENT_CONCAT % {
+            "input": list_file,
+            "audio_input": '-i "%s"' % audio_file if audio_file else "",
+            "map_audio": "-map 1:a:0" if audio_file else "",
+            "output": output_file,
+        }
+        return concat_command
+
+    def launch_parallel_commands(self, commands) -> bool:
+        """Launch the commands in parallel, log their results and check them all."""
+        success = True
+        with ThreadPoolExecutor(max_workers=FFMPEG_SEGMENT_WORKERS) as executor:
+            results = executor.map(launch_cmd, commands.values())
+            for (title, command), (return_value, return_msg) in zip(
+                commands.items(), results
+            ):
+                self.add_encoding_log(title, command, return_value, return_msg)
+                success = success and bool(return_value)
+        return success
+
+    def encode_without_segments(self, segments_dir, msg) -> None:
+        """Encode the video part in a single file after a failure of the segments."""
+        logger.warning("encode_segments_part {id: %s}: %s" % (self.id, msg))
+        self.add_encoding_log("encode_segments_part", "", False, msg)
+        shutil.rmtree(segments_dir, ignore_errors=True)
+        # the failed segment commands stay in the log, the fallback decides the result
+        self.error_encoding = False
+        self.encode_mp4_part()
+        self.encode_hls_part()
+
+    def encode_segments_part(self) -> None:
+        """
+        Encode the video part of a long file by segments.
+
+        The video track is split at keyframes, the segments are encoded in
+        parallel in every rendition, then joined with the audio track in the
+        MP4 renditions. The HLS renditions are packaged from the joined files.
+        If the split or a segment fails, the video is encoded in a single file.
+        """
+        list_rendition = self.get_rendition_ladder()
+        segments_dir = os.path.join(self.output_dir, "segments")
+        os.makedirs(segments_dir, exist_ok=True)
+        split_command = self.get_segment_split_command(segments_dir)
+        return_value, return_msg = launch_cmd(split_command)
+        self.add_encoding_log(
+            "segment_split_command", split_command, return_value, return_msg
+        )
+        segments = sorted(glob(os.path.join(segments_dir, "segment_*.mkv")))
+        if not return_value or len(segments) == 0:
+            self.encode_without_segments(segments_dir, "No segment")
+            return
+        outputs = self.get_single_pass_renditions()
+        renditions = list(dict.fromkeys((rend, height) for _, rend, height in outputs))
+        commands = {
+            "segment_%s_command"
+            % index: self.get_segment_encode_command(segment, renditions)
+            for index, segment in enumerate(segments)
+        }
+        audio_files = {}
+        if len(self.list_audio_track) > 0:
+            for rend, height in renditions:
+                audio_bitrate = list_rendition[rend]["audio_bitrate"]
+                audio_files[rend] = os.path.join(
+                    segments_dir, "audio_%s.m4a" % audio_bitrate
+                )
+                commands["segment_audio_%s_command" % audio_bitrate] = (
+                    self.get_segment_audio_command(audio_bitrate, audio_files[rend])
+                )
+        if not self.launch_parallel_commands(commands):
+            self.encode_without_segments(segments_dir, "Segment encoding failed")
+            return
+        for rend, height in renditions:
+            if ("mp4", rend, height) in outputs:
+                output_file = os.path.join(self.output_dir, "%sp.mp4" % rend)
+                self.list_mp4_files[rend] = output_file
+            else:
+                output_file = os.path.join(segments_dir, "%s_%s.mp4" % (rend, height))
+            segment_files = [
+                "%s_%s_%s.mp4" % (os.path.splitext(segment)[0], rend, height)
+                for segment in segments
+            ]
+            concat_command = self.get_segment_concat_command(
+                segment_files, audio_files.get(rend), output_file
+            )
+            return_value, return_msg = launch_cmd(concat_command)
+            self.add_encoding_log(
+                "concat_%s_%s_command" % (rend, height),
+                concat_command,
+                return_value,
+                return_msg,
+            )
+            if ("hls", rend, height) in outputs:
+                self.package_segments_hls(rend, height, output_file)
+        self.create_main_livestream()
+        shutil.rmtree(segments_dir, ignore_errors=True)
+
+    def package_segments_hls(self, rend, height, input_file) -> None:
+        """Package an encoded rendition in HLS, without encoding it again."""
+        output_file = os.path.join(self.output_dir, "%sp.m3u8" % rend)
+        hls_command = "%s " % FFMPEG_CMD
+        hls_command += FFMPEG_INPUT % {
+            "input": input_file,
+            "nb_threads": FFMPEG_NB_THREADS,
+        }
+        hls_command += FFMPEG_SEGMENT_HLS % {
+            "hls_time": FFMPEG_HLS_TIME,
+            "height": height,
+            "output": output_file,
+        }
+        return_value, return_msg = launch_cmd(hls_command)
+        self.add_encoding_log(
+            "hls_%s_command" % rend, hls_command, return_value, return_msg
+        )
+        self.list_hls_files[rend] = output_file
 
     def get_extract_subtitle_command(self) -> str:
         subtitle_command = "%s " % FFMPEG_CMD
@@ -893,6 +1439,8 @@ class Encoding_video:
     def export_to_json(self) -> None:
         data_to_dump = {}
         for attribute, value in self.__dict__.items():
+            if attribute == "checkpoint":
+                continue
             data_to_dump[attribute] = value
         with open(self.output_dir + "/info_video.json", "w") as outfile:
             json.dump(data_to_dump, outfile, indent=2)
@@ -903,27 +1451,160 @@ class Encoding_video:
         if result is False and self.error_encoding is False:
             self.error_encoding = True
 
+    def get_checkpoint_file(self) -> str:
+        return os.path.join(self.get_output_dir(), CHECKPOINT_FILE)
+
+    def get_checkpoint_key(self) -> str:
+        """Get the key of the source file and of the parameters of the encoding."""
+        parameters = [
+            get_probe_cache_key(self.video_file) or self.video_file,
+            self.cutting_start,
+            self.cutting_stop,
+            self.json_dressing,
+            list(get_list_rendition().values()),
+        ]
+        return hashlib.sha256(
+            json.dumps(parameters, sort_keys=True, default=str).encode("utf-8")
+        ).hexdigest()
+
+    def load_checkpoint(self) -> None:
+        """Load the stages done by a previous run of the same encoding."""
+        self.checkpoint = {
+            "key": self.get_checkpoint_key(),
+            "stages": {},
+            "previous_stages": {},
+            "resume": True,
+        }
+        try:
+            with open(self.get_checkpoint_file(), "r") as json_file:
+                checkpoint = json.load(json_file)
+        except (OSError, ValueError):
+            return
+        if checkpoint.get("key") == self.checkpoint["key"]:
+            self.checkpoint["previous_stages"] = checkpoint.get("stages", {})
+
+    def save_checkpoint(self) -> None:
+        """Write the done stages, replacing the checkpoint file at once."""
+        checkpoint_file = self.get_checkpoint_file()
+        with open(checkpoint_file + ".tmp", "w") as outfile:
+            json.dump(
+                {"key": self.checkpoint["key"], "stages": self.checkpoint["stages"]},
+                outfile,
+                indent=2,
+            )
+        os.replace(checkpoint_file + ".tmp", checkpoint_file)
+
+    def remove_checkpoint(self) -> None:
+        """Remove the checkpoint once the encoding is stored."""
+        if os.path.exists(self.get_checkpoint_file()):
+            os.remove(self.get_checkpoint_file())
+
+    def get_stage_files(self, attributes) -> list:
+        """Get the files produced by a stage, listed in its attributes."""
+        files = []
+        for attribute in attributes:
+            value = getattr(self, attribute)
+            values = value.values() if isinstance(value, dict) else [value]
+            files += [
+                path for path in values if isinstance(path, str) and check_file(path)
+            ]
+        return files
+
+    def restore_stage(self, stage) -> bool:
+        """Restore a stage done by a previous run if its output files are unchanged."""
+        done_stage = self.checkpoint["previous_stages"].get(stage)
+        if not self.checkpoint["resume"] or done_stage is None:
+            return False
+        for path, signature in done_stage["files"].items():
+            if not check_file(path) or get_file_signature(path) != signature:
+                return False
+        for attribute, value in done_stage["attributes"].items():
+            # the keys of the dicts are kept as pairs, the renditions are int
+            setattr(self, attribute, dict(value) if isinstance(value, list) else value)
+        self.encoding_log.update(done_stage["encoding_log"])
+        self.add_encoding_log(
+            "checkpoint_%s" % stage, "", True, "Stage restored from the checkpoint"
+        )
+        self.checkpoint["stages"][stage] = done_stage
+        return True
+
+    def run_stage(self, stage, method) -> None:
+        """
+        Run an encoding stage, or restore it from the checkpoint of a previous run.
+
+        The stages are restored in order, up to the first one to run again.
+        A stage ended without error is saved in the checkpoint with the
+        size and modification time of its output files.
+        """
+        if self.restore_stage(stage):
+            logger.debug("* %s restored from checkpoint" % stage)
+            return
+        logger.debug("* %s" % stage)
+        self.checkpoint["resume"] = False
+        log_titles = list(self.encoding_log)
+        error_encoding = self.error_encoding
+        self.error_encoding = False
+        method()
+        # a source not read by ffprobe is probed again on the next run
+        if not self.error_encoding and (stage != "probe" or self.probe_info):
+            attributes = STAGE_ATTRIBUTES[stage]
+            self.checkpoint["stages"][stage] = {
+                "attributes": {
+                    attribute: (
+                        list(getattr(self, attribute).items())
+                        if isinstance(getattr(self, attribute), dict)
+                        else getattr(self, attribute)
+                    )
+                    for attribute in attributes
+                },
+                "files": {
+                    path: get_file_signature(path)
+                    for path in self.get_stage_files(attributes)
+                },
+                "encoding_log": {
+                    title: log
+                    for title, log in self.encoding_log.items()
+                    if title not in log_titles
+                },
+            }
+            self.save_checkpoint()
+        self.error_encoding = self.error_encoding or error_encoding
+
+    def encode_outputs(self) -> None:
+        """Run the encoding stages of the video, audio and image outputs."""
+        if self.use_single_pass() and not self.use_segments():
+            error_encoding = self.error_encoding
+            self.run_stage("single_pass", self.encode_single_pass)
+            if self.single_pass:
+                return
+            # the failed single pass is not an error of the encoding
+            self.error_encoding = error_encoding
+        if self.use_segments():
+            self.run_stage("segments", self.encode_segments_part)
+        elif self.is_video():
+            self.run_stage("video", self.encode_mp4_part)
+            self.run_stage("hls", self.encode_hls_part)
+        if len(self.list_audio_track) > 0:
+            self.run_stage("audio", self.encode_audio_part)
+        self.run_stage("thumbnails", self.encode_thumbnail_part)
+        # on ne fait pas d'overview pour les videos de moins de 10 secondes
+        if self.is_video() and self.duration >= 10:
+            self.run_stage("overview", self.create_overview)
+
     def start_encode(self) -> None:
         self.start = time.ctime()
         self.create_output_dir()
-        self.get_video_data()
+        self.load_checkpoint()
+        self.run_stage("probe", self.get_video_data)
         if self.json_dressing is not None:
-            self.encode_video_dressing()
+            self.run_stage("dressing", self.encode_video_dressing)
         logger.info(
             "start_encode {id: %s, file: %s, duration: %s}"
             % (self.id, self.video_file, self.duration)
         )
-        if self.is_video():
-            logger.debug("* encode_video_part")
-            self.encode_video_part()
-        if len(self.list_audio_track) > 0:
-            logger.debug("* encode_audio_part")
-            self.encode_audio_part()
-        logger.debug("* encode_image_part")
-        self.encode_image_part()
+        self.encode_outputs()
         if len(self.list_subtitle_track) > 0:
-            logger.debug("* get_subtitle_part")
-            self.get_subtitle_part()
+            self.run_stage("subtitles", self.get_subtitle_part)
         self.stop = time.ctime()
         self.export_to_json()
 
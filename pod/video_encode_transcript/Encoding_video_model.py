@@ -5,6 +5,7 @@ import logging
 import os
 import re
 import time
+from typing import Optional
 
 from django.conf import settings
 from django.core.files import File
@@ -13,6 +14,7 @@ from pod.completion.models import Track
 from pod.video.models import LANG_CHOICES, Video
 
 from .encoding_utils import check_file, launch_cmd
+from .fingerprint import link_file
 from .Encoding_video import (
     FFMPEG_CMD,
     FFMPEG_CREATE_THUMBNAIL,
@@ -27,6 +29,7 @@ from .models import (
     EncodingVideo,
     PlaylistVideo,
     VideoRendition,
+    VideoStreamInfo,
 )
 
 DEBUG = getattr(settings, "DEBUG", True)
@@ -192,6 +195,21 @@ class Encoding_video_model(Encoding_video):
                 source_file=playlist_file,
             )
 
+    def store_json_stream_info(self, info_video, video_to_encode) -> None:
+        """Store the stream metadata of the source, read by ffprobe."""
+        video_tracks = list(info_video.get("list_video_track", {}).values())
+        VideoStreamInfo.objects.update_or_create(
+            video=video_to_encode,
+            defaults={
+                "has_video": len(video_tracks) > 0,
+                "has_audio": len(info_video.get("list_audio_track", {})) > 0,
+                "width": video_tracks[0]["width"] if video_tracks else 0,
+                "height": video_tracks[0]["height"] if video_tracks else 0,
+                "info": info_video.get("probe_info") or {},
+                "complexity": info_video.get("complexity") or {},
+            },
+        )
+
     def store_json_encoding_log(self, info_video, video_to_encode) -> None:
         # Need to modify start and stop
         log_to_text = ""
@@ -319,6 +337,7 @@ class Encoding_video_model(Encoding_video):
             video_to_encode.duration = info_video["duration"]
             video_to_encode.save()
 
+            self.store_json_stream_info(info_video, video_to_encode)
             self.store_json_list_mp3_m4a_files(info_video, video_to_encode)
             self.store_json_list_mp4_hls_files(info_video, video_to_encode)
             self.store_json_encoding_log(info_video, video_to_encode)
@@ -326,6 +345,8 @@ class Encoding_video_model(Encoding_video):
             # update and create new video to be sur that thumbnail and overview be present
             self.store_json_list_thumbnail_files(info_video)
             video = self.store_json_list_overview_files(info_video)
+            # the encoding is stored, a new one will start from the first stage
+            self.remove_checkpoint()
 
             return video
 
@@ -399,6 +420,86 @@ class Encoding_video_model(Encoding_video):
             info_video["list_thumbnail_files"] = self.list_thumbnail_files
             self.store_json_list_thumbnail_files(info_video)
 
+    def link_encoded_files(self, source_video) -> dict:
+        """
+        Link the encoded files of a video in the output dir.
+
+        Returns:
+            dict: the linked files by source file, with the method used.
+        Raises:
+            OSError: if a file is missing or cannot be linked. The files
+                already linked are removed.
+        """
+        source_files = [
+            encoding.source_file.path
+            for model_class in (EncodingVideo, EncodingAudio, PlaylistVideo)
+            for encoding in model_class.objects.filter(video=source_video)
+        ]
+        if source_video.overview:
+            overview_dir = os.path.dirname(source_video.overview.path)
+            source_files += [
+                os.path.join(overview_dir, "overview.png"),
+                source_video.overview.path,
+            ]
+        linked_files = {}
+        try:
+            for source_file in source_files:
+                if not os.path.isfile(source_file):
+                    raise FileNotFoundError(source_file)
+                output_file = os.path.join(self.output_dir, os.path.basename(source_file))
+                linked_files[source_file] = (
+                    output_file,
+                    link_file(source_file, output_file),
+                )
+        except OSError:
+            for output_file, _ in linked_files.values():
+                os.remove(output_file)
+            raise
+        return linked_files
+
+    def reuse_encoding(self, source_video) -> Optional[Video]:
+        """
+        Link the encoded files of a video with the same source instead of encoding.
+
+        Returns None, without any change to the video, if a file of the
+        source video is missing or cannot be linked.
+        """
+        self.create_output_dir()
+        try:
+            linked_files = self.link_encoded_files(source_video)
+        except OSError as err:
+            logger.warning(
+                "reuse_encoding {id: %s, source: %s}: %s"
+                % (self.id, source_video.id, err)
+            )
+            return None
+        video_to_encode = Video.objects.get(id=self.id)
+        msg = "\nREUSE ENCODING OF VIDEO %s" % source_video.id
+        for model_class in (EncodingVideo, EncodingAudio, PlaylistVideo):
+            for encoding in model_class.objects.filter(video=source_video):
+                output_file, method = linked_files[encoding.source_file.path]
+                msg += "\n%s: %s" % (method, output_file)
+                encoding.pk = None
+                encoding.video = video_to_encode
+                encoding.source_file = self.get_true_path(output_file)
+                encoding.save()
+        if source_video.overview:
+            output_file, method = linked_files[source_video.overview.path]
+            video_to_encode.overview = self.get_true_path(output_file)
+        video_to_encode.duration = source_video.duration
+        video_to_encode.is_video = source_video.is_video
+        video_to_encode.encoding_in_progress = False
+        video_to_encode.save()
+        self.add_encoding_log("reuse_encoding", "", True, msg)
+        # The thumbnails and the subtitle tracks are linked to the video objects
+        self.recreate_thumbnail()
+        self.store_json_stream_info(self.__dict__, video_to_encode)
+        self.get_subtitle_part()
+        self.store_json_list_subtitle_files(
+            {"list_subtitle_files": self.list_subtitle_files}, video_to_encode
+        )
+        return Video.objects.get(id=self.id)
+
     def encode_video(self) -> None:
         """Start video encoding."""
         self.start_encode()
@@ -14,12 +14,14 @@ from pod.video.models import Video
 
 from .models import (
     EncodingAudio,
+    EncodingFingerprint,
     EncodingLog,
     EncodingStep,
     EncodingVideo,
     PlaylistVideo,
     RunnerManager,
     Task,
+    TranscriptionCache,
     VideoRendition,
 )
 from .task_queue import refresh_pending_task_ranks
@@ -118,6 +120,32 @@ class EncodingStepAdmin(admin.ModelAdmin):
         return qs
 
 
+@admin.register(EncodingFingerprint)
+class EncodingFingerprintAdmin(admin.ModelAdmin):
+    """Admin model for EncodingFingerprint."""
+
+    list_display = ("video", "fingerprint", "date")
+    readonly_fields = ("video", "fingerprint", "date")
+    search_fields = ["id", "video__id", "video__title", "fingerprint"]
+
+    def get_queryset(self, request):
+        """Get the queryset based on the request."""
+        qs = super().get_queryset(request)
+        if not request.user.is_superuser:
+            qs = qs.filter(video__sites=get_current_site(request))
+        return qs
+
+
+@admin.register(TranscriptionCache)
+class TranscriptionCacheAdmin(admin.ModelAdmin):
+    """Admin model for TranscriptionCache."""
+
+    list_display = ("fingerprint", "lang", "hit_count", "date_added", "date_used")
+    readonly_fields = ("fingerprint", "lang", "vtt", "hit_count", "date_added")
+    list_filter = ["lang"]
+    search_fields = ["fingerprint"]
+
+
 @admin.register(VideoRendition)
 class VideoRenditionAdmin(admin.ModelAdmin):
     """Admin model for VideoRendition."""
@@ -190,13 +218,14 @@ class RunnerManagerAdmin(admin.ModelAdmin):
         "name",
         "active_badge",
         "priority",
+        "capacity",
         "url",
         "runner_admin_link",
         "site",
     )
     list_display_links = ("id", "name")
     ordering = ("-id", "priority")
-    readonly_fields = []
+    readonly_fields = ["latency", "failure_count", "unavailable_until"]
     search_fields = ["id", "name", "site"]
     list_filter = ("is_active", "site")
 
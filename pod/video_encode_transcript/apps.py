@@ -1,4 +1,5 @@
 from django.apps import AppConfig
+from django.db.models.signals import post_migrate
 from django.utils.translation import gettext_lazy as _
 
 
@@ -8,3 +9,18 @@ class VideoEncodeConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "pod.video_encode_transcript"
     verbose_name = _("Video encoding and transcription")
+
+    def ready(self) -> None:
+        post_migrate.connect(self.refresh_task_queue, sender=self)
+
+    def refresh_task_queue(self, sender, **kwargs) -> None:
+        """Backfill the priority and the rank of the pending tasks."""
+        from .task_queue import (
+            refresh_pending_task_priorities,
+            refresh_pending_task_ranks,
+        )
+
+        count = refresh_pending_task_priorities()
+        if count:
+            print("Priority of %s pending task(s) updated" % count)
+        refresh_pending_task_ranks()
@@ -17,6 +17,12 @@ from pod.video.models import Video
 from .encoding_settings import FFMPEG_DRESSING_INPUT
 from .encoding_studio import start_encode_video_studio
 from .Encoding_video_model import Encoding_video_model
+from .fingerprint import (
+    USE_ENCODING_DEDUP,
+    get_encoding_fingerprint,
+    get_reusable_video,
+    save_encoding_fingerprint,
+)
 from .models import EncodingLog
 from .utils import (
     add_encoding_log,
@@ -156,6 +162,9 @@ def encode_video(video_id: int) -> None:
     change_encoding_step(video_id, 1, "remove old data")
     encoding_video.remove_old_data()
 
+    if USE_ENCODING_DEDUP and reuse_encoding(encoding_video):
+        return
+
     if USE_REMOTE_ENCODING_TRANSCODING:
         change_encoding_step(video_id, 2, "start remote encoding")
         dressing = None
@@ -188,6 +197,28 @@ def encode_video(video_id: int) -> None:
             end_of_encoding(final_video)
 
 
+def reuse_encoding(encoding_video: Encoding_video_model) -> bool:
+    """
+    Reuse the encoding of a video with the same source and encoding parameters.
+
+    Returns False to encode the video, if there is no such video or if its
+    encoded files cannot be linked.
+    """
+    fingerprint = get_encoding_fingerprint(encoding_video)
+    save_encoding_fingerprint(encoding_video.id, fingerprint)
+    source_video = get_reusable_video(encoding_video.id, fingerprint)
+    if source_video is None:
+        return False
+    change_encoding_step(
+        encoding_video.id, 3, "reuse encoding of video %s" % source_video.id
+    )
+    final_video = encoding_video.reuse_encoding(source_video)
+    if final_video is None:
+        return False
+    end_of_encoding(final_video)
+    return True
+
+
 def store_encoding_info(video_id: int, encoding_video: Encoding_video_model) -> Video:
     """Store all encoding file and informations from encoding tasks."""
     change_encoding_step(video_id, 3, "store encoding info")
@@ -12,6 +12,9 @@ FFPROBE_GET_INFO = (
     + "-print_format json -i %(source)s"
 )
 
+# Cache the ffprobe results of a file for this number of seconds
+FFPROBE_CACHE_TIMEOUT = 24 * 3600
+
 FFMPEG_INPUT = '-hide_banner -threads %(nb_threads)s -i "%(input)s" '
 
 FFMPEG_STUDIO_COMMAND = (
@@ -72,6 +75,109 @@ FFMPEG_CREATE_OVERVIEW = (
     "-frames:v 1 -y '%(output)s' "
 )
 
+# Encode all the outputs (MP4, HLS, MP3, thumbnails and overview) from a single decode
+FFMPEG_SINGLE_PASS = True
+FFMPEG_SINGLE_PASS_FILTER = ' -filter_complex "%(filter)s" '
+FFMPEG_SINGLE_PASS_MP4_ENCODE = (
+    '-map "[%(video)s]" %(map_audio)s -c:v %(libx)s '
+    + "-preset %(preset)s -profile:v %(profile)s "
+    + "-pix_fmt yuv420p -level %(level)s -crf %(crf)s "
+    + "-maxrate %(maxrate)s -bufsize %(bufsize)s "
+    + '-sc_threshold 0 -force_key_frames "expr:gte(t,n_forced*1)" '
+    + "-max_muxing_queue_size 4000 "
+    + '-c:a aac -ar 48000 -b:a %(ba)s -movflags faststart -y -vsync 0 "%(output)s" '
+)
+FFMPEG_SINGLE_PASS_HLS_ENCODE = (
+    '-map "[%(video)s]" %(map_audio)s '
+    + "-c:v %(libx)s -preset %(preset)s -profile:v %(profile)s -pix_fmt yuv420p "
+    + "-level %(level)s -crf %(crf)s -sc_threshold 0 "
+    + '-force_key_frames "expr:gte(t,n_forced*1)" '
+    + "-c:a aac -ar 48000 -max_muxing_queue_size 4000 "
+    + "-maxrate %(maxrate)s -bufsize %(bufsize)s -b:a:0 %(ba)s "
+    + "-hls_playlist_type vod -hls_time %(hls_time)s  -hls_flags single_file "
+    + '-master_pl_name "livestream%(height)s.m3u8" '
+    + '-y "%(output)s" '
+)
+FFMPEG_SINGLE_PASS_MP3_ENCODE = (
+    '-map "[%(audio)s]" -codec:a libmp3lame -qscale:a 2 -y "%(output)s" '
+)
+FFMPEG_SINGLE_PASS_THUMBNAIL_FILTER = "fps=1/(%(duration)s/%(nb_thumbnail)s)"
+FFMPEG_SINGLE_PASS_THUMBNAIL = '-map "[%(video)s]" -vsync vfr -y "%(output)s_%%04d.png" '
+FFMPEG_SINGLE_PASS_OVERVIEW_FILTER = (
+    "fps=fps=(%(image_count)s/%(duration)s),"
+    + "scale=%(width)sx%(height)s,"
+    + "tile=%(image_count)sx1"
+)
+FFMPEG_SINGLE_PASS_OVERVIEW = '-map "[%(video)s]" -vsync vfr -frames:v 1 -y "%(output)s" '
+
+# Encode the long videos by segments of FFMPEG_SEGMENT_DURATION seconds (0 to disable)
+FFMPEG_SEGMENT_DURATION = 0
+FFMPEG_SEGMENT_WORKERS = 4
+FFMPEG_SEGMENT_SPLIT = (
+    "-map 0:v:0 -c copy -f segment -segment_time %(segment_time)s "
+    + '-reset_timestamps 1 -y "%(output)s" '
+)
+FFMPEG_SEGMENT_ENCODE = (
+    '-map 0:v:0 -an -c:v %(libx)s -vf "scale=-2:%(height)s" '
+    + "-preset %(preset)s -profile:v %(profile)s "
+    + "-pix_fmt yuv420p -level %(level)s -crf %(crf)s "
+    + "-maxrate %(maxrate)s -bufsize %(bufsize)s "
+    + '-sc_threshold 0 -force_key_frames "expr:gte(t,n_forced*1)" '
+    + '-max_muxing_queue_size 4000 -y -vsync 0 "%(output)s" '
+)
+FFMPEG_SEGMENT_AUDIO_ENCODE = (
+    '-map 0:a:0 -vn -c:a aac -ar 48000 -b:a %(ba)s -y "%(output)s" '
+)
+FFMPEG_SEGMENT_CONCAT = (
+    '-hide_banner -f concat -safe 0 -i "%(input)s" %(audio_input)s '
+    + '-map 0:v:0 %(map_audio)s -c copy -movflags faststart -y "%(output)s" '
+)
+FFMPEG_SEGMENT_HLS = (
+    "-map 0 -c copy -hls_playlist_type vod -hls_time %(hls_time)s "
+    + '-hls_flags single_file -master_pl_name "livestream%(height)s.m3u8" '
+    + '-y "%(output)s" '
+)
+
+# Adapt the rendition ladder to the complexity of the source (scenes, motion, slides)
+FFMPEG_ADAPTIVE_LADDER = False
+FFMPEG_COMPLEXITY_ANALYSE = (
+    "%(ffmpeg)s -hide_banner -nostats -skip_frame nokey -i %(source)s "
+    + "-map 0:v:0 -an -sn "
+    + "-vf \"scale=160:-2,select='gte(scene,0)',metadata=print:key=lavfi.scene_score\" "
+    + "-f null -"
+)
+# Scene score between two keyframes under which the picture is static
+FFMPEG_STATIC_SCENE_SCORE = 0.01
+# Scene score between two keyframes over which the scene changes
+FFMPEG_SCENE_CHANGE_SCORE = 0.3
+# Profiles applied to the renditions, the first one matching the complexity is used:
+# - static_ratio: minimal ratio of static keyframes
+# - motion: maximal average scene score
+# - scene_changes: maximal number of scene changes per minute
+# - maxrate_ratio: ratio applied to the maxrate of the renditions
+# - crf_offset: value added to the FFMPEG_CRF
+# - keep_middle: keep the renditions between the lowest and the highest
+FFMPEG_ADAPTIVE_LADDER_PROFILES = [
+    {
+        "name": "static",
+        "static_ratio": 0.8,
+        "motion": 0.02,
+        "scene_changes": 2,
+        "maxrate_ratio": 0.4,
+        "crf_offset": 4,
+        "keep_middle": False,
+    },
+    {
+        "name": "low_motion",
+        "static_ratio": 0.4,
+        "motion": 0.08,
+        "scene_changes": 6,
+        "maxrate_ratio": 0.7,
+        "crf_offset": 2,
+        "keep_middle": True,
+    },
+]
+
 FFMPEG_DRESSING_OUTPUT = ' -c:v libx264 -y -vsync 0 "%(output)s" '
 FFMPEG_DRESSING_INPUT = ' -i "%(input)s"'
 FFMPEG_DRESSING_FILTER_COMPLEX = ' -filter_complex "%(filter)s" '
@@ -1,6 +1,5 @@
 """This module handles studio encoding with CPU."""
 
-import json
 import subprocess
 import time
 
@@ -10,27 +9,23 @@ if __name__ == "__main__":
         FFMPEG_CRF,
         FFMPEG_NB_THREADS,
         FFMPEG_STUDIO_COMMAND,
-        FFPROBE_CMD,
-        FFPROBE_GET_INFO,
     )
+    from encoding_utils import probe_file
 else:
     from .encoding_settings import (
         FFMPEG_CMD,
         FFMPEG_CRF,
         FFMPEG_NB_THREADS,
         FFMPEG_STUDIO_COMMAND,
-        FFPROBE_CMD,
-        FFPROBE_GET_INFO,
     )
+    from .encoding_utils import probe_file
 
 try:
     from django.conf import settings
 
     FFMPEG_CMD = getattr(settings, "FFMPEG_CMD", FFMPEG_CMD)
-    FFPROBE_CMD = getattr(settings, "FFPROBE_CMD", FFPROBE_CMD)
     FFMPEG_CRF = getattr(settings, "FFMPEG_CRF", FFMPEG_CRF)
     FFMPEG_NB_THREADS = getattr(settings, "FFMPEG_NB_THREADS", FFMPEG_NB_THREADS)
-    FFPROBE_GET_INFO = getattr(settings, "FFPROBE_GET_INFO", FFPROBE_GET_INFO)
     FFMPEG_STUDIO_COMMAND = getattr(
         settings, "FFMPEG_STUDIO_COMMAND", FFMPEG_STUDIO_COMMAND
     )
@@ -43,12 +38,10 @@ except ImportError:  # pragma: no cover
 # ##########################################################################
 
 
-def get_video_info(command):
-    """Get ffprobe video info."""
-    ffproberesult = subprocess.run(
-        command, shell=True, stdout=subprocess.PIPE, stderr=subprocess.STDOUT
-    )
-    return json.loads(ffproberesult.stdout.decode("utf-8"))
+def get_video_info(source):
+    """Get ffprobe info of the first video stream of a source."""
+    info = probe_file(source, "-select_streams v:0 ")[0]
+    return info or {"streams": []}
 
 
 def start_encode_video_studio(video_output, videos, subtime, presenter):
@@ -68,18 +61,8 @@ def start_encode_video_studio(video_output, videos, subtime, presenter):
     if presenter_source and presentation_source:
         # to put it in the right order
         input_video = '-i "' + presentation_source + '" -i "' + presenter_source + '" '
-        command = FFPROBE_GET_INFO % {
-            "ffprobe": FFPROBE_CMD,
-            "select_streams": "-select_streams v:0 ",
-            "source": '"' + presentation_source + '" ',
-        }
-        info_presentation_video = get_video_info(command)
-        command = FFPROBE_GET_INFO % {
-            "ffprobe": FFPROBE_CMD,
-            "select_streams": "-select_streams v:0 ",
-            "source": '"' + presenter_source + '" ',
-        }
-        info_presenter_video = get_video_info(command)
+        info_presentation_video = get_video_info(presentation_source)
+        info_presenter_video = get_video_info(presenter_source)
         subcmd = get_sub_cmd(
             get_height(info_presentation_video),
             get_height(info_presenter_video),
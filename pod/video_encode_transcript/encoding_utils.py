@@ -1,28 +1,78 @@
+import hashlib
 import json
 import logging
 import os
+import re
 import shlex
 import subprocess
 from collections import OrderedDict
 from timeit import default_timer as timer
 
 try:
-    from .encoding_settings import VIDEO_RENDITIONS
+    from .encoding_settings import (
+        FFMPEG_ADAPTIVE_LADDER_PROFILES,
+        FFMPEG_CMD,
+        FFMPEG_COMPLEXITY_ANALYSE,
+        FFMPEG_SCENE_CHANGE_SCORE,
+        FFMPEG_STATIC_SCENE_SCORE,
+        FFPROBE_CACHE_TIMEOUT,
+        FFPROBE_CMD,
+        FFPROBE_GET_INFO,
+        VIDEO_RENDITIONS,
+    )
 except (ImportError, ValueError):
-    from encoding_settings import VIDEO_RENDITIONS
+    from encoding_settings import (
+        FFMPEG_ADAPTIVE_LADDER_PROFILES,
+        FFMPEG_CMD,
+        FFMPEG_COMPLEXITY_ANALYSE,
+        FFMPEG_SCENE_CHANGE_SCORE,
+        FFMPEG_STATIC_SCENE_SCORE,
+        FFPROBE_CACHE_TIMEOUT,
+        FFPROBE_CMD,
+        FFPROBE_GET_INFO,
+        VIDEO_RENDITIONS,
+    )
 
 try:
     from django.conf import settings
+    from django.core.cache import cache
 
     VIDEO_RENDITIONS = getattr(settings, "VIDEO_RENDITIONS", VIDEO_RENDITIONS)
+    FFMPEG_CMD = getattr(settings, "FFMPEG_CMD", FFMPEG_CMD)
+    FFMPEG_ADAPTIVE_LADDER_PROFILES = getattr(
+        settings, "FFMPEG_ADAPTIVE_LADDER_PROFILES", FFMPEG_ADAPTIVE_LADDER_PROFILES
+    )
+    FFMPEG_COMPLEXITY_ANALYSE = getattr(
+        settings, "FFMPEG_COMPLEXITY_ANALYSE", FFMPEG_COMPLEXITY_ANALYSE
+    )
+    FFMPEG_SCENE_CHANGE_SCORE = getattr(
+        settings, "FFMPEG_SCENE_CHANGE_SCORE", FFMPEG_SCENE_CHANGE_SCORE
+    )
+    FFMPEG_STATIC_SCENE_SCORE = getattr(
+        settings, "FFMPEG_STATIC_SCENE_SCORE", FFMPEG_STATIC_SCENE_SCORE
+    )
+    FFPROBE_CMD = getattr(settings, "FFPROBE_CMD", FFPROBE_CMD)
+    FFPROBE_GET_INFO = getattr(settings, "FFPROBE_GET_INFO", FFPROBE_GET_INFO)
+    FFPROBE_CACHE_TIMEOUT = getattr(
+        settings, "FFPROBE_CACHE_TIMEOUT", FFPROBE_CACHE_TIMEOUT
+    )
     DEBUG = getattr(settings, "DEBUG", True)
 except ImportError:  # pragma: no cover
+    cache = None
     DEBUG = True
 
 logger = logging.getLogger(__name__)
 if DEBUG:
     logger.setLevel(logging.DEBUG)
 
+# ffprobe results of the last probed files, by cache key
+PROBE_RESULTS_SIZE = 32
+probe_results = OrderedDict()
+
+CHECKSUM_CHUNK_SIZE = 1024 * 1024
+SCENE_SCORE_PATTERN = re.compile(r"lavfi\.scene_score=([0-9.]+)")
+BITRATE_PATTERN = re.compile(r"^([0-9.]+)([kKmM]?)$")
+
 
 def sec_to_timestamp(total_seconds) -> str:
     """Format time for webvtt caption."""
@@ -107,6 +157,194 @@ def get_info_from_video(probe_cmd):
     return info, msg
 
 
+def get_probe_command(path, select_streams="") -> str:
+    """Get the ffprobe command reading the format and streams of a file."""
+    return FFPROBE_GET_INFO % {
+        "ffprobe": FFPROBE_CMD,
+        "select_streams": select_streams,
+        "source": '"' + path + '" ',
+    }
+
+
+def get_probe_cache_key(path, select_streams=""):
+    """Get the cache key of the ffprobe info of a file, None if it does not exist."""
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    key = "%s:%s:%s:%s" % (
+        os.path.abspath(path),
+        stat.st_size,
+        stat.st_mtime_ns,
+        select_streams,
+    )
+    return "ffprobe:%s" % hashlib.sha256(key.encode("utf-8")).hexdigest()
+
+
+def probe_file(path, select_streams=""):
+    """
+    Get the ffprobe info of a file, probed once by path, size and modification time.
+
+    The parsed info is kept in the process and in the Django cache if available.
+
+    Returns:
+        tuple: the info dict (None on error) and the message of the probe.
+    """
+    cache_key = get_probe_cache_key(path, select_streams)
+    info = probe_results.get(cache_key)
+    if info is None and cache_key and cache is not None:
+        info = cache.get(cache_key)
+    if info is not None:
+        return info, "ffprobe info read from cache\n"
+    info, msg = get_info_from_video(get_probe_command(path, select_streams))
+    if info and cache_key:
+        probe_results[cache_key] = info
+        while len(probe_results) > PROBE_RESULTS_SIZE:
+            probe_results.popitem(last=False)
+        if cache is not None:
+            cache.set(cache_key, info, FFPROBE_CACHE_TIMEOUT)
+    return info, msg
+
+
+def get_file_signature(path) -> list:
+    """Get the size and the modification time of a file, to detect its changes."""
+    stat = os.stat(path)
+    return [stat.st_size, stat.st_mtime_ns]
+
+
+def get_file_checksum(path, prefix=b"") -> str:
+    """Get the sha256 of a prefix and of the content of a file, read by chunks."""
+    checksum = hashlib.sha256(prefix)
+    with open(path, "rb") as file:
+        for chunk in iter(lambda: file.read(CHECKSUM_CHUNK_SIZE), b""):
+            checksum.update(chunk)
+    return checksum.hexdigest()
+
+
+def get_complexity_command(path) -> str:
+    """Get the ffmpeg command printing the scene score of the keyframes of a file."""
+    return FFMPEG_COMPLEXITY_ANALYSE % {
+        "ffmpeg": FFMPEG_CMD,
+        "source": '"' + path + '"',
+    }
+
+
+def get_complexity(scores, duration) -> dict:
+    """
+    Get the complexity of a video from the scene scores between its keyframes.
+
+    Returns:
+        dict: the number of keyframes, the ratio of static keyframes, the average
+        scene score (motion) and the number of scene changes per minute.
+    """
+    scene_changes = len([score for score in scores if score >= FFMPEG_SCENE_CHANGE_SCORE])
+    return {
+        "keyframes": len(scores),
+        "static_ratio": round(
+            len([score for score in scores if score < FFMPEG_STATIC_SCENE_SCORE])
+            / len(scores),
+            3,
+        ),
+        "motion": round(sum(scores) / len(scores), 4),
+        "scene_changes": round(scene_changes * 60 / duration, 2) if duration else 0,
+    }
+
+
+def get_video_complexity(path, duration):
+    """
+    Get the complexity of the video track of a file, analysed once by file version.
+
+    Only the keyframes are decoded, at a small size, to get their scene scores.
+
+    Returns:
+        tuple: the complexity dict (None on error) and the message of the analysis.
+    """
+    cache_key = get_probe_cache_key(path, "complexity")
+    if cache_key and cache is not None:
+        complexity = cache.get(cache_key)
+        if complexity is not None:
+            return complexity, "complexity read from cache\n"
+    msg = ""
+    try:
+        output = subprocess.run(
+            shlex.split(get_complexity_command(path)),
+            stdout=subprocess.PIPE,
+            stderr=subprocess.STDOUT,
+        )
+    except OSError as err:
+        msg += "OS error: {0}\n".format(err)
+        return None, msg
+    scores = [
+        float(score)
+        for score in SCENE_SCORE_PATTERN.findall(output.stdout.decode(errors="ignore"))
+    ]
+    if output.returncode != 0 or len(scores) == 0:
+        msg += "No scene score read, return code %s\n" % output.returncode
+        return None, msg
+    complexity = get_complexity(scores, duration)
+    if cache_key and cache is not None:
+        cache.set(cache_key, complexity, FFPROBE_CACHE_TIMEOUT)
+    return complexity, msg
+
+
+def scale_bitrate(bitrate, ratio) -> str:
+    """Scale a bitrate like "3000k" or "3M" by a ratio, in kilobits."""
+    match = BITRATE_PATTERN.match(str(bitrate).strip())
+    if not match:
+        return bitrate
+    value = float(match.group(1))
+    if match.group(2) in ("m", "M"):
+        value *= 1000
+    elif match.group(2) == "":
+        value /= 1000
+    return "%sk" % max(1, int(value * ratio))
+
+
+def get_ladder_profile(complexity):
+    """Get the first adaptive ladder profile matching the complexity of a video."""
+    for profile in FFMPEG_ADAPTIVE_LADDER_PROFILES:
+        if (
+            complexity["static_ratio"] >= profile.get("static_ratio", 0)
+            and complexity["motion"] <= profile.get("motion", 1)
+            and complexity["scene_changes"] <= profile.get("scene_changes", 60)
+        ):
+            return profile
+    return None
+
+
+def get_adaptive_ladder(list_rendition, complexity, in_height, crf):
+    """
+    Adapt the renditions to encode to the complexity of the source.
+
+    The maxrate of the renditions is only lowered and the crf only raised, the
+    settings of the renditions stay the upper bounds of the encoding.
+    Without the middle renditions, the lowest one, the first MP4 one and the
+    highest one reached by the source are kept.
+    """
+    profile = get_ladder_profile(complexity)
+    if profile is None:
+        return list_rendition
+    eligible = []
+    for rend, rendition in list_rendition.items():
+        threshold = rend - rend * (rendition["encoding_resolution_threshold"] / 100)
+        if in_height >= threshold:
+            eligible.append(rend)
+    keep = set(list(list_rendition)[:1] + eligible[-1:])
+    keep.update(
+        [rend for rend in list_rendition if list_rendition[rend]["encode_mp4"]][:1]
+    )
+    ladder = OrderedDict()
+    for rend, rendition in list_rendition.items():
+        if profile.get("keep_middle", True) or rend in keep:
+            ladder[rend] = dict(rendition)
+            ladder[rend]["maxrate"] = scale_bitrate(
+                rendition["maxrate"], min(1, profile.get("maxrate_ratio", 1))
+            )
+            ladder[rend]["crf"] = min(51, crf + max(0, profile.get("crf_offset", 0)))
+            ladder[rend]["ladder_profile"] = profile.get("name", "")
+    return ladder
+
+
 def launch_cmd(cmd):
     if cmd == "":
         msg = "No cmd to launch"
@@ -0,0 +1,145 @@
+"""Esup-Pod fingerprints to reuse the encodings and transcriptions of identical sources."""
+
+import fcntl
+import json
+import os
+import shutil
+
+from django.conf import settings
+from django.db.models import F, Q
+from django.utils import timezone
+from webvtt import WebVTT
+
+from pod.video.models import Video
+
+from .encoding_settings import FFMPEG_ADAPTIVE_LADDER
+from .encoding_utils import get_file_checksum, get_renditions
+from .models import EncodingFingerprint, TranscriptionCache
+
+USE_ENCODING_DEDUP = getattr(settings, "USE_ENCODING_DEDUP", False)
+USE_TRANSCRIPTION_CACHE = getattr(settings, "USE_TRANSCRIPTION_CACHE", False)
+FFMPEG_ADAPTIVE_LADDER = getattr(
+    settings, "FFMPEG_ADAPTIVE_LADDER", FFMPEG_ADAPTIVE_LADDER
+)
+
+# Settings changing the result of a transcription
+TRANSCRIPTION_OPTIONS = (
+    "USE_RUNNER_MANAGER",
+    "TRANSCRIPTION_TYPE",
+    "TRANSCRIPTION_NORMALIZE",
+    "TRANSCRIPTION_NORMALIZE_TARGET_LEVEL",
+    "TRANSCRIPTION_AUDIO_SPLIT_TIME",
+    "TRANSCRIPTION_AUDIO_SPLIT_OVERLAP",
+    "TRANSCRIPTION_VOSK_WORKERS",
+    "TRANSCRIPTION_VAD",
+    "TRANSCRIPTION_VAD_THRESHOLD",
+    "TRANSCRIPTION_VAD_MIN_SILENCE",
+    "TRANSCRIPTION_VAD_PADDING",
+)
+
+# ioctl request cloning a file on copy-on-write filesystems (btrfs, xfs...)
+FICLONE = 0x40049409
+
+
+def get_file_fingerprint(path: str, parameters: dict) -> str:
+    """Get the sha256 of the parameters and of the file content, read by chunks."""
+    return get_file_checksum(
+        path, json.dumps(parameters, sort_keys=True, default=str).encode("utf-8")
+    )
+
+
+def get_encoding_fingerprint(encoding_video) -> str:
+    """Get the fingerprint of the source and of the parameters of an encoding."""
+    parameters = {
+        "cut": [encoding_video.cutting_start, encoding_video.cutting_stop],
+        "dressing": encoding_video.json_dressing,
+        "renditions": get_renditions(),
+        "adaptive_ladder": FFMPEG_ADAPTIVE_LADDER,
+    }
+    return get_file_fingerprint(encoding_video.video_file, parameters)
+
+
+def save_encoding_fingerprint(video_id: int, fingerprint: str) -> None:
+    """Save the fingerprint of the encoding of a video."""
+    EncodingFingerprint.objects.update_or_create(
+        video_id=video_id, defaults={"fingerprint": fingerprint}
+    )
+
+
+def get_reusable_video(video_id: int, fingerprint: str):
+    """Get another video successfully encoded with the same fingerprint."""
+    return (
+        Video.objects.filter(
+            encodingfingerprint__fingerprint=fingerprint,
+            encoding_in_progress=False,
+            encodingstep__num_step=0,
+            encodingstep__desc_step="end of encoding",
+        )
+        .filter(Q(encodingvideo__isnull=False) | Q(encodingaudio__isnull=False))
+        .exclude(id=video_id)
+        .order_by("id")
+        .first()
+    )
+
+
+def get_transcription_fingerprint(video: Video, lang: str):
+    """Get the fingerprint of the mp3 of a video and of the transcription model.
+
+    Returns None if the cache is not used or the video has no mp3 file.
+    """
+    if not USE_TRANSCRIPTION_CACHE:
+        return None
+    mp3 = video.get_video_mp3()
+    if not mp3 or not mp3.source_file or not os.path.isfile(mp3.source_file.path):
+        return None
+    options = {name: getattr(settings, name, None) for name in TRANSCRIPTION_OPTIONS}
+    model_param = getattr(settings, "TRANSCRIPTION_MODEL_PARAM", {}) or {}
+    parameters = {
+        "lang": lang,
+        "model": model_param.get(options["TRANSCRIPTION_TYPE"], {}).get(lang),
+        "options": options,
+    }
+    return get_file_fingerprint(mp3.source_file.path, parameters)
+
+
+def get_cached_transcription(fingerprint: str):
+    """Get the WebVTT stored for a transcription fingerprint, or None."""
+    cache = TranscriptionCache.objects.filter(fingerprint=fingerprint).first()
+    if cache is None:
+        return None
+    TranscriptionCache.objects.filter(id=cache.id).update(
+        hit_count=F("hit_count") + 1, date_used=timezone.now()
+    )
+    return WebVTT.from_string(cache.vtt)
+
+
+def save_cached_transcription(fingerprint: str, lang: str, webvtt: WebVTT) -> None:
+    """Store the WebVTT of a transcription for its fingerprint."""
+    TranscriptionCache.objects.update_or_create(
+        fingerprint=fingerprint,
+        defaults={"lang": lang, "vtt": webvtt.content, "date_used": timezone.now()},
+    )
+
+
+def link_file(source: str, destination: str) -> str:
+    """
+    Make the destination file share the content of the source file.
+
+    The file is cloned on copy-on-write filesystems, else copied.
+    It is never hard-linked: the destination belongs to another video,
+    and an in-place rewrite of one file would change the other one.
+
+    Returns:
+        str: the method used, "reflink" or "copy".
+    """
+    if os.path.lexists(destination):
+        os.remove(destination)
+    try:
+        with open(source, "rb") as src, open(destination, "wb") as dst:
+            fcntl.ioctl(dst.fileno(), FICLONE, src.fileno())
+        return "reflink"
+    except OSError:
+        if os.path.exists(destination):
+            os.remove(destination)
+    shutil.copyfile(source, destination)
+    return "copy"
@@ -9,26 +9,29 @@ Execution flow:
 1. Resolve the target Django `Site` (current site by default, or `--site`).
 2. Detect "stalled" tasks:
    - Looks for tasks still marked `running` in Pod for more than 2 hours.
-   - Queries the remote runner (`task/status/<task_id>`).
+   - Skips the tasks notified by their runner for 2 hours.
+   - Queries the remote runner (`task/status/<task_id>`), on one connection
+     by runner, the runners being queried concurrently.
    - If the remote status is `completed` or `warning`, it triggers result
      retrieval so Pod can finalize local state.
-3. Refresh rank metadata for pending tasks.
-4. Load pending tasks by type:
-   - `encoding` and `transcription` are sorted by user priority
-     (non-students first), then by submission date.
+3. Load pending tasks by type:
+   - `encoding` and `transcription` are read on the queue index, sorted by
+     the user priority stored at enqueue time (non-students first), then by
+     submission date.
    - `studio` tasks are processed by submission date.
    - Each type is capped by `--max-tasks`.
-5. Submit tasks to available active runner managers (ordered by manager priority):
+4. Submit tasks to available active runner managers:
    - Build payload (`source_url`, `notify_url`, parameters, metadata).
-   - Try each runner until one accepts the task.
+   - Assign each task to a runner manager by manager priority, then free
+     slots and latency, and send the requests concurrently.
    - Persist `task_id`, `runner_manager`, and returned status in Pod.
-6. Refresh ranks again and clean old completed tasks according to
-   `RM_TASKS_DELETED_AFTER_DAYS`.
+5. Store the rank of the remaining pending tasks.
+6. Clean old completed tasks according to `RM_TASKS_DELETED_AFTER_DAYS`.
 
 Important behavior:
 - If no active runner manager exists for the site, submission is skipped.
-- Network/API errors on one runner do not stop processing; the command tries
-the next configured runner.
+- Network/API errors on one runner do not stop processing; the runner is
+  backed off and the command tries the next configured runner.
 - Cleanup is skipped when `RM_TASKS_DELETED_AFTER_DAYS` is missing, invalid,
   or <= 0.
 
@@ -44,10 +47,10 @@ import json
 import logging
 from datetime import timedelta
 
-import requests
 from django.conf import settings
 from django.contrib.sites.models import Site
 from django.core.management.base import BaseCommand
+from django.db.models import Count, Q
 from django.utils import timezone
 
 from pod.cut.models import CutVideo
@@ -55,12 +58,18 @@ from pod.dressing.models import Dressing
 from pod.recorder.models import Recording
 from pod.video.models import Video
 from pod.video_encode_transcript.models import RunnerManager, Task
+from pod.video_encode_transcript.runner_scheduler import (
+    RunnerManagerScheduler,
+    fetch_task_statuses,
+    get_execute_url,
+)
 from pod.video_encode_transcript.runner_manager_utils import (
     store_before_remote_encoding_recording,
     store_before_remote_encoding_video,
 )
 from pod.video_encode_transcript.task_queue import (
-    get_user_priority,
+    LOW_PRIORITY,
+    get_sorted_pending_tasks,
     refresh_pending_task_ranks,
 )
 from pod.video_encode_transcript.views import download_and_import_task_result
@@ -149,31 +158,6 @@ class Command(BaseCommand):
         """
         self.stdout.write(self.style.SUCCESS(message))
 
-    def _sort_tasks_by_priority(self, all_pending_tasks, max_tasks: int) -> list:
-        """
-        Sort encoding tasks by priority (non-students first) and limit to max_tasks.
-
-        Args:
-            all_pending_tasks: QuerySet of all pending tasks
-            max_tasks: Maximum number of tasks to return
-
-        Returns:
-            list: List of tasks sorted by priority and limited to max_tasks
-        """
-        tasks_with_priority = []
-        for task in all_pending_tasks:
-            try:
-                priority = get_user_priority(task.video) if task.video else 1
-                tasks_with_priority.append((priority, task))
-            except Video.DoesNotExist:
-                log.warning(f"Video {task.video_id} not found for task {task.id}")
-                # Still add the task with default priority to avoid skipping it
-                tasks_with_priority.append((1, task))
-
-        # Sort by priority (1 first, then 2) and date_added, then limit
-        tasks_with_priority.sort(key=lambda x: (x[0], x[1].date_added))
-        return [task for _, task in tasks_with_priority[:max_tasks]]
-
     def _get_site(self, site_domain: str | None) -> Site | None:
         """
         Get the site object based on domain or return current site.
@@ -200,58 +184,6 @@ class Command(BaseCommand):
             )
         )
 
-    def _check_task_status(self, task: Task) -> str | None:
-        """
-        Check the status of a running task from the runner manager.
-
-        Args:
-            task: Task object with runner_manager and task_id
-
-        Returns:
-            str: Status from runner manager or None if check failed
-        """
-        if not task.runner_manager or not task.task_id:
-            log.warning(f"Task {task.id} has no runner_manager or task_id")
-            return None
-        if not task.runner_manager.is_active:
-            log.warning(
-                "Task %s is linked to inactive runner manager %s, status check skipped",
-                task.id,
-                task.runner_manager.name,
-            )
-            return None
-
-        try:
-            status_url = task.runner_manager.url
-            if not status_url.endswith("/"):
-                status_url += "/"
-            status_url += f"task/status/{task.task_id}"
-
-            headers = {
-                "Accept": "application/json",
-                "Authorization": f"Bearer {task.runner_manager.token}",
-            }
-
-            response = requests.get(status_url, headers=headers, timeout=30)
-
-            if response.status_code == 200:
-                data = response.json()
-                status = data.get("status")
-                log.info(f"Task {task.id} status from runner: {status}")
-                return status
-            else:
-                log.warning(
-                    f"Failed to get status for task {task.id}: "
-                    f"HTTP {response.status_code}"
-                )
-                return None
-        except requests.RequestException as exc:
-            log.warning(f"Cannot reach runner manager for task {task.id}: {str(exc)}")
-            return None
-        except Exception as exc:
-            log.error(f"Error checking status for task {task.id}: {str(exc)}")
-            return None
-
     def _check_running_tasks(self, site: Site) -> None:
         """
         Check running tasks that have been running for more than 2 hours.
@@ -261,24 +193,32 @@ class Command(BaseCommand):
         """
         two_hours_ago = timezone.now() - timedelta(hours=2)
 
-        # Get tasks that are running for more than 2 hours (encoding + transcription)
-        stalled_tasks = Task.objects.filter(
-            type__in=["encoding", "transcription"],
-            status="running",
-            date_added__lt=two_hours_ago,
-        ).select_related("runner_manager")
+        # Get tasks that are running for more than 2 hours (encoding + transcription),
+        # without notification of their runner manager for 2 hours
+        stalled_tasks = list(
+            Task.objects.filter(
+                type__in=["encoding", "transcription"],
+                status="running",
+                date_added__lt=two_hours_ago,
+            )
+            .filter(Q(date_notified__isnull=True) | Q(date_notified__lt=two_hours_ago))
+            .select_related("runner_manager")
+        )
 
         if not stalled_tasks:
             self.print_log("No stalled running tasks found")
             return
 
         self.print_log(
-            f"Found {stalled_tasks.count()} task(s) running for more than 2 hours"
+            f"Found {len(stalled_tasks)} task(s) running for more than 2 hours"
         )
 
+        # One connection by runner manager, the runner managers being polled concurrently
+        statuses = fetch_task_statuses(stalled_tasks)
         for task in stalled_tasks:
             self.print_log(f"Checking status of task {task.id}...")
-            status = self._check_task_status(task)
+            status = statuses.get(task.id)
+            log.info(f"Task {task.id} status from runner: {status}")
 
             # Handle based on status
             if status == "completed" or status == "warning":
@@ -300,7 +240,7 @@ class Command(BaseCommand):
                 self.print_error(f"Could not verify status of task {task.id}")
 
     def _process_tasks(
-        self, pending_tasks: list, site: Site, runner_managers: list
+        self, pending_tasks: list, site: Site, scheduler: RunnerManagerScheduler
     ) -> int:
         """
         Process each pending encoding task and submit to runner managers.
@@ -308,40 +248,34 @@ class Command(BaseCommand):
         Args:
             pending_tasks: List of tasks to process
             site: Site object
-            runner_managers: List of available runner managers
+            scheduler: Scheduler of the available runner managers
 
         Returns:
             int: Number of successfully submitted tasks
         """
-        success_count = 0
+        jobs = {}
         for task in pending_tasks:
             try:
                 video = Video.objects.get(id=task.video_id)
-                priority = get_user_priority(video)
-                priority_label = "LOW (student)" if priority == 2 else "HIGH"
+                priority_label = (
+                    "LOW (student)" if task.priority == LOW_PRIORITY else "HIGH"
+                )
                 self.print_log(
                     f"Processing task {task.id} for video {video.id} - Priority: {priority_label}"
                 )
-                result = self._submit_encoding_task(video, task, site, runner_managers)
-                if result:
-                    success_count += 1
-                    self.print_success(
-                        f"Successfully submitted encoding task for video {video.id}"
-                    )
-                else:
-                    self.print_warning(
-                        f"Could not submit encoding task for video {video.id} (no runner available)"
-                    )
+                jobs[task.id] = self._build_encoding_data(video, site)
             except Video.DoesNotExist:
                 self.print_error(f"Video {task.video_id} not found for task {task.id}")
             except Exception as exc:
                 self.print_error(
                     f"Error processing task {task.id} for video {task.video_id}: {str(exc)}"
                 )
-        return success_count
+        return self._dispatch_tasks(
+            pending_tasks, jobs, scheduler, store_before_remote_encoding_video
+        )
 
     def _process_studio_tasks(
-        self, pending_tasks: list, site: Site, runner_managers: list
+        self, pending_tasks: list, site: Site, scheduler: RunnerManagerScheduler
     ) -> int:
         """
         Process each pending studio task (Recording) and submit to runner managers.
@@ -349,28 +283,19 @@ class Command(BaseCommand):
         Args:
             pending_tasks: List of studio tasks to process
             site: Site object
-            runner_managers: List of available runner managers
+            scheduler: Scheduler of the available runner managers
 
         Returns:
             int: Number of successfully submitted tasks
         """
-        success_count = 0
+        jobs = {}
         for task in pending_tasks:
             try:
                 recording = Recording.objects.get(id=task.recording_id)
                 self.print_log(
                     f"Processing studio task {task.id} for recording {recording.id}"
                 )
-                result = self._submit_studio_task(recording, task, site, runner_managers)
-                if result:
-                    success_count += 1
-                    self.print_success(
-                        f"Successfully submitted studio task for recording {recording.id}"
-                    )
-                else:
-                    self.print_warning(
-                        f"Could not submit studio task for recording {recording.id} (no runner available)"
-                    )
+                jobs[task.id] = self._build_studio_data(recording, site)
             except Recording.DoesNotExist:
                 self.print_error(
                     f"Recording {task.recording_id} not found for task {task.id}"
@@ -379,10 +304,12 @@ class Command(BaseCommand):
                 self.print_error(
                     f"Error processing studio task {task.id} for recording {task.recording_id}: {str(exc)}"
                 )
-        return success_count
+        return self._dispatch_tasks(
+            pending_tasks, jobs, scheduler, store_before_remote_encoding_recording
+        )
 
     def _process_transcription_tasks(
-        self, pending_tasks: list, site: Site, runner_managers: list
+        self, pending_tasks: list, site: Site, scheduler: RunnerManagerScheduler
     ) -> int:
         """
         Process pending transcription tasks and submit them to runner managers.
@@ -390,39 +317,76 @@ class Command(BaseCommand):
         Args:
             pending_tasks: List of tasks to process
             site: Current site
-            runner_managers: List of available runner managers
+            scheduler: Scheduler of the available runner managers
 
         Returns:
             int: Number of successfully submitted tasks
         """
-        success_count = 0
+        jobs = {}
         for task in pending_tasks:
             try:
                 video = Video.objects.get(id=task.video_id)
-                priority = get_user_priority(video)
-                priority_label = "LOW (student)" if priority == 2 else "HIGH"
+                priority_label = (
+                    "LOW (student)" if task.priority == LOW_PRIORITY else "HIGH"
+                )
                 self.print_log(
                     f"Processing transcription task {task.id} for video {video.id} - Priority: {priority_label}"
                 )
-                result = self._submit_transcription_task(
-                    video, task, site, runner_managers
-                )
-                if result:
-                    success_count += 1
-                    self.print_success(
-                        f"Successfully submitted transcription task for video {video.id}"
-                    )
-                else:
-                    self.print_warning(
-                        f"Could not submit transcription task for video {video.id} (no runner available)"
-                    )
+                jobs[task.id] = self._build_transcription_data(video, site)
             except Video.DoesNotExist:
                 self.print_error(f"Video {task.video_id} not found for task {task.id}")
             except Exception as exc:
                 self.print_error(
                     f"Error processing transcription task {task.id} for video {task.video_id}: {str(exc)}"
                 )
-        return success_count
+        return self._dispatch_tasks(pending_tasks, jobs, scheduler)
+
+    def _dispatch_tasks(
+        self,
+        pending_tasks: list,
+        jobs: dict,
+        scheduler: RunnerManagerScheduler,
+        store=None,
+    ) -> int:
+        """
+        Submit the task payloads concurrently and update the accepted tasks.
+
+        Args:
+            pending_tasks: List of tasks to process
+            jobs: Payload of each task, by task id
+            scheduler: Scheduler of the available runner managers
+            store: Function storing the source before its remote encoding
+
+        Returns:
+            int: Number of successfully submitted tasks
+        """
+        accepted = scheduler.submit(jobs)
+        for task in pending_tasks:
+            if task.id not in jobs:
+                continue
+            if task.id not in accepted:
+                self.print_warning(
+                    f"Could not submit {task.type} task {task.id} (no runner available)"
+                )
+                continue
+            runner_manager, response = accepted[task.id]
+            try:
+                payload = response.json() if response.content else {}
+                task.status = payload.get("status", "pending")
+                task.runner_manager = runner_manager
+                task.task_id = payload.get("task_id")
+                task.save()
+                if store:
+                    source_id = (
+                        task.recording_id if task.type == "studio" else task.video_id
+                    )
+                    store(source_id, get_execute_url(runner_manager), jobs[task.id])
+                self.print_success(
+                    f"Successfully submitted {task.type} task {task.id} to runner manager {runner_manager.name}"
+                )
+            except Exception as exc:
+                self.print_error(f"Error updating {task.type} task {task.id}: {str(exc)}")
+        return len(accepted)
 
     def _delete_old_completed_tasks(self) -> int:
         """
@@ -484,43 +448,16 @@ class Command(BaseCommand):
 
         # Then, process pending tasks
         self.print_log("\n2. Processing pending encoding tasks...")
-        refresh_pending_task_ranks()
-
-        # Get pending encoding tasks (without limiting to max_tasks yet)
-        all_pending_tasks = (
-            Task.objects.filter(
-                type="encoding",
-                status="pending",
-            )
-            .select_related("video", "video__owner", "video__owner__owner")
-            .order_by("date_added")
-        )
-
-        # Also get pending studio tasks
-        all_pending_studio_tasks = (
-            Task.objects.filter(
-                type="studio",
-                status="pending",
-            )
-            .select_related("recording")
-            .order_by("date_added")
-        )
-
-        # Also get pending transcription tasks
-        all_pending_transcription_tasks = (
-            Task.objects.filter(
-                type="transcription",
-                status="pending",
-            )
-            .select_related("video", "video__owner", "video__owner__owner")
-            .order_by("date_added")
+        # Count pending tasks by type on the queue index
+        pending_counts = dict(
+            Task.objects.filter(status="pending")
+            .order_by()
+            .values_list("type")
+            .annotate(count=Count("id"))
+            .values_list("type", "count")
         )
 
-        if (
-            not all_pending_tasks
-            and not all_pending_studio_tasks
-            and not all_pending_transcription_tasks
-        ):
+        if not pending_counts:
             self.print_success(
                 "No pending tasks found (encoding, transcription or studio)"
             )
@@ -528,18 +465,22 @@ class Command(BaseCommand):
             self._delete_old_completed_tasks()
             return
 
-        self.print_log(f"Found {all_pending_tasks.count()} pending encoding task(s)")
-        self.print_log(f"Found {all_pending_studio_tasks.count()} pending studio task(s)")
         self.print_log(
-            f"Found {all_pending_transcription_tasks.count()} pending transcription task(s)"
+            f"Found {pending_counts.get('encoding', 0)} pending encoding task(s)"
+        )
+        self.print_log(f"Found {pending_counts.get('studio', 0)} pending studio task(s)")
+        self.print_log(
+            f"Found {pending_counts.get('transcription', 0)} pending transcription task(s)"
         )
 
-        # Sort tasks by priority (students last) and limit to max_tasks
-        pending_tasks = self._sort_tasks_by_priority(all_pending_tasks, max_tasks)
-        pending_studio_tasks = list(all_pending_studio_tasks[:max_tasks])
-        pending_transcription_tasks = self._sort_tasks_by_priority(
-            all_pending_transcription_tasks, max_tasks
+        # Only load the first max_tasks tasks by priority (students last)
+        pending_tasks = get_sorted_pending_tasks("encoding", max_tasks)
+        pending_studio_tasks = list(
+            Task.objects.filter(type="studio", status="pending")
+            .select_related("recording")
+            .order_by("date_added", "id")[:max_tasks]
         )
+        pending_transcription_tasks = get_sorted_pending_tasks("transcription", max_tasks)
 
         self.print_log(f"Processing {len(pending_tasks)} task(s) after priority sorting")
 
@@ -553,13 +494,17 @@ class Command(BaseCommand):
             return
 
         # Process each pending task
-        success_count_encoding = self._process_tasks(pending_tasks, site, runner_managers)
+        # Share the free slots of the runner managers between the task types
+        scheduler = RunnerManagerScheduler(runner_managers)
+        success_count_encoding = self._process_tasks(pending_tasks, site, scheduler)
         success_count_studio = self._process_studio_tasks(
-            pending_studio_tasks, site, runner_managers
+            pending_studio_tasks, site, scheduler
         )
         success_count_transcription = self._process_transcription_tasks(
-            pending_transcription_tasks, site, runner_managers
+            pending_transcription_tasks, site, scheduler
         )
+
+        # Keep the stored rank of the remaining pending tasks in sync
         refresh_pending_task_ranks()
 
         self.print_log("\n3. Cleaning completed tasks...")
@@ -571,13 +516,8 @@ class Command(BaseCommand):
             f"studio {success_count_studio}/{len(pending_studio_tasks)} successfully submitted"
         )
 
-    def _submit_encoding_task(
-        self, video: Video, task: Task, site: Site, runner_managers: list
-    ) -> bool:
-        """
-        Try to submit an encoding task to available runner managers.
-        Returns True if successful, False otherwise.
-        """
+    def _build_encoding_data(self, video: Video, site: Site) -> dict:
+        """Return the payload of an encoding task for the runner managers."""
         VERSION = getattr(settings, "VERSION", "4.X")
         TEMPLATE_VISIBLE_SETTINGS = getattr(
             settings,
@@ -594,7 +534,7 @@ class Command(BaseCommand):
         content_url = self._build_content_url(video, base_url)
         parameters = self._prepare_encoding_parameters(video, base_url)
 
-        data = {
+        return {
             "etab_name": f"{__TITLE_ETB__} / {__TITLE_SITE__}",
             "app_name": "Esup-Pod",
             "app_version": f"{VERSION}",
@@ -604,8 +544,6 @@ class Command(BaseCommand):
             "parameters": parameters,
         }
 
-        return self._post_encoding_to_runner(data, task, video, runner_managers)
-
     def _build_base_url(self, site: Site) -> str:
         SECURE_SSL_REDIRECT = getattr(settings, "SECURE_SSL_REDIRECT", False)
         url_scheme = "https" if SECURE_SSL_REDIRECT else "http"
@@ -688,57 +626,8 @@ class Command(BaseCommand):
             )
             return None
 
-    def _post_encoding_to_runner(
-        self, data: dict, task: Task, video: Video, runner_managers: list
-    ) -> bool:
-        for runner_manager in runner_managers:
-            try:
-                execute_url = runner_manager.url
-                if not execute_url.endswith("/"):
-                    execute_url += "/"
-                execute_url += "task/execute"
-
-                headers = {
-                    "Accept": "application/json",
-                    "Content-Type": "application/json",
-                    "Authorization": f"Bearer {runner_manager.token}",
-                }
-
-                response = requests.post(
-                    execute_url, data=json.dumps(data), headers=headers, timeout=30
-                )
-
-                if response.status_code == 200:
-                    task_id = response.json().get("task_id")
-                    status = response.json().get("status")
-
-                    task.status = status
-                    task.runner_manager = runner_manager
-                    task.task_id = task_id
-                    task.save()
-                    store_before_remote_encoding_video(video.id, execute_url, data)
-
-                    log.info(
-                        f"Successfully submitted encoding task for video {video.id} to runner manager {runner_manager.name}"
-                    )
-                    return True
-                log.warning(
-                    f"Runner manager {runner_manager.name} returned status code {response.status_code}"
-                )
-            except requests.RequestException as exc:
-                log.warning(
-                    f"Cannot reach runner manager {runner_manager.name}: {str(exc)}"
-                )
-
-        return False
-
-    def _submit_transcription_task(
-        self, video: Video, task: Task, site: Site, runner_managers: list
-    ) -> bool:
-        """
-        Try to submit a transcription task to available runner managers.
-        Returns True if successful, False otherwise.
-        """
+    def _build_transcription_data(self, video: Video, site: Site) -> dict:
+        """Return the payload of a transcription task for the runner managers."""
         from pod.video_encode_transcript.transcript import (
             resolve_transcription_language,
         )
@@ -777,7 +666,7 @@ class Command(BaseCommand):
         if transcription_type:
             params["model_type"] = transcription_type
 
-        data = {
+        return {
             "etab_name": f"{__TITLE_ETB__} / {__TITLE_SITE__}",
             "app_name": "Esup-Pod",
             "app_version": f"{VERSION}",
@@ -787,56 +676,8 @@ class Command(BaseCommand):
             "parameters": params,
         }
 
-        # Try each runner manager
-        for runner_manager in runner_managers:
-            try:
-                execute_url = runner_manager.url
-                if not execute_url.endswith("/"):
-                    execute_url += "/"
-                execute_url += "task/execute"
-
-                headers = {
-                    "Accept": "application/json",
-                    "Content-Type": "application/json",
-                    "Authorization": f"Bearer {runner_manager.token}",
-                }
-
-                response = requests.post(
-                    execute_url, data=json.dumps(data), headers=headers, timeout=30
-                )
-
-                if response.status_code == 200:
-                    task_id = response.json().get("task_id")
-                    status = response.json().get("status")
-
-                    # Update task
-                    task.status = status
-                    task.runner_manager = runner_manager
-                    task.task_id = task_id
-                    task.save()
-
-                    log.info(
-                        f"Successfully submitted transcription task for video {video.id} to runner manager {runner_manager.name}"
-                    )
-                    return True
-                else:
-                    log.warning(
-                        f"Runner manager {runner_manager.name} returned status code {response.status_code}"
-                    )
-            except requests.RequestException as exc:
-                log.warning(
-                    f"Cannot reach runner manager {runner_manager.name}: {str(exc)}"
-                )
-
-        return False
-
-    def _submit_studio_task(
-        self, recording: Recording, task: Task, site: Site, runner_managers: list
-    ) -> bool:
-        """
-        Try to submit a studio task (recording XML link) to available runner managers.
-        Returns True if successful, False otherwise.
-        """
+    def _build_studio_data(self, recording: Recording, site: Site) -> dict:
+        """Return the payload of a studio task (recording XML link) for the runner managers."""
         # Get settings
         SECURE_SSL_REDIRECT = getattr(settings, "SECURE_SSL_REDIRECT", False)
         VERSION = getattr(settings, "VERSION", "4.X")
@@ -877,7 +718,7 @@ class Command(BaseCommand):
         json_resolution = json.dumps(str_resolution)
         parameters = {"rendition": json_resolution}
 
-        data = {
+        return {
             "etab_name": f"{__TITLE_ETB__} / {__TITLE_SITE__}",
             "app_name": "Esup-Pod",
             "app_version": f"{VERSION}",
@@ -886,49 +727,3 @@ class Command(BaseCommand):
             "notify_url": f"{base_url}/runner/notify_task_end/",
             "parameters": parameters,
         }
-
-        # Try each runner manager
-        for runner_manager in runner_managers:
-            try:
-                execute_url = runner_manager.url
-                if not execute_url.endswith("/"):
-                    execute_url += "/"
-                execute_url += "task/execute"
-
-                headers = {
-                    "Accept": "application/json",
-                    "Content-Type": "application/json",
-                    "Authorization": f"Bearer {runner_manager.token}",
-                }
-
-                response = requests.post(
-                    execute_url, data=json.dumps(data), headers=headers, timeout=30
-                )
-
-                if response.status_code == 200:
-                    task_id = response.json().get("task_id")
-                    status = response.json().get("status")
-
-                    # Update task with studio type
-                    task.status = status
-                    task.runner_manager = runner_manager
-                    task.task_id = task_id
-                    task.save()
-                    store_before_remote_encoding_recording(
-                        recording.id, execute_url, data
-                    )
-
-                    log.info(
-                        f"Successfully submitted studio task for recording {recording.id} to runner manager {runner_manager.name}"
-                    )
-                    return True
-                else:
-                    log.warning(
-                        f"Runner manager {runner_manager.name} returned status code {response.status_code}"
-                    )
-            except requests.RequestException as exc:
-                log.warning(
-                    f"Cannot reach runner manager {runner_manager.name}: {str(exc)}"
-                )
-
-        return False
@@ -0,0 +1,62 @@
+"""
+Django management command to report and evict the cached transcriptions.
+
+The transcriptions are cached by fingerprint of the mp3 of the video and of
+the transcription model when `USE_TRANSCRIPTION_CACHE` is True.
+
+CLI:
+- `python manage.py transcription_cache`
+- `python manage.py transcription_cache --older-than 90`
+"""
+
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db.models import Count, Max, Min, Sum
+from django.db.models.functions import Length
+from django.utils import timezone
+
+from pod.video_encode_transcript.models import TranscriptionCache
+
+
+class Command(BaseCommand):
+    help = "Report the size of the transcription cache and evict its old results"
+
+    def add_arguments(self, parser) -> None:
+        parser.add_argument(
+            "--older-than",
+            type=int,
+            default=None,
+            help="Evict the results not used for this number of days.",
+        )
+
+    def handle(self, *args, **options) -> None:
+        days = options["older_than"]
+        if days is not None:
+            deleted, _ = TranscriptionCache.objects.filter(
+                date_used__lt=timezone.now() - timedelta(days=days)
+            ).delete()
+            self.stdout.write(
+                self.style.SUCCESS(
+                    "%s results not used for %s days evicted" % (deleted, days)
+                )
+            )
+        self.report()
+
+    def report(self) -> None:
+        """Write the number, the size and the dates of the cached results."""
+        stats = TranscriptionCache.objects.aggregate(
+            count=Count("id"),
+            size=Sum(Length("vtt")),
+            hits=Sum("hit_count"),
+            oldest=Min("date_used"),
+            newest=Max("date_used"),
+        )
+        self.stdout.write(
+            "%s results, %s characters, %s hits"
+            % (stats["count"], stats["size"] or 0, stats["hits"] or 0)
+        )
+        if stats["count"]:
+            self.stdout.write(
+                "Last used from %s to %s" % (stats["oldest"], stats["newest"])
+            )
@@ -449,6 +449,70 @@ class PlaylistVideo(models.Model):
         super(PlaylistVideo, self).delete()
 
 
+class EncodingFingerprint(models.Model):
+    """Fingerprint of the source file and encoding parameters of a video."""
+
+    video = models.OneToOneField(
+        Video, verbose_name=_("Video"), editable=False, on_delete=models.CASCADE
+    )
+    fingerprint = models.CharField(
+        _("Fingerprint"), max_length=64, db_index=True, editable=False
+    )
+    date = models.DateTimeField(_("Date"), auto_now=True)
+
+    class Meta:
+        verbose_name = _("Encoding fingerprint")
+        verbose_name_plural = _("Encoding fingerprints")
+
+    def __str__(self) -> str:
+        return "Fingerprint for encoding video %s" % (self.video.id)
+
+
+class TranscriptionCache(models.Model):
+    """Transcription result stored by fingerprint of the audio and of the model."""
+
+    fingerprint = models.CharField(
+        _("Fingerprint"), max_length=64, unique=True, editable=False
+    )
+    lang = models.CharField(_("Language"), max_length=10, editable=False)
+    vtt = models.TextField(_("WebVTT"), editable=False)
+    hit_count = models.PositiveIntegerField(_("Hits"), default=0, editable=False)
+    date_added = models.DateTimeField(_("Date added"), auto_now_add=True)
+    date_used = models.DateTimeField(_("Date used"), default=timezone.now)
+
+    class Meta:
+        verbose_name = _("Transcription cache")
+        verbose_name_plural = _("Transcription caches")
+
+    def __str__(self) -> str:
+        return "Transcription cache %s" % (self.fingerprint)
+
+
+class VideoStreamInfo(models.Model):
+    """Stream metadata of the source file of a video, read at encoding."""
+
+    video = models.OneToOneField(
+        Video,
+        verbose_name=_("Video"),
+        related_name="stream_info",
+        editable=False,
+        on_delete=models.CASCADE,
+    )
+    has_video = models.BooleanField(_("Has a video track"), default=False)
+    has_audio = models.BooleanField(_("Has an audio track"), default=False)
+    width = models.PositiveIntegerField(_("Width"), default=0)
+    height = models.PositiveIntegerField(_("Height"), default=0)
+    info = models.JSONField(_("ffprobe info"), default=dict, editable=False)
+    complexity = models.JSONField(_("Complexity"), default=dict, editable=False)
+
+    class Meta:
+        verbose_name = _("Video stream info")
+        verbose_name_plural = _("Video stream infos")
+
+    def __str__(self) -> str:
+        return "Stream info of video %s" % (self.video.id)
+
+
 class RunnerManager(models.Model):
     """Hold information about runner manager."""
 
@@ -498,6 +562,33 @@ class RunnerManager(models.Model):
         default=1,
     )
 
+    # Capacity, used to spread the tasks on the runner managers
+    capacity = models.PositiveIntegerField(
+        verbose_name=_("Capacity"),
+        help_text=_("Number of tasks the runner manager can process at the same time."),
+        default=1,
+    )
+
+    # Health, observed when the tasks are submitted
+    latency = models.FloatField(
+        verbose_name=_("Latency"),
+        help_text=_("Smoothed response time of the runner manager, in seconds."),
+        default=0,
+        editable=False,
+    )
+    failure_count = models.PositiveIntegerField(
+        verbose_name=_("Consecutive failures"),
+        default=0,
+        editable=False,
+    )
+    unavailable_until = models.DateTimeField(
+        verbose_name=_("Unavailable until"),
+        help_text=_("No task is submitted to the runner manager before this date."),
+        null=True,
+        blank=True,
+        editable=False,
+    )
+
     def __unicode__(self):
         return "%s (%s)" % (self.name, self.site.id)
 
@@ -526,6 +617,25 @@ def default_site_runner_manager(sender, instance, **kwargs):
         instance.site = Site.objects.get_current()
 
 
+class TaskQuerySet(models.QuerySet):
+    """Tasks, with the queue fields of `Task.save()` kept on bulk status updates."""
+
+    def update(self, **kwargs):
+        """Update the tasks, with the priority of the tasks set pending again."""
+        if "status" not in kwargs:
+            return super().update(**kwargs)
+        if kwargs["status"] != "pending":
+            # Only pending tasks are expected to have a queue rank
+            kwargs.setdefault("rank", None)
+            return super().update(**kwargs)
+        task_ids = list(self.values_list("id", flat=True))
+        count = super().update(**kwargs)
+        from .task_queue import refresh_pending_task_priorities
+
+        refresh_pending_task_priorities(Task.objects.filter(id__in=task_ids))
+        return count
+
+
 class Task(models.Model):
     """Hold information about tasks managed by the runner managers."""
 
@@ -600,6 +710,25 @@ class Task(models.Model):
         verbose_name=_("Date added"), default=timezone.now, editable=False
     )
 
+    # Dates the task started and ended on the runner manager
+    date_start = models.DateTimeField(
+        verbose_name=_("Date started"), null=True, blank=True, editable=False
+    )
+    date_end = models.DateTimeField(
+        verbose_name=_("Date ended"), null=True, blank=True, editable=False
+    )
+    # Last notification of the runner manager, such tasks are not polled
+    date_notified = models.DateTimeField(
+        verbose_name=_("Date notified"), null=True, blank=True, editable=False
+    )
+
+    # Queue priority, from the owner of the video when the task is pending
+    priority = models.IntegerField(
+        verbose_name=_("Queue priority"),
+        help_text=_("Priority of the task in the pending queue, lower values first"),
+        default=1,
+    )
+
     # Queue rank for pending tasks
     rank = models.IntegerField(
         verbose_name=_("Queue rank"),
@@ -617,6 +746,8 @@ class Task(models.Model):
         blank=True,
     )
 
+    objects = TaskQuerySet.as_manager()
+
     def __unicode__(self):
         ref = (
             self.video.id
@@ -634,10 +765,41 @@ class Task(models.Model):
         return "%s - %s - %s" % (ref, self.type, self.status)
 
     def save(self, *args, **kwargs):
+        queue_fields = self.set_queue_fields()
+        if kwargs.get("update_fields") is not None:
+            kwargs["update_fields"] = set(kwargs["update_fields"]) | set(queue_fields)
         super(Task, self).save(*args, **kwargs)
 
+    def set_queue_fields(self) -> list:
+        """Set the queue priority and the processing dates from the task status."""
+        if self.status != "pending" and self.rank is not None:
+            # Only pending tasks are expected to have a queue rank
+            self.rank = None
+            return ["rank"] + self.set_queue_fields()
+        # Keep the processing dates, used to estimate the queue waiting times
+        if self.status == "pending":
+            from .task_queue import HIGH_PRIORITY, get_user_priority
+
+            self.priority = get_user_priority(self.video) if self.video else HIGH_PRIORITY
+            self.date_start = None
+            self.date_end = None
+            return ["priority", "date_start", "date_end"]
+        if self.status == "running" and self.date_start is None:
+            self.date_start = timezone.now()
+            return ["date_start"]
+        if self.status in ("completed", "failed", "timeout") and self.date_end is None:
+            self.date_end = timezone.now()
+            return ["date_end"]
+        return []
+
     class Meta:
         db_table = "runner_manager_task"
         verbose_name = _("Task")
         verbose_name_plural = _("Tasks")
         ordering = ["id"]
+        indexes = [
+            models.Index(
+                fields=["status", "priority", "date_added", "id"],
+                name="runner_task_queue_idx",
+            ),
+        ]
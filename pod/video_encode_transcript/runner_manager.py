@@ -23,6 +23,7 @@ from pod.video_encode_transcript.runner_manager_utils import (
     store_before_remote_encoding_video,
 )
 
+from .runner_scheduler import RunnerManagerScheduler, get_execute_url
 from .utils import change_encoding_step
 
 if __name__ == "__main__":
@@ -73,7 +74,6 @@ SECURE_SSL_REDIRECT = getattr(settings, "SECURE_SSL_REDIRECT", False)
 SourceType = Literal["video", "recording"]
 TaskType = Literal["encoding", "studio", "transcription"]
 ParametersDict: TypeAlias = dict[str, Any]
-HeadersDict: TypeAlias = dict[str, str]
 
 
 class RunnerManagerTaskPayload(TypedDict):
@@ -278,36 +278,6 @@ def _ids_for(
     return (int(source_id), None) if source_type == "video" else (None, int(source_id))
 
 
-def _execute_url(rm: RunnerManager) -> str:
-    """Build the execute endpoint URL for the given runner manager."""
-    base = rm.url if rm.url.endswith("/") else rm.url + "/"
-    return base + "task/execute"
-
-
-def _headers(rm: RunnerManager) -> HeadersDict:
-    """Build authentication and content headers for the runner manager API."""
-    return {
-        "Accept": "application/json",
-        "Content-Type": "application/json",
-        "Authorization": f"Bearer {rm.token}",
-    }
-
-
-def _try_send_to_rm(
-    rm: RunnerManager, payload: RunnerManagerTaskPayload
-) -> Optional[requests.Response]:
-    """Try to POST the payload to a runner manager; log and return None on failure."""
-    try:
-        return requests.post(
-            _execute_url(rm), data=json.dumps(payload), headers=_headers(rm), timeout=30
-        )
-    except requests.RequestException as exc:
-        log.warning(
-            f"Cannot reach runner manager {rm.name}: {str(exc)}. Trying next one."
-        )
-        return None
-
-
 def _prestore_encoding_if_needed(
     *,
     task_type: TaskType,
@@ -323,7 +293,7 @@ def _prestore_encoding_if_needed(
     """
     if task_type not in ("encoding", "studio"):
         return
-    execute_url = _execute_url(rm)
+    execute_url = get_execute_url(rm)
     if source_type == "video":
         if video_id is not None:
             store_before_remote_encoding_video(video_id, execute_url, data)
@@ -340,23 +310,16 @@ def _prestore_encoding_if_needed(
             )
 
 
-def _submit_to_runner_manager(
+def _handle_accepted_task(
     rm: RunnerManager,
+    response: requests.Response,
     data: RunnerManagerTaskPayload,
     task_type: TaskType,
     source_type: SourceType,
     video_id: Optional[int],
     recording_id: Optional[int],
-) -> bool:
-    """Submit payload to one runner manager and handle response and pre-store."""
-    response = _try_send_to_rm(rm, data)
-    if response is None:
-        return False
-    if response.status_code != 200:
-        log.warning(
-            f"Runner manager {rm.name} returned status code {response.status_code}. Trying next one."
-        )
-        return False
+) -> None:
+    """Update the task accepted by a runner manager and run the pre-store steps."""
     log.info(
         f"Runner manager {rm.name} is available to process {task_type} for {source_type} {video_id or recording_id}."
     )
@@ -371,7 +334,6 @@ def _submit_to_runner_manager(
         rm=rm,
         data=data,
     )
-    return True
 
 
 def _update_task_pending(
@@ -453,17 +415,15 @@ def _send_task_to_runner_manager(
         # Build payload and try immediate submission
         data = _prepare_task_data(source_url, base_url, parameters, task_type)
 
-        # Try each runner manager by priority and stop on the first healthy one.
-        for rm in runner_managers_list:
-            if _submit_to_runner_manager(
-                rm,
-                data=data,
-                task_type=task_type,
-                source_type=source_type,
-                video_id=video_id,
-                recording_id=recording_id,
-            ):
-                return True
+        # Try the runner managers by priority and free slots, skipping the
+        # backed off ones, and stop on the first one accepting the task.
+        accepted = RunnerManagerScheduler(runner_managers_list).submit({source_id: data})
+        if source_id in accepted:
+            rm, response = accepted[source_id]
+            _handle_accepted_task(
+                rm, response, data, task_type, source_type, video_id, recording_id
+            )
+            return True
 
         log.warning(
             f"No runner manager available to process {task_type} for {source_type} {source_id}. "
@@ -651,8 +611,6 @@ def _edit_task(
 ) -> None:
     """Edit or create a task for a video or studio recording."""
     try:
-        from .task_queue import refresh_pending_task_ranks
-
         log.info(
             f"Edit or create a task: {video_id} {type} {runner_manager_id} {status} {task_id}"
         )
@@ -696,8 +654,6 @@ def _edit_task(
             # Keep association fields as-is
             task.save()
 
-        refresh_pending_task_ranks()
-
     except Exception as exc:
         log.error(
             f"Unable to edit a task (video_id={video_id}, recording_id={recording_id}): {str(exc)}"
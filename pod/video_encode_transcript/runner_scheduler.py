@@ -0,0 +1,350 @@
+"""Capacity-aware submission of tasks to the runner managers in Esup-Pod.
+
+The scheduler is kept simple:
+- each task goes to the runner manager with the lowest priority value, then
+  to one with free slots (capacity minus its pending and running tasks),
+  weighted by its latency divided by its free slots, the input order
+  breaking the ties,
+- the HTTP requests of a batch are sent concurrently by a bounded thread
+  pool, with a short connect timeout, and the database is only written
+  from the calling thread,
+- a runner manager that cannot be reached or fails is backed off for an
+  exponential delay, a full one is skipped for the rest of the batch, and
+  their tasks are submitted again to the next runner managers,
+- the status of the running tasks is polled on one connection by runner
+  manager, within an overall timeout, the runner managers being polled
+  concurrently.
+"""
+
+import json
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from typing import Any, Hashable, Optional
+
+import requests
+from django.conf import settings
+from django.db.models import Count
+from django.utils import timezone
+
+from .models import RunnerManager, Task
+
+log = logging.getLogger(__name__)
+
+RUNNER_MANAGER_CONNECT_TIMEOUT = getattr(settings, "RUNNER_MANAGER_CONNECT_TIMEOUT", 5)
+RUNNER_MANAGER_READ_TIMEOUT = getattr(settings, "RUNNER_MANAGER_READ_TIMEOUT", 30)
+RUNNER_MANAGER_POLL_TIMEOUT = getattr(settings, "RUNNER_MANAGER_POLL_TIMEOUT", 60)
+RUNNER_MANAGER_SUBMIT_WORKERS = getattr(settings, "RUNNER_MANAGER_SUBMIT_WORKERS", 4)
+RUNNER_MANAGER_BACKOFF = getattr(settings, "RUNNER_MANAGER_BACKOFF", 30)
+RUNNER_MANAGER_MAX_BACKOFF = getattr(settings, "RUNNER_MANAGER_MAX_BACKOFF", 900)
+
+# Weight of the last response time in the smoothed latency
+LATENCY_SMOOTHING = 0.3
+# Status code of a runner manager that has no free slot
+FULL_STATUS_CODE = 429
+
+
+def get_request_timeout() -> tuple[float, float]:
+    """Return the (connect, read) timeout of the runner manager requests."""
+    return (RUNNER_MANAGER_CONNECT_TIMEOUT, RUNNER_MANAGER_READ_TIMEOUT)
+
+
+def get_execute_url(runner_manager: RunnerManager) -> str:
+    """Build the execute endpoint URL for the given runner manager."""
+    base = runner_manager.url
+    if not base.endswith("/"):
+        base += "/"
+    return base + "task/execute"
+
+
+def get_headers(runner_manager: RunnerManager) -> dict[str, str]:
+    """Build authentication and content headers for the runner manager API."""
+    return {
+        "Accept": "application/json",
+        "Content-Type": "application/json",
+        "Authorization": f"Bearer {runner_manager.token}",
+    }
+
+
+def is_available(runner_manager: RunnerManager) -> bool:
+    """Return True if the runner manager is not backed off."""
+    return (
+        runner_manager.unavailable_until is None
+        or runner_manager.unavailable_until <= timezone.now()
+    )
+
+
+def get_free_slots(runner_managers: list[RunnerManager]) -> dict[int, int]:
+    """Return the free slots of the runner managers, from their submitted tasks."""
+    busy = dict(
+        Task.objects.filter(
+            runner_manager__in=runner_managers, status__in=["pending", "running"]
+        )
+        .order_by()
+        .values_list("runner_manager_id")
+        .annotate(count=Count("id"))
+        .values_list("runner_manager_id", "count")
+    )
+    return {rm.id: rm.capacity - busy.get(rm.id, 0) for rm in runner_managers}
+
+
+def record_success(runner_manager: RunnerManager, latency: float) -> None:
+    """Reset the failures of a runner manager and smooth its latency."""
+    if runner_manager.latency:
+        latency = (
+            1 - LATENCY_SMOOTHING
+        ) * runner_manager.latency + LATENCY_SMOOTHING * latency
+    runner_manager.latency = latency
+    runner_manager.failure_count = 0
+    runner_manager.unavailable_until = None
+    RunnerManager.objects.filter(id=runner_manager.id).update(
+        latency=latency, failure_count=0, unavailable_until=None
+    )
+
+
+def record_failure(runner_manager: RunnerManager) -> None:
+    """Back off a runner manager for a delay doubled at each failure."""
+    runner_manager.failure_count += 1
+    delay = min(
+        RUNNER_MANAGER_MAX_BACKOFF,
+        RUNNER_MANAGER_BACKOFF * 2 ** (runner_manager.failure_count - 1),
+    )
+    runner_manager.unavailable_until = timezone.now() + timedelta(seconds=delay)
+    RunnerManager.objects.filter(id=runner_manager.id).update(
+        failure_count=runner_manager.failure_count,
+        unavailable_until=runner_manager.unavailable_until,
+    )
+    log.warning(
+        "Runner manager %s backed off for %s seconds after %s failure(s)",
+        runner_manager.name,
+        delay,
+        runner_manager.failure_count,
+    )
+
+
+def post_task(
+    runner_manager: RunnerManager, data: dict[str, Any]
+) -> tuple[Optional[requests.Response], float]:
+    """POST a task payload to a runner manager, return the response and its time.
+
+    Called from the worker threads, so it must not use the database.
+    """
+    start = time.monotonic()
+    try:
+        response = requests.post(
+            get_execute_url(runner_manager),
+            data=json.dumps(data),
+            headers=get_headers(runner_manager),
+            timeout=get_request_timeout(),
+        )
+    except requests.RequestException as exc:
+        log.warning(f"Cannot reach runner manager {runner_manager.name}: {str(exc)}")
+        response = None
+    return response, time.monotonic() - start
+
+
+def get_status_url(runner_manager: RunnerManager, task_id: str) -> str:
+    """Build the status endpoint URL of a task for the given runner manager."""
+    base = runner_manager.url
+    if not base.endswith("/"):
+        base += "/"
+    return base + f"task/status/{task_id}"
+
+
+def fetch_runner_manager_statuses(
+    runner_manager: RunnerManager, remote_tasks: list[tuple[int, str]]
+) -> tuple[dict[int, Optional[str]], bool]:
+    """Fetch the status of (id, task_id) tasks of a runner manager on one connection.
+
+    Return the statuses by task id, and False if the runner manager could not
+    be reached, the remaining tasks being skipped. The tasks not polled
+    within RUNNER_MANAGER_POLL_TIMEOUT are left for the next poll. Called
+    from the worker threads, so it must not use the database.
+    """
+    statuses: dict[int, Optional[str]] = {}
+    deadline = time.monotonic() + RUNNER_MANAGER_POLL_TIMEOUT
+    with requests.Session() as session:
+        session.headers.update(
+            {
+                "Accept": "application/json",
+                "Authorization": f"Bearer {runner_manager.token}",
+            }
+        )
+        for task_id, remote_id in remote_tasks:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                log.warning(
+                    f"Poll timeout of runner manager {runner_manager.name} reached, "
+                    "its remaining tasks are left for the next poll"
+                )
+                break
+            try:
+                response = session.get(
+                    get_status_url(runner_manager, remote_id),
+                    timeout=(
+                        RUNNER_MANAGER_CONNECT_TIMEOUT,
+                        min(RUNNER_MANAGER_READ_TIMEOUT, remaining),
+                    ),
+                )
+            except requests.RequestException as exc:
+                if isinstance(exc, requests.ReadTimeout) and time.monotonic() >= deadline:
+                    # Cut by the poll timeout, not a failure of the runner manager
+                    continue
+                log.warning(f"Cannot reach runner manager {runner_manager.name}: {exc}")
+                return statuses, False
+            if response.status_code != 200:
+                log.warning(
+                    f"Failed to get status for task {task_id}: "
+                    f"HTTP {response.status_code}"
+                )
+                continue
+            try:
+                statuses[task_id] = response.json().get("status")
+            except ValueError:
+                log.warning(f"Invalid status response for task {task_id}")
+    return statuses, True
+
+
+def fetch_task_statuses(tasks: list[Task]) -> dict[int, Optional[str]]:
+    """Return the remote status of tasks by id, polling the runner managers concurrently.
+
+    The tasks without remote id or linked to an inactive or backed off runner
+    manager are skipped.
+    """
+    runner_managers: dict[int, RunnerManager] = {}
+    remote_tasks: dict[int, list[tuple[int, str]]] = {}
+    for task in tasks:
+        runner_manager = task.runner_manager
+        if not task.task_id or not runner_manager or not runner_manager.is_active:
+            log.warning(f"Task {task.id} has no active runner manager or task_id")
+            continue
+        if not is_available(runner_manager):
+            continue
+        runner_managers[runner_manager.id] = runner_manager
+        remote_tasks.setdefault(runner_manager.id, []).append((task.id, task.task_id))
+    if not remote_tasks:
+        return {}
+    workers = min(RUNNER_MANAGER_SUBMIT_WORKERS, len(remote_tasks))
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        results = list(
+            executor.map(
+                lambda rm_id: fetch_runner_manager_statuses(
+                    runner_managers[rm_id], remote_tasks[rm_id]
+                ),
+                remote_tasks,
+            )
+        )
+    statuses: dict[int, Optional[str]] = {}
+    for rm_id, (rm_statuses, reachable) in zip(remote_tasks, results):
+        statuses.update(rm_statuses)
+        if not reachable:
+            record_failure(runner_managers[rm_id])
+    return statuses
+
+
+class RunnerManagerScheduler:
+    """Assign a batch of tasks to the runner managers and submit them concurrently.
+
+    A scheduler keeps its slot counts between its submissions, so it can be
+    used for all the tasks of a batch, whatever their type.
+    """
+
+    def __init__(self, runner_managers: list[RunnerManager]) -> None:
+        """Keep the available runner managers, in the given order."""
+        self.runner_managers = [rm for rm in runner_managers if is_available(rm)]
+        self.free_slots = get_free_slots(self.runner_managers)
+        self.failed: set[int] = set()
+
+    def pick(self, tried: set[int]) -> Optional[RunnerManager]:
+        """Return the best runner manager not tried yet for a task."""
+        candidates = [
+            rm
+            for rm in self.runner_managers
+            if rm.id not in tried and rm.id not in self.failed
+        ]
+        if not candidates:
+            return None
+        return min(candidates, key=self.get_weight)
+
+    def get_weight(self, runner_manager: RunnerManager) -> tuple:
+        """Return the sort key of a runner manager, the lowest being the best."""
+        free_slots = self.free_slots[runner_manager.id]
+        return (
+            runner_manager.priority,
+            free_slots <= 0,
+            # the latency is shared by the free slots
+            runner_manager.latency / max(free_slots, 1),
+            -free_slots,
+        )
+
+    def post_all(
+        self, assignments: list[tuple[Hashable, dict, RunnerManager]]
+    ) -> list[tuple[Optional[requests.Response], float]]:
+        """POST the assigned payloads, in a bounded thread pool if more than one."""
+        if len(assignments) == 1:
+            _, data, runner_manager = assignments[0]
+            return [post_task(runner_manager, data)]
+        workers = min(RUNNER_MANAGER_SUBMIT_WORKERS, len(assignments))
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            return list(
+                executor.map(lambda item: post_task(item[2], item[1]), assignments)
+            )
+
+    def handle_response(
+        self,
+        runner_manager: RunnerManager,
+        response: Optional[requests.Response],
+        latency: float,
+    ) -> bool:
+        """Update the runner manager health from a response, True if accepted."""
+        if response is not None and response.status_code == 200:
+            record_success(runner_manager, latency)
+            return True
+        self.free_slots[runner_manager.id] += 1
+        if response is None or response.status_code >= 500:
+            self.failed.add(runner_manager.id)
+            record_failure(runner_manager)
+        elif response.status_code == FULL_STATUS_CODE:
+            # Reachable but full: skip it for the rest of the batch only
+            log.info("Runner manager %s has no free slot", runner_manager.name)
+            self.failed.add(runner_manager.id)
+        else:
+            log.warning(
+                f"Runner manager {runner_manager.name} returned status code "
+                f"{response.status_code}"
+            )
+        return False
+
+    def submit(
+        self, jobs: dict[Hashable, dict]
+    ) -> dict[Hashable, tuple[RunnerManager, requests.Response]]:
+        """Submit the task payloads, return the accepting runner manager of each.
+
+        The tasks refused by a runner manager are submitted again to the next
+        ones, until they are accepted or no runner manager is left.
+        """
+        tried: dict[Hashable, set[int]] = {key: set() for key in jobs}
+        accepted: dict[Hashable, tuple[RunnerManager, requests.Response]] = {}
+        pending = list(jobs)
+        while pending:
+            assignments = []
+            for key in pending:
+                runner_manager = self.pick(tried[key])
+                if runner_manager is None:
+                    continue
+                tried[key].add(runner_manager.id)
+                self.free_slots[runner_manager.id] -= 1
+                assignments.append((key, jobs[key], runner_manager))
+            if not assignments:
+                break
+            pending = []
+            results = self.post_all(assignments)
+            for (key, _, runner_manager), (response, latency) in zip(
+                assignments, results
+            ):
+                if self.handle_response(runner_manager, response, latency):
+                    accepted[key] = (runner_manager, response)
+                else:
+                    pending.append(key)
+        return accepted
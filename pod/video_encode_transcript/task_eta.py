@@ -0,0 +1,165 @@
+"""Estimated waiting times of the runner manager task queue in Esup-Pod.
+
+The estimation is kept simple:
+- the processing time of a task is predicted from the median time of the
+  last finished tasks, by second of media when the duration is known,
+- the most specific history is used first (type, runner manager and
+  resolution), then the type and resolution, then the type only,
+- the queue is simulated on the slots of the active runner managers, the
+  running tasks first, then the pending tasks in rank order.
+"""
+
+import heapq
+import logging
+from datetime import datetime
+from statistics import median
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import ObjectDoesNotExist
+from django.db.models import Sum
+from django.utils import timezone
+
+from pod.video.models import Video
+
+from .models import RunnerManager, Task
+from .task_queue import get_sorted_pending_tasks, get_task_rank
+
+log = logging.getLogger(__name__)
+
+ENCODING_ETA_HISTORY = getattr(settings, "ENCODING_ETA_HISTORY", 500)
+ENCODING_ETA_DEFAULT_RATIO = getattr(settings, "ENCODING_ETA_DEFAULT_RATIO", 1.0)
+
+ETA_MODEL_CACHE_KEY = "task_eta_model"
+ETA_MODEL_CACHE_TIMEOUT = 3600
+# Predicted processing time of a task without history nor duration
+DEFAULT_TASK_SECONDS = 600
+
+
+def get_resolution_class(height: int) -> str:
+    """Return the resolution class of a video height, empty if unknown."""
+    if not height:
+        return ""
+    if height <= 480:
+        return "sd"
+    if height <= 720:
+        return "hd"
+    return "fhd"
+
+
+def _video_height(video: Video | None) -> int:
+    """Return the height of the source of a video, read at its last encoding."""
+    try:
+        return video.stream_info.height if video else 0
+    except ObjectDoesNotExist:
+        return 0
+
+
+def _task_keys(task: Task) -> list[str]:
+    """Return the history keys of a task, from the most to the least specific."""
+    resolution = get_resolution_class(_video_height(task.video))
+    return [
+        "%s:%s:%s" % (task.type, task.runner_manager_id or "", resolution),
+        "%s::%s" % (task.type, resolution),
+        task.type,
+    ]
+
+
+def _task_duration(task: Task) -> int:
+    """Return the media duration of a task in seconds, 0 if unknown."""
+    return task.video.duration if task.video_id and task.video else 0
+
+
+def train_eta_model() -> dict[str, dict[str, float]]:
+    """Return the median processing ratios and times of the last finished tasks."""
+    tasks = (
+        Task.objects.filter(status="completed", date_end__isnull=False)
+        .select_related("video", "video__stream_info")
+        .order_by("-date_end")[:ENCODING_ETA_HISTORY]
+    )
+    ratios: dict[str, list[float]] = {}
+    seconds: dict[str, list[float]] = {}
+    for task in tasks:
+        elapsed = (task.date_end - (task.date_start or task.date_added)).total_seconds()
+        if elapsed <= 0:
+            continue
+        duration = _task_duration(task)
+        for key in _task_keys(task):
+            seconds.setdefault(key, []).append(elapsed)
+            if duration:
+                ratios.setdefault(key, []).append(elapsed / duration)
+    return {
+        "ratio": {key: median(values) for key, values in ratios.items()},
+        "seconds": {key: median(values) for key, values in seconds.items()},
+    }
+
+
+def get_eta_model() -> dict[str, dict[str, float]]:
+    """Return the prediction model, trained again when its cache expires."""
+    model = cache.get(ETA_MODEL_CACHE_KEY)
+    if model is None:
+        model = train_eta_model()
+        cache.set(ETA_MODEL_CACHE_KEY, model, ETA_MODEL_CACHE_TIMEOUT)
+    return model
+
+
+def predict_task_seconds(task: Task, model: dict[str, dict[str, float]]) -> float:
+    """Return the predicted processing time of a task in seconds."""
+    duration = _task_duration(task)
+    for key in _task_keys(task):
+        if duration and key in model["ratio"]:
+            return model["ratio"][key] * duration
+        if not duration and key in model["seconds"]:
+            return model["seconds"][key]
+    if duration:
+        return ENCODING_ETA_DEFAULT_RATIO * duration
+    return DEFAULT_TASK_SECONDS
+
+
+def get_queue_capacity() -> int:
+    """Return the number of tasks processed at the same time by the runner managers."""
+    capacity = RunnerManager.objects.filter(is_active=True).aggregate(
+        capacity=Sum("capacity")
+    )["capacity"]
+    return max(1, capacity or 0)
+
+
+def simulate_task_queue(
+    now: datetime | None = None, limit: int | None = None
+) -> dict[int, float]:
+    """Return the estimated seconds before the end of each running or pending task.
+
+    Only the first `limit` pending tasks are simulated when it is given.
+    """
+    now = now or timezone.now()
+    model = get_eta_model()
+    slots = [0.0] * get_queue_capacity()
+    etas: dict[int, float] = {}
+    running_tasks = Task.objects.filter(status="running").select_related(
+        "video", "video__stream_info"
+    )
+    for task in running_tasks:
+        elapsed = (now - (task.date_start or task.date_added)).total_seconds()
+        remaining = max(0.0, predict_task_seconds(task, model) - elapsed)
+        etas[task.id] = heapq.heappop(slots) + remaining
+        heapq.heappush(slots, etas[task.id])
+    for task in get_sorted_pending_tasks(limit=limit):
+        etas[task.id] = heapq.heappop(slots) + predict_task_seconds(task, model)
+        heapq.heappush(slots, etas[task.id])
+    return etas
+
+
+def get_video_encoding_eta(video: Video) -> int | None:
+    """Return the estimated seconds before the end of the encoding of a video."""
+    queue_task = (
+        Task.objects.filter(
+            video_id=video.id, type="encoding", status__in=["pending", "running"]
+        )
+        .order_by("date_added", "id")
+        .first()
+    )
+    if queue_task is None:
+        return None
+    # The tasks behind it in the queue do not change its estimation
+    eta = simulate_task_queue(limit=get_task_rank(queue_task) or 0).get(queue_task.id)
+    return int(eta) if eta is not None else None
@@ -1,14 +1,18 @@
 """Queue ranking helpers for encoding/transcription task dispatch in Esup-Pod.
 
 The queue is intentionally simple:
-- only pending tasks receive a rank,
-- rank is recomputed from scratch to keep ordering deterministic,
+- the priority of a task is stored when it is enqueued,
+- pending tasks are ordered on the (status, priority, date_added, id) index,
+- the rank of a task is counted on that index only when it is displayed,
 - non-pending tasks must not retain stale rank values.
 """
 
 import logging
 from typing import TypeAlias
 
+from django.db.models import Q, Window
+from django.db.models.functions import RowNumber
+
 from pod.video.models import Video
 
 from .models import Task
@@ -18,6 +22,7 @@ log = logging.getLogger(__name__)
 QueuePriority: TypeAlias = int
 HIGH_PRIORITY: QueuePriority = 1
 LOW_PRIORITY: QueuePriority = 2
+QUEUE_ORDERING = ("priority", "date_added", "id")
 
 
 def get_user_priority(video: Video) -> QueuePriority:
@@ -42,35 +47,76 @@ def get_user_priority(video: Video) -> QueuePriority:
         return HIGH_PRIORITY
 
 
-def _task_priority(task: Task) -> QueuePriority:
-    """Return priority for a pending task."""
-    if not task.video_id or not task.video:
-        return HIGH_PRIORITY
-    return get_user_priority(task.video)
+def get_sorted_pending_tasks(
+    task_type: str | None = None, limit: int | None = None
+) -> list[Task]:
+    """Return the pending tasks sorted by queue priority and creation date.
+
+    The order is read on the queue index, so that only the first `limit`
+    tasks are loaded when a batch of tasks is dispatched.
+    """
+    pending_tasks = Task.objects.filter(status="pending")
+    if task_type:
+        pending_tasks = pending_tasks.filter(type=task_type)
+    pending_tasks = pending_tasks.select_related("video", "video__stream_info").order_by(
+        *QUEUE_ORDERING
+    )
+    if limit is not None:
+        pending_tasks = pending_tasks[:limit]
+    return list(pending_tasks)
 
 
-def get_sorted_pending_tasks() -> list[Task]:
-    """Return all pending tasks sorted by queue priority and creation date."""
-    pending_tasks = list(
+def get_task_rank(task: Task) -> int | None:
+    """Return the rank of a pending task, counted on the queue index."""
+    if task.status != "pending":
+        return None
+    return (
         Task.objects.filter(status="pending")
-        .select_related("video", "video__owner", "video__owner__owner")
-        .order_by("date_added", "id")
-    )
-    pending_tasks.sort(
-        key=lambda task: (_task_priority(task), task.date_added, task.id),
+        .filter(
+            Q(priority__lt=task.priority)
+            | Q(priority=task.priority, date_added__lt=task.date_added)
+            | Q(priority=task.priority, date_added=task.date_added, id__lte=task.id)
+        )
+        .count()
     )
-    return pending_tasks
 
 
-def refresh_pending_task_ranks() -> None:
-    """Recalculate rank for all pending tasks and clear rank for non-pending ones."""
-    sorted_tasks = get_sorted_pending_tasks()
-    updates: list[Task] = []
-    for index, task in enumerate(sorted_tasks, start=1):
-        if task.rank != index:
-            task.rank = index
+def refresh_pending_task_priorities(tasks=None) -> int:
+    """Store the owner priority of the pending tasks, and return their number.
+
+    `Task.save()` sets the priority of a pending task. This backfills the tasks
+    enqueued before the priority was stored, or set pending by a bulk update.
+    """
+    tasks = Task.objects.all() if tasks is None else tasks
+    updates = []
+    for task in tasks.filter(status="pending").select_related("video__owner__owner"):
+        priority = get_user_priority(task.video) if task.video else HIGH_PRIORITY
+        if task.priority != priority:
+            task.priority = priority
             updates.append(task)
+    if updates:
+        Task.objects.bulk_update(updates, ["priority"])
+    return len(updates)
+
+
+def refresh_pending_task_ranks() -> None:
+    """Store the rank of all pending tasks and clear it for non-pending ones.
 
+    The rank is computed lazily by `get_task_rank()`, this keeps the stored
+    column in sync after each dispatch of `process_tasks` and each relaunch.
+    """
+    ranked_tasks = (
+        Task.objects.filter(status="pending")
+        .annotate(
+            queue_rank=Window(expression=RowNumber(), order_by=list(QUEUE_ORDERING))
+        )
+        .values_list("id", "rank", "queue_rank")
+    )
+    updates = [
+        Task(id=task_id, rank=queue_rank)
+        for task_id, rank, queue_rank in ranked_tasks
+        if rank != queue_rank
+    ]
     if updates:
         # Batch write only changed rows to avoid unnecessary UPDATE queries.
         Task.objects.bulk_update(updates, ["rank"])
@@ -87,5 +133,5 @@ def get_video_pending_encoding_queue_info(video: Video) -> tuple[int | None, int
         .order_by("date_added", "id")
         .first()
     )
-    queue_rank = queue_task.rank if queue_task else None
+    queue_rank = get_task_rank(queue_task) if queue_task else None
     return queue_rank, queue_total
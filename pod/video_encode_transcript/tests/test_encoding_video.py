@@ -0,0 +1,357 @@
+"""
+Unit tests for Esup-Pod single pass, segment, adaptive and resumed video encoding.
+
+Run with `python manage.py test pod.video_encode_transcript.tests.test_encoding_video`
+"""
+
+import json
+import os
+import shlex
+import tempfile
+from unittest.mock import Mock, patch
+
+from django.test import TestCase
+
+from ..Encoding_video import Encoding_video
+from ..encoding_utils import get_complexity, scale_bitrate
+
+
+class SinglePassEncodingTests(TestCase):
+    """TestCase for the single pass encoding of a video."""
+
+    fixtures = [
+        "initial_data.json",
+    ]
+
+    def setUp(self) -> None:
+        """Set up an encoding with a 720p video track and an audio track."""
+        media_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(media_dir.cleanup)
+        self.encoding_video = Encoding_video(
+            1, os.path.join(media_dir.name, "video.mp4"), single_pass=True
+        )
+        self.encoding_video.create_output_dir()
+        self.encoding_video.duration = 120
+        self.encoding_video.list_video_track = {"0": {"width": 1280, "height": 720}}
+        self.encoding_video.list_audio_track = {"1": {}}
+
+    def test_single_pass_command(self) -> None:
+        """Feed every output from a single input with split and asplit."""
+        self.assertTrue(self.encoding_video.use_single_pass())
+        command, stages = self.encoding_video.get_single_pass_command()
+        args = shlex.split(command)
+        self.assertEqual(args.count("-i"), 1)
+        self.assertEqual(args.count("-filter_complex"), 1)
+        filter_complex = args[args.index("-filter_complex") + 1]
+        # 360p and 720p in MP4 and HLS, the thumbnails and the overview
+        self.assertIn("[0:v:0]split=6[v0][v1][v2][v3][v4][v5]", filter_complex)
+        # the audio of each MP4 and HLS output and the MP3
+        self.assertIn("[0:a:0]asplit=5[a0][a1][a2][a3][a4]", filter_complex)
+        self.assertIn("[v5]fps=fps=(100/120),scale=160x90,tile=100x1", filter_complex)
+        self.assertEqual(
+            list(stages),
+            [
+                "mp4_command",
+                "hls_command",
+                "mp3_command",
+                "create_thumbnail_command",
+                "create_overview",
+            ],
+        )
+        self.assertEqual(list(self.encoding_video.list_mp4_files), [360, 720])
+        self.assertEqual(list(self.encoding_video.list_hls_files), [360, 720])
+        self.assertEqual(len(self.encoding_video.list_thumbnail_files), 3)
+        print(" ---> test_single_pass_command: OK! --- SinglePassEncodingTests")
+
+    def test_single_pass_encoding_log(self) -> None:
+        """Keep one encoding log entry by stage."""
+        with patch(
+            "pod.video_encode_transcript.Encoding_video.launch_cmd",
+            return_value=(True, "ok"),
+        ) as launch_cmd:
+            self.encoding_video.encode_single_pass()
+        launch_cmd.assert_called_once()
+        encoding_log = self.encoding_video.encoding_log
+        self.assertTrue(encoding_log["single_pass_command"]["result"])
+        # No file written by the mocked command
+        self.assertFalse(encoding_log["mp4_command"]["result"])
+        self.assertIn(
+            os.path.join(self.encoding_video.output_dir, "360p.mp4"),
+            encoding_log["mp4_command"]["msg"],
+        )
+        self.assertTrue(self.encoding_video.error_encoding)
+        # Multiple decodes for an audio file or a video of unknown duration
+        self.encoding_video.duration = 0
+        self.assertFalse(self.encoding_video.use_single_pass())
+        print(" ---> test_single_pass_encoding_log: OK! --- SinglePassEncodingTests")
+
+    def test_single_pass_fallback(self) -> None:
+        """Encode the outputs with one command each when the single pass fails."""
+        stages = []
+
+        def run_stage(stage, method) -> None:
+            stages.append(stage)
+            if stage == "single_pass":
+                method()
+
+        with patch(
+            "pod.video_encode_transcript.Encoding_video.launch_cmd",
+            return_value=(False, "Error initializing complex filters"),
+        ), patch.object(self.encoding_video, "run_stage", side_effect=run_stage):
+            self.encoding_video.encode_outputs()
+        self.assertEqual(
+            stages,
+            ["single_pass", "video", "hls", "audio", "thumbnails", "overview"],
+        )
+        self.assertFalse(
+            self.encoding_video.encoding_log["single_pass_command"]["result"]
+        )
+        self.assertEqual(self.encoding_video.list_mp4_files, {})
+        self.assertFalse(self.encoding_video.error_encoding)
+        print(" ---> test_single_pass_fallback: OK! --- SinglePassEncodingTests")
+
+
+class SegmentEncodingTests(TestCase):
+    """TestCase for the encoding of a long video by segments."""
+
+    fixtures = [
+        "initial_data.json",
+    ]
+
+    def setUp(self) -> None:
+        """Set up an encoding of a 10 minutes 720p video with an audio track."""
+        media_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(media_dir.cleanup)
+        self.encoding_video = Encoding_video(1, os.path.join(media_dir.name, "video.mp4"))
+        self.encoding_video.create_output_dir()
+        self.encoding_video.duration = 600
+        self.encoding_video.list_video_track = {"0": {"width": 1280, "height": 720}}
+        self.encoding_video.list_audio_track = {"1": {}}
+        self.commands = []
+
+    def launch_cmd(self, cmd):
+        """Record the command, create the segments on split."""
+        self.commands.append(cmd)
+        if " -f segment " in cmd:
+            segments_dir = os.path.join(self.encoding_video.output_dir, "segments")
+            for index in range(3):
+                open(os.path.join(segments_dir, "segment_%04d.mkv" % index), "w").close()
+        return True, "ok"
+
+    @patch("pod.video_encode_transcript.Encoding_video.FFMPEG_SEGMENT_DURATION", 120)
+    def test_encode_segments_part(self) -> None:
+        """Encode the segments in parallel, then join them by rendition."""
+        self.assertTrue(self.encoding_video.use_segments())
+        self.encoding_video.cutting_stop = 60
+        self.assertFalse(self.encoding_video.use_segments())
+        self.encoding_video.cutting_stop = 0
+        with patch(
+            "pod.video_encode_transcript.Encoding_video.launch_cmd",
+            side_effect=self.launch_cmd,
+        ):
+            self.encoding_video.encode_segments_part()
+        encoding_log = self.encoding_video.encoding_log
+        # 1 split, 3 segments, 2 audio bitrates, 2 concats and 2 HLS packagings
+        self.assertEqual(len(self.commands), 10)
+        self.assertEqual(shlex.split(self.commands[0]).count("-c"), 1)
+        self.assertIn("segment_2_command", encoding_log)
+        self.assertIn("segment_audio_128k_command", encoding_log)
+        self.assertIn("hls_720_command", encoding_log)
+        self.assertFalse(self.encoding_video.error_encoding)
+        self.assertEqual(list(self.encoding_video.list_mp4_files), [360, 720])
+        self.assertEqual(list(self.encoding_video.list_hls_files), [360, 720])
+        self.assertFalse(
+            os.path.exists(os.path.join(self.encoding_video.output_dir, "segments"))
+        )
+        print(" ---> test_encode_segments_part: OK! --- SegmentEncodingTests")
+
+    @patch("pod.video_encode_transcript.Encoding_video.FFMPEG_SEGMENT_DURATION", 120)
+    def test_encode_segments_part_failure(self) -> None:
+        """Encode the video in a single file when a segment fails, without concat."""
+
+        def launch_cmd(cmd):
+            self.launch_cmd(cmd)
+            return "segment_0001.mkv" not in cmd, "ok"
+
+        with patch(
+            "pod.video_encode_transcript.Encoding_video.launch_cmd",
+            side_effect=launch_cmd,
+        ):
+            self.encoding_video.encode_segments_part()
+        encoding_log = self.encoding_video.encoding_log
+        self.assertFalse(encoding_log["segment_1_command"]["result"])
+        self.assertFalse(any(title.startswith("concat_") for title in encoding_log))
+        self.assertIn("mp4_command", encoding_log)
+        self.assertIn("hls_command", encoding_log)
+        self.assertFalse(self.encoding_video.error_encoding)
+        self.assertFalse(
+            os.path.exists(os.path.join(self.encoding_video.output_dir, "segments"))
+        )
+        print(" ---> test_encode_segments_part_failure: OK! --- SegmentEncodingTests")
+
+
+class AdaptiveLadderTests(TestCase):
+    """TestCase for the renditions adapted to the complexity of the source."""
+
+    fixtures = [
+        "initial_data.json",
+    ]
+
+    def setUp(self) -> None:
+        """Set up an encoding of a 1080p video with an audio track."""
+        media_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(media_dir.cleanup)
+        self.encoding_video = Encoding_video(1, os.path.join(media_dir.name, "video.mp4"))
+        self.encoding_video.create_output_dir()
+        self.encoding_video.duration = 600
+        self.encoding_video.list_video_track = {"0": {"width": 1920, "height": 1080}}
+        self.encoding_video.list_audio_track = {"1": {}}
+
+    def test_get_complexity(self) -> None:
+        """Get the static ratio, the motion and the scene changes of the keyframes."""
+        scores = [0.0, 0.001, 0.5, 0.002, 0.0, 0.01, 0.4, 0.0, 0.005, 0.0]
+        complexity = get_complexity(scores, 120)
+        self.assertEqual(complexity["keyframes"], 10)
+        self.assertEqual(complexity["static_ratio"], 0.7)
+        self.assertEqual(complexity["motion"], 0.0918)
+        self.assertEqual(complexity["scene_changes"], 1)
+        self.assertEqual(scale_bitrate("3000k", 0.4), "1200k")
+        self.assertEqual(scale_bitrate("3M", 0.5), "1500k")
+        print(" ---> test_get_complexity: OK! --- AdaptiveLadderTests")
+
+    def test_static_ladder(self) -> None:
+        """Lower the maxrate and skip the middle renditions of a slide deck."""
+        self.assertEqual(
+            list(self.encoding_video.get_rendition_ladder()), [360, 720, 1080]
+        )
+        self.encoding_video.complexity = {
+            "keyframes": 60,
+            "static_ratio": 0.95,
+            "motion": 0.004,
+            "scene_changes": 0.5,
+        }
+        ladder = self.encoding_video.get_rendition_ladder()
+        self.assertEqual(list(ladder), [360, 1080])
+        self.assertEqual(ladder[360]["maxrate"], "400k")
+        self.assertEqual(ladder[1080]["maxrate"], "1800k")
+        args = shlex.split(self.encoding_video.get_hls_command())
+        self.assertEqual(args[args.index("-crf") + 1], "24")
+        self.assertEqual(list(self.encoding_video.list_hls_files), [360, 1080])
+        self.encoding_video.get_mp4_command()
+        self.assertEqual(list(self.encoding_video.list_mp4_files), [360])
+        print(" ---> test_static_ladder: OK! --- AdaptiveLadderTests")
+
+    def test_complex_ladder(self) -> None:
+        """Keep the renditions of the settings for a camera recording."""
+        self.encoding_video.complexity = {
+            "keyframes": 60,
+            "static_ratio": 0.1,
+            "motion": 0.2,
+            "scene_changes": 12,
+        }
+        ladder = self.encoding_video.get_rendition_ladder()
+        self.assertEqual(list(ladder), [360, 720, 1080])
+        self.assertEqual(ladder[720]["maxrate"], "3000k")
+        with patch(
+            "pod.video_encode_transcript.Encoding_video.get_video_complexity",
+            return_value=({"static_ratio": 0.5, "motion": 0.05, "scene_changes": 3}, ""),
+        ):
+            self.encoding_video.analyse_complexity()
+        self.assertIn("complexity_command", self.encoding_video.encoding_log)
+        ladder = self.encoding_video.get_rendition_ladder()
+        self.assertEqual(list(ladder), [360, 720, 1080])
+        self.assertEqual(ladder[720]["maxrate"], "2100k")
+        self.assertEqual(ladder[720]["ladder_profile"], "low_motion")
+        print(" ---> test_complex_ladder: OK! --- AdaptiveLadderTests")
+
+
+class CheckpointEncodingTests(TestCase):
+    """TestCase for the encoding resumed from the checkpoint of a previous run."""
+
+    fixtures = [
+        "initial_data.json",
+    ]
+
+    def setUp(self) -> None:
+        """Set up a source file and its output directory."""
+        media_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(media_dir.cleanup)
+        self.video_file = os.path.join(media_dir.name, "video.mp4")
+        with open(self.video_file, "wb") as file:
+            file.write(b"source content")
+        self.mp4_file = os.path.join(media_dir.name, "0001", "360p.mp4")
+
+    def get_encoding_video(self, cutting_stop=0):
+        """Get an encoding of the source, with its checkpoint loaded."""
+        encoding_video = Encoding_video(1, self.video_file, 0, cutting_stop)
+        encoding_video.create_output_dir()
+        encoding_video.load_checkpoint()
+        return encoding_video
+
+    def encode_mp4(self, encoding_video):
+        """Get a stage writing the 360p MP4 rendition."""
+
+        def encode_mp4_part():
+            with open(self.mp4_file, "wb") as file:
+                file.write(b"encoded content")
+            encoding_video.list_mp4_files[360] = self.mp4_file
+            encoding_video.add_encoding_log("mp4_command", "ffmpeg", True, "ok")
+
+        return encode_mp4_part
+
+    def test_resume_stages(self) -> None:
+        """Restore the stages done before the first failed one."""
+        encoding_video = self.get_encoding_video()
+        encoding_video.run_stage("video", self.encode_mp4(encoding_video))
+        encoding_video.run_stage(
+            "hls",
+            lambda: encoding_video.add_encoding_log("hls_command", "ffmpeg", False, ""),
+        )
+        self.assertTrue(encoding_video.error_encoding)
+        with open(encoding_video.get_checkpoint_file(), "r") as json_file:
+            stages = json.load(json_file)["stages"]
+        self.assertEqual(list(stages), ["video"])
+        # the output files are checked by size and modification time
+        self.assertEqual(
+            stages["video"]["files"][self.mp4_file][0], len(b"encoded content")
+        )
+
+        encoding_video = self.get_encoding_video()
+        encode_mp4_part = Mock()
+        encode_hls_part = Mock()
+        encoding_video.run_stage("video", encode_mp4_part)
+        encoding_video.run_stage("hls", encode_hls_part)
+        encode_mp4_part.assert_not_called()
+        encode_hls_part.assert_called_once()
+        self.assertEqual(encoding_video.list_mp4_files, {360: self.mp4_file})
+        self.assertIn("mp4_command", encoding_video.encoding_log)
+        self.assertIn("checkpoint_video", encoding_video.encoding_log)
+        self.assertFalse(encoding_video.error_encoding)
+
+        encoding_video.remove_checkpoint()
+        self.assertFalse(os.path.exists(encoding_video.get_checkpoint_file()))
+        print(" ---> test_resume_stages: OK! --- CheckpointEncodingTests")
+
+    def test_restart_stages(self) -> None:
+        """Run again the stages of a changed output or of other parameters."""
+        encoding_video = self.get_encoding_video()
+        encoding_video.run_stage("video", self.encode_mp4(encoding_video))
+        encoding_video.run_stage("hls", Mock())
+        with open(self.mp4_file, "wb") as file:
+            file.write(b"truncated")
+        encoding_video = self.get_encoding_video()
+        encode_mp4_part = Mock()
+        encode_hls_part = Mock()
+        encoding_video.run_stage("video", encode_mp4_part)
+        encoding_video.run_stage("hls", encode_hls_part)
+        # the stages after a run one are not restored
+        encode_mp4_part.assert_called_once()
+        encode_hls_part.assert_called_once()
+
+        encoding_video = self.get_encoding_video()
+        encoding_video.run_stage("video", self.encode_mp4(encoding_video))
+        encoding_video = self.get_encoding_video(cutting_stop=10)
+        encode_mp4_part = Mock()
+        encoding_video.run_stage("video", encode_mp4_part)
+        encode_mp4_part.assert_called_once()
+        print(" ---> test_restart_stages: OK! --- CheckpointEncodingTests")
@@ -0,0 +1,125 @@
+"""
+Unit tests for the reuse of the encodings of identical sources.
+
+Run with `python manage.py test pod.video_encode_transcript.tests.test_fingerprint`
+"""
+
+import os
+import tempfile
+from unittest.mock import patch
+
+from django.contrib.auth.models import User
+from django.core.files.base import ContentFile
+from django.test import TestCase
+
+from pod.video.models import Type, Video
+
+from ..encode import get_encoding_video, reuse_encoding
+from ..fingerprint import get_file_fingerprint, link_file
+from ..models import EncodingFingerprint, EncodingStep, EncodingVideo, VideoRendition
+
+
+class FingerprintTestCase(TestCase):
+    """TestCase for the encoding fingerprints."""
+
+    fixtures = [
+        "initial_data.json",
+    ]
+
+    def setUp(self) -> None:
+        """Set up two videos with the same source content, the first one encoded."""
+        user = User.objects.create(username="pod", password="pod1234pod")
+        self.videos = []
+        for i in range(2):
+            video = Video.objects.create(
+                title="Video%s" % i,
+                owner=user,
+                video="test.mp4",
+                type=Type.objects.get(id=1),
+            )
+            video.video.save("test.mp4", ContentFile(b"same source content"))
+            self.addCleanup(video.video.delete, save=False)
+            self.videos.append(video)
+        encoding_video = get_encoding_video(self.videos[0])
+        encoding_video.create_output_dir()
+        output_file = os.path.join(encoding_video.output_dir, "360p.mp4")
+        with open(output_file, "wb") as file:
+            file.write(b"encoded content")
+        self.addCleanup(os.remove, output_file)
+        EncodingVideo.objects.create(
+            name="360p",
+            video=self.videos[0],
+            rendition=VideoRendition.objects.get(id=1),
+            encoding_format="video/mp4",
+            source_file=encoding_video.get_true_path(output_file),
+        )
+        EncodingStep.objects.create(
+            video=self.videos[0], num_step=0, desc_step="end of encoding"
+        )
+        self.assertFalse(reuse_encoding(encoding_video))
+
+    def test_file_fingerprint(self) -> None:
+        path = self.videos[0].video.path
+        self.assertEqual(
+            get_file_fingerprint(path, {"cut": [0, 0]}),
+            get_file_fingerprint(self.videos[1].video.path, {"cut": [0, 0]}),
+        )
+        self.assertNotEqual(
+            get_file_fingerprint(path, {"cut": [0, 0]}),
+            get_file_fingerprint(path, {"cut": [0, 10]}),
+        )
+        print(" ---> test_file_fingerprint: OK! --- FingerprintTestCase")
+
+    def test_link_file(self) -> None:
+        with tempfile.TemporaryDirectory() as directory:
+            destination = os.path.join(directory, "copy.mp4")
+            method = link_file(self.videos[0].video.path, destination)
+            self.assertIn(method, ("reflink", "copy"))
+            # A rewrite of the source does not change the destination
+            self.assertNotEqual(
+                os.stat(destination).st_ino, os.stat(self.videos[0].video.path).st_ino
+            )
+            with open(destination, "rb") as file:
+                self.assertEqual(file.read(), b"same source content")
+        print(" ---> test_link_file: OK! --- FingerprintTestCase")
+
+    @patch(
+        "pod.video_encode_transcript.Encoding_video_model."
+        + "Encoding_video_model.recreate_thumbnail"
+    )
+    def test_reuse_encoding(self, recreate_thumbnail) -> None:
+        encoding_video = get_encoding_video(self.videos[1])
+        self.assertTrue(reuse_encoding(encoding_video))
+        recreate_thumbnail.assert_called_once()
+        encoding = EncodingVideo.objects.get(video=self.videos[1])
+        self.addCleanup(os.remove, encoding.source_file.path)
+        self.assertNotEqual(
+            encoding.source_file.path,
+            EncodingVideo.objects.get(video=self.videos[0]).source_file.path,
+        )
+        with open(encoding.source_file.path, "rb") as file:
+            self.assertEqual(file.read(), b"encoded content")
+        self.assertEqual(
+            EncodingFingerprint.objects.get(video=self.videos[1]).fingerprint,
+            EncodingFingerprint.objects.get(video=self.videos[0]).fingerprint,
+        )
+        self.assertFalse(Video.objects.get(id=self.videos[1].id).encoding_in_progress)
+        print(" ---> test_reuse_encoding: OK! --- FingerprintTestCase")
+
+    @patch(
+        "pod.video_encode_transcript.Encoding_video_model."
+        + "Encoding_video_model.recreate_thumbnail"
+    )
+    def test_reuse_encoding_missing_file(self, recreate_thumbnail) -> None:
+        """Encode the video when a file of the encoded video is missing."""
+        source_file = EncodingVideo.objects.get(video=self.videos[0]).source_file.path
+        os.rename(source_file, source_file + ".bak")
+        self.addCleanup(os.rename, source_file + ".bak", source_file)
+        encoding_video = get_encoding_video(self.videos[1])
+        self.assertFalse(reuse_encoding(encoding_video))
+        recreate_thumbnail.assert_not_called()
+        self.assertFalse(EncodingVideo.objects.filter(video=self.videos[1]).exists())
+        self.assertFalse(
+            os.path.exists(os.path.join(encoding_video.output_dir, "360p.mp4"))
+        )
+        print(" ---> test_reuse_encoding_missing_file: OK! --- FingerprintTestCase")
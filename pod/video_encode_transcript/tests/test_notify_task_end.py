@@ -58,6 +58,7 @@ class NotifyTaskEndAuthTests(TestCase):
 
         self.task.refresh_from_db()
         self.assertEqual(self.task.status, "pending")
+        self.assertIsNone(self.task.date_notified)
 
     def test_notify_task_end_rejects_invalid_bearer_token(self):
         """Return 403 and keep task unchanged when the bearer token is invalid."""
@@ -74,6 +75,7 @@ class NotifyTaskEndAuthTests(TestCase):
 
         self.task.refresh_from_db()
         self.assertEqual(self.task.status, "running")
+        self.assertIsNotNone(self.task.date_notified)
 
     @patch("pod.video_encode_transcript.views.send_email_item")
     def test_notify_task_end_sends_alert_on_failed_status(self, mock_send_email_item):
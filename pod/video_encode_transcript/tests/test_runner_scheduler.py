@@ -0,0 +1,167 @@
+"""
+Runner manager scheduler tests for Esup-Pod.
+
+Run with `python manage.py test pod.video_encode_transcript.tests.test_runner_scheduler`
+"""
+
+from unittest.mock import MagicMock, patch
+
+import requests
+from django.contrib.sites.models import Site
+from django.test import TestCase
+
+from pod.video_encode_transcript.models import RunnerManager, Task
+from pod.video_encode_transcript.runner_scheduler import (
+    RunnerManagerScheduler,
+    fetch_task_statuses,
+)
+
+
+def fake_response(status_code: int, task_id: str = "") -> MagicMock:
+    """Return a runner manager response with a status code and a task id."""
+    response = MagicMock(status_code=status_code, content=b"{}")
+    response.json.return_value = {"task_id": task_id, "status": "running"}
+    return response
+
+
+class RunnerManagerSchedulerTests(TestCase):
+    """Validate the runner manager choice, the back off and the batch submission."""
+
+    def setUp(self) -> None:
+        """Create two runner managers of the same priority."""
+        self.site = Site.objects.get(id=1)
+        self.rm1 = RunnerManager.objects.create(
+            name="rm-1", url="https://rm-1.example.com/", token="t1", site=self.site
+        )
+        self.rm2 = RunnerManager.objects.create(
+            name="rm-2",
+            url="https://rm-2.example.com/",
+            token="t2",
+            site=self.site,
+            capacity=2,
+        )
+
+    def test_pick_uses_priority_free_slots_and_latency(self) -> None:
+        """Prefer the free slots, then the latency, inside a priority level."""
+        scheduler = RunnerManagerScheduler([self.rm1, self.rm2])
+        self.assertEqual(scheduler.pick(set()), self.rm2)
+        Task.objects.create(type="encoding", status="running", runner_manager=self.rm2)
+        Task.objects.create(type="encoding", status="pending", runner_manager=self.rm2)
+        scheduler = RunnerManagerScheduler([self.rm1, self.rm2])
+        self.assertEqual(scheduler.free_slots, {self.rm1.id: 1, self.rm2.id: 0})
+        self.assertEqual(scheduler.pick(set()), self.rm1)
+        self.assertEqual(scheduler.pick({self.rm1.id}), self.rm2)
+        self.rm2.priority = 0
+        self.assertEqual(scheduler.pick(set()), self.rm2)
+        print(" --->  test_pick_uses_priority_free_slots_and_latency: OK!")
+
+    @patch("pod.video_encode_transcript.runner_scheduler.requests.post")
+    def test_submit_backs_off_unreachable_runner_manager(self, mock_post) -> None:
+        """Submit the tasks of an unreachable runner manager to the next one."""
+
+        def post(url, **kwargs):
+            if url.startswith("https://rm-2"):
+                raise requests.ConnectionError("unreachable")
+            return fake_response(200, "remote-1")
+
+        mock_post.side_effect = post
+        accepted = RunnerManagerScheduler([self.rm1, self.rm2]).submit(
+            {1: {"task_type": "encoding"}, 2: {"task_type": "encoding"}}
+        )
+        self.assertEqual(sorted(accepted), [1, 2])
+        self.assertEqual({rm for rm, _ in accepted.values()}, {self.rm1})
+        self.rm2.refresh_from_db()
+        self.assertEqual(self.rm2.failure_count, 1)
+        self.assertIsNotNone(self.rm2.unavailable_until)
+        # The backed off runner manager is skipped by the next batches
+        scheduler = RunnerManagerScheduler([self.rm1, self.rm2])
+        self.assertEqual(scheduler.runner_managers, [self.rm1])
+        self.rm1.refresh_from_db()
+        self.assertEqual(self.rm1.failure_count, 0)
+        self.assertGreaterEqual(self.rm1.latency, 0)
+        print(" --->  test_submit_backs_off_unreachable_runner_manager: OK!")
+
+    @patch("pod.video_encode_transcript.runner_scheduler.requests.post")
+    def test_submit_skips_full_runner_manager(self, mock_post) -> None:
+        """Skip a full runner manager for the batch without backing it off."""
+        mock_post.return_value = fake_response(429)
+        accepted = RunnerManagerScheduler([self.rm1, self.rm2]).submit(
+            {1: {"task_type": "encoding"}}
+        )
+        self.assertEqual(accepted, {})
+        self.assertEqual(mock_post.call_count, 2)
+        self.rm1.refresh_from_db()
+        self.assertIsNone(self.rm1.unavailable_until)
+        print(" --->  test_submit_skips_full_runner_manager: OK!")
+
+    @patch("pod.video_encode_transcript.runner_scheduler.requests.Session")
+    def test_fetch_task_statuses_by_runner_manager(self, mock_session) -> None:
+        """Poll the tasks on one connection by runner manager, skipping the others."""
+
+        def get(url, **kwargs):
+            if url.startswith("https://rm-2"):
+                raise requests.ConnectionError("unreachable")
+            return fake_response(200)
+
+        session = mock_session.return_value.__enter__.return_value
+        session.get.side_effect = get
+        tasks = [
+            Task.objects.create(
+                type="encoding", status="running", runner_manager=rm, task_id=task_id
+            )
+            for rm, task_id in [
+                (self.rm1, "a"),
+                (self.rm1, "b"),
+                (self.rm2, "c"),
+                (self.rm2, "d"),
+                (self.rm1, ""),
+            ]
+        ]
+        statuses = fetch_task_statuses(tasks)
+        self.assertEqual(statuses, {tasks[0].id: "running", tasks[1].id: "running"})
+        # One session by runner manager, the unreachable one is left at once
+        self.assertEqual(mock_session.call_count, 2)
+        self.assertEqual(session.get.call_count, 3)
+        self.rm2.refresh_from_db()
+        self.assertEqual(self.rm2.failure_count, 1)
+        # A backed off runner manager is not polled
+        self.assertEqual(fetch_task_statuses(tasks[2:4]), {})
+        print(" --->  test_fetch_task_statuses_by_runner_manager: OK!")
+
+    @patch("pod.video_encode_transcript.runner_scheduler.RUNNER_MANAGER_POLL_TIMEOUT", 45)
+    @patch("pod.video_encode_transcript.runner_scheduler.time")
+    @patch("pod.video_encode_transcript.runner_scheduler.requests.Session")
+    def test_fetch_task_statuses_poll_timeout(self, mock_session, mock_time) -> None:
+        """Leave the tasks of a slow runner manager for the next poll."""
+        clock = [0]
+        mock_time.monotonic.side_effect = lambda: clock[0]
+
+        def get(url, **kwargs):
+            # Each status takes the whole read timeout
+            clock[0] += kwargs["timeout"][1]
+            if url.endswith("b"):
+                raise requests.ReadTimeout("slow")
+            return fake_response(200)
+
+        session = mock_session.return_value.__enter__.return_value
+        session.get.side_effect = get
+        tasks = [
+            Task.objects.create(
+                type="encoding",
+                status="running",
+                runner_manager=self.rm1,
+                task_id=task_id,
+            )
+            for task_id in ["a", "b", "c", "d"]
+        ]
+        statuses = fetch_task_statuses(tasks)
+        self.assertEqual(statuses, {tasks[0].id: "running"})
+        # The last request is cut at the poll timeout
+        self.assertEqual(
+            [call.kwargs["timeout"] for call in session.get.call_args_list],
+            [(5, 30), (5, 15)],
+        )
+        # Not a failure of the runner manager
+        self.rm1.refresh_from_db()
+        self.assertEqual(self.rm1.failure_count, 0)
+        print(" --->  test_fetch_task_statuses_poll_timeout: OK!")
@@ -0,0 +1,148 @@
+"""
+Task queue waiting time estimation tests for Esup-Pod.
+
+Run with `python manage.py test pod.video_encode_transcript.tests.test_task_eta`
+"""
+
+from datetime import timedelta
+from unittest.mock import patch
+
+from django.contrib.auth.models import User
+from django.contrib.sites.models import Site
+from django.core.cache import cache
+from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+
+from pod.video.models import Type, Video
+from pod.video_encode_transcript.models import RunnerManager, Task, VideoStreamInfo
+from pod.video_encode_transcript.task_eta import (
+    get_video_encoding_eta,
+    predict_task_seconds,
+    simulate_task_queue,
+    train_eta_model,
+)
+
+# ggignore-start
+# gitguardian:ignore
+PWD = "azerty1234"  # nosec
+# ggignore-end
+
+
+class TaskEtaTests(TestCase):
+    """Validate the processing time prediction and the queue simulation."""
+
+    fixtures = ["initial_data.json"]
+
+    def setUp(self) -> None:
+        """Create a runner manager and a history of finished encodings."""
+        cache.clear()
+        self.site = Site.objects.get(id=1)
+        self.user = User.objects.create(username="teacher", password=PWD)  # nosem
+        self.runner_manager = RunnerManager.objects.create(
+            name="rm", url="http://rm.test", token="token", site=self.site
+        )
+        now = timezone.now()
+        for index, (duration, elapsed) in enumerate([(600, 300), (1200, 600)]):
+            task = Task.objects.create(
+                video=self.create_video("Encoded %s" % index, duration, 720),
+                type="encoding",
+                status="completed",
+                runner_manager=self.runner_manager,
+            )
+            Task.objects.filter(id=task.id).update(
+                date_start=now - timedelta(seconds=elapsed), date_end=now
+            )
+
+    def create_video(self, title, duration, height=0) -> Video:
+        """Create a video of a duration, with the height of its source if known."""
+        video = Video.objects.create(
+            title=title,
+            owner=self.user,
+            video="%s.mp4" % title,
+            type=Type.objects.get(id=1),
+            duration=duration,
+        )
+        video.sites.add(self.site)
+        if height:
+            VideoStreamInfo.objects.create(video=video, has_video=True, height=height)
+        return video
+
+    def test_task_dates(self) -> None:
+        """Keep the start and end dates of the task status changes."""
+        task = Task.objects.create(type="encoding", status="pending")
+        self.assertIsNone(task.date_start)
+        task.status = "running"
+        task.save()
+        self.assertIsNotNone(task.date_start)
+        task.status = "completed"
+        task.save()
+        self.assertIsNotNone(task.date_end)
+        task.status = "pending"
+        task.save()
+        self.assertIsNone(task.date_start)
+        self.assertIsNone(task.date_end)
+        print(" --->  test_task_dates of TaskEtaTests: OK!")
+
+    def test_predict_task_seconds(self) -> None:
+        """Predict from the most specific history, then from the defaults."""
+        model = train_eta_model()
+        self.assertEqual(model["ratio"]["encoding::hd"], 0.5)
+        task = Task(video=self.create_video("Pending", 3600, 720), type="encoding")
+        self.assertEqual(predict_task_seconds(task, model), 1800)
+        task = Task(video=self.create_video("Unknown", 0), type="encoding")
+        self.assertEqual(predict_task_seconds(task, model), 450)
+        task = Task(type="transcription")
+        self.assertEqual(predict_task_seconds(task, model), 600)
+        print(" --->  test_predict_task_seconds of TaskEtaTests: OK!")
+
+    def test_simulate_task_queue(self) -> None:
+        """Run the pending tasks on the slots freed by the running ones."""
+        self.runner_manager.capacity = 2
+        self.runner_manager.save()
+        now = timezone.now()
+        running = Task.objects.create(
+            video=self.create_video("Running", 1200, 720),
+            type="encoding",
+            status="running",
+        )
+        Task.objects.filter(id=running.id).update(date_start=now - timedelta(minutes=5))
+        first = Task.objects.create(
+            video=self.create_video("First", 600, 720),
+            type="encoding",
+            status="pending",
+            date_added=now - timedelta(minutes=2),
+        )
+        video = self.create_video("Second", 1200, 720)
+        second = Task.objects.create(
+            video=video,
+            type="encoding",
+            status="pending",
+            date_added=now - timedelta(minutes=1),
+        )
+        etas = simulate_task_queue(now)
+        # 600s to encode, 300s already done
+        self.assertEqual(etas[running.id], 300)
+        # on the free slot
+        self.assertEqual(etas[first.id], 300)
+        # on the slot freed by the running task
+        self.assertEqual(etas[second.id], 900)
+        self.assertAlmostEqual(get_video_encoding_eta(video), 900, delta=2)
+        print(" --->  test_simulate_task_queue of TaskEtaTests: OK!")
+
+    @patch("pod.video.views.USE_RUNNER_MANAGER", True)
+    def test_video_queue_view(self) -> None:
+        """Serve the rank and the estimated end of the encoding in JSON."""
+        video = self.create_video("Queued", 600, 720)
+        Task.objects.create(video=video, type="encoding", status="pending")
+        url = reverse("video:video_queue", kwargs={"slug": video.slug})
+        self.client.force_login(User.objects.create(username="other", password=PWD))
+        self.assertEqual(self.client.get(url).status_code, 403)
+        self.client.force_login(self.user)
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual(data["rank"], 1)
+        self.assertEqual(data["total"], 1)
+        self.assertAlmostEqual(data["eta_seconds"], 300, delta=2)
+        print(" --->  test_video_queue_view of TaskEtaTests: OK!")
@@ -14,7 +14,12 @@ from django.utils import timezone
 from pod.video.models import Type, Video
 from pod.video_encode_transcript.models import Task
 from pod.video_encode_transcript.task_queue import (
+    HIGH_PRIORITY,
+    LOW_PRIORITY,
+    get_sorted_pending_tasks,
+    get_task_rank,
     get_video_pending_encoding_queue_info,
+    refresh_pending_task_priorities,
     refresh_pending_task_ranks,
 )
 
@@ -138,3 +143,83 @@ class TaskQueueTests(TestCase):
         self.assertEqual(student_task.rank, 2)
         self.assertEqual(rank, 2)
         self.assertEqual(total, 2)
+
+    def test_task_priority_is_stored_when_pending(self):
+        """Store the owner priority when a task is enqueued."""
+        student_task = Task.objects.create(
+            video=self.student_video,
+            type="encoding",
+            status="pending",
+        )
+        studio_task = Task.objects.create(type="studio", status="pending")
+
+        self.assertEqual(student_task.priority, LOW_PRIORITY)
+        self.assertEqual(studio_task.priority, HIGH_PRIORITY)
+
+        student_task.status = "running"
+        student_task.rank = 1
+        student_task.save(update_fields=["status", "rank"])
+        student_task.refresh_from_db()
+
+        self.assertIsNotNone(student_task.date_start)
+        self.assertIsNone(student_task.rank)
+
+    def test_get_task_rank_and_sorted_pending_tasks(self):
+        """Count the rank on the queue order and slice the sorted pending tasks."""
+        base_time = timezone.now() - timedelta(hours=1)
+        student_task = Task.objects.create(
+            video=self.student_video,
+            type="encoding",
+            status="pending",
+            date_added=base_time,
+        )
+        transcription_task = Task.objects.create(
+            video=self.teacher_video,
+            type="transcription",
+            status="pending",
+            date_added=base_time + timedelta(minutes=5),
+        )
+        teacher_task = Task.objects.create(
+            video=self.teacher_video,
+            type="encoding",
+            status="pending",
+            date_added=base_time + timedelta(minutes=10),
+        )
+        running_task = Task.objects.create(
+            video=self.teacher_video,
+            type="encoding",
+            status="running",
+        )
+
+        self.assertEqual(get_task_rank(transcription_task), 1)
+        self.assertEqual(get_task_rank(teacher_task), 2)
+        self.assertEqual(get_task_rank(student_task), 3)
+        self.assertIsNone(get_task_rank(running_task))
+        self.assertEqual(
+            get_sorted_pending_tasks("encoding"), [teacher_task, student_task]
+        )
+        self.assertEqual(get_sorted_pending_tasks(limit=1), [transcription_task])
+
+    def test_refresh_pending_task_priorities(self):
+        """Backfill the priority of pending tasks and keep it on bulk updates."""
+        student_task = Task.objects.create(
+            video=self.student_video,
+            type="encoding",
+            status="pending",
+        )
+        # A task enqueued before the priority was stored
+        Task.objects.filter(id=student_task.id).update(priority=HIGH_PRIORITY)
+        self.assertEqual(refresh_pending_task_priorities(), 1)
+        student_task.refresh_from_db()
+        self.assertEqual(student_task.priority, LOW_PRIORITY)
+
+        Task.objects.filter(id=student_task.id).update(status="running")
+        Task.objects.filter(id=student_task.id).update(priority=HIGH_PRIORITY, rank=3)
+        # A task set pending again by a bulk update gets its priority
+        Task.objects.filter(id=student_task.id).update(status="pending")
+        student_task.refresh_from_db()
+        self.assertEqual(student_task.priority, LOW_PRIORITY)
+        # A task set non pending by a bulk update loses its rank
+        Task.objects.filter(id=student_task.id).update(status="failed")
+        student_task.refresh_from_db()
+        self.assertIsNone(student_task.rank)
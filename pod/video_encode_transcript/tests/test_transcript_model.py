@@ -0,0 +1,290 @@
+"""
+Transcription model pool, chunked transcription, audio stream and VAD tests for Esup-Pod.
+
+Run with `python manage.py test pod.video_encode_transcript.tests.test_transcript_model`
+"""
+
+import os
+import tempfile
+import io
+from unittest.mock import MagicMock, patch
+
+import numpy as np
+from django.test import SimpleTestCase
+
+from pod.video_encode_transcript.transcript_model import (
+    MODEL_POOL,
+    TranscriptionModelPool,
+    add_window_segments,
+    detect_speech_segments,
+    enable_model_pool,
+    get_decode_command,
+    get_frame_levels,
+    get_model_size,
+    get_speech_segments,
+    main_vosk_transcript,
+    merge_chunk_segments,
+    stream_audio,
+    stream_audio_windows,
+)
+
+
+def word(text: str, start: float) -> dict:
+    """Return a Vosk word result lasting half a second."""
+    return {"word": text, "start": start, "end": start + 0.5, "conf": 1.0}
+
+
+class TranscriptionModelPoolTests(SimpleTestCase):
+    """Validate the reuse and the eviction of the resident transcription models."""
+
+    def test_pool_reuses_and_evicts_models(self) -> None:
+        """Load a model once, then evict the least recently used one."""
+        pool = TranscriptionModelPool(2, 0)
+        loader = MagicMock(side_effect=lambda: object())
+        fr_model, msg = pool.get("VOSK-fr", loader)
+        self.assertIn("loaded", msg)
+        self.assertIs(pool.get("VOSK-fr", loader)[0], fr_model)
+        pool.get("VOSK-en", loader)
+        pool.get("VOSK-fr", loader)
+        _, msg = pool.get("VOSK-de", loader)
+        self.assertEqual(list(pool.models), ["VOSK-fr", "VOSK-de"])
+        self.assertEqual(loader.call_count, 3)
+        self.assertIn("hits 2, misses 3", msg)
+        print(" --->  test_pool_reuses_and_evicts_models: OK!")
+
+    def test_pool_memory_budget(self) -> None:
+        """Keep the size of the models under the budget, always keeping the last one."""
+        megabyte = 1024 * 1024
+        pool = TranscriptionModelPool(3, 10)
+        pool.get("WHISPER-fr", object, 6 * megabyte)
+        pool.get("WHISPER-en", object, 6 * megabyte)
+        self.assertEqual(list(pool.models), ["WHISPER-en"])
+        pool.get("WHISPER-de", object, 20 * megabyte)
+        self.assertEqual(list(pool.models), ["WHISPER-de"])
+        # No pool: the model is loaded for each transcription
+        pool = TranscriptionModelPool(0, 0)
+        pool.get("WHISPER-fr", object)
+        self.assertEqual(pool.models, {})
+        print(" --->  test_pool_memory_budget: OK!")
+
+    @patch(
+        "pod.video_encode_transcript.transcript_model.TRANSCRIPTION_MODEL_POOL_SIZE", 2
+    )
+    def test_pool_enabled_in_worker(self) -> None:
+        """Keep the models loaded only once enabled by a transcripting worker."""
+        self.assertEqual(MODEL_POOL.max_models, 0)
+        self.addCleanup(setattr, MODEL_POOL, "max_models", 0)
+        enable_model_pool()
+        self.assertEqual(MODEL_POOL.max_models, 2)
+        print(" --->  test_pool_enabled_in_worker: OK!")
+
+    def test_get_model_size(self) -> None:
+        """Sum the size of the files of a model directory."""
+        with tempfile.TemporaryDirectory() as model_dir:
+            os.mkdir(os.path.join(model_dir, "am"))
+            for name, size in [("conf", 10), (os.path.join("am", "final.mdl"), 20)]:
+                with open(os.path.join(model_dir, name), "wb") as model_file:
+                    model_file.write(b"0" * size)
+            self.assertEqual(get_model_size(model_dir), 30)
+            self.assertEqual(get_model_size(os.path.join(model_dir, "conf")), 10)
+        self.assertEqual(get_model_size("/nonexistent/model"), 0)
+        print(" --->  test_get_model_size: OK!")
+
+
+class VoskChunkTranscriptTests(SimpleTestCase):
+    """Validate the merge of the overlapping chunks transcribed at the same time."""
+
+    def test_merge_chunk_segments(self) -> None:
+        """Keep the words of the overlap from one chunk, split in its middle."""
+        chunks = [
+            (0, [[word("hello", 1)], [word("good", 9), word("morn", 10.6)]]),
+            (10, [[word("ing", 10.2), word("morning", 11.2)], [word("all", 13)]]),
+        ]
+        merged = merge_chunk_segments(chunks, 10, 2)
+        self.assertEqual(
+            [[w["word"] for w in words] for words in merged],
+            [["hello"], ["good", "morn"], ["morning"], ["all"]],
+        )
+        self.assertEqual(merged[2][0]["start"], 11.2)
+        print(" --->  test_merge_chunk_segments: OK!")
+
+    @patch("pod.video_encode_transcript.transcript_model.TRANSCRIPTION_VOSK_WORKERS", 2)
+    @patch(
+        "pod.video_encode_transcript.transcript_model.TRANSCRIPTION_AUDIO_SPLIT_TIME", 10
+    )
+    @patch("pod.video_encode_transcript.transcript_model.transcribe_vosk_chunk")
+    def test_parallel_vosk_transcript(self, mock_chunk) -> None:
+        """Transcribe the chunks with the overlap and build ordered captions."""
+        mock_chunk.side_effect = lambda path, model, start, chunk_duration: [
+            [word("chunk%s" % start, start + 5)]
+        ]
+        msg, webvtt, all_text = main_vosk_transcript("audio.mp3", 25, "model")
+        self.assertEqual(
+            sorted(call.args[2] for call in mock_chunk.call_args_list), [0, 10, 20]
+        )
+        self.assertEqual(mock_chunk.call_args.kwargs["chunk_duration"], 12)
+        self.assertEqual(
+            [caption.text for caption in webvtt.captions],
+            ["chunk0", "chunk10", "chunk20"],
+        )
+        self.assertEqual(webvtt.captions[1].start, "00:00:15.000")
+        self.assertIn("3 chunks with 2 workers", msg)
+        print(" --->  test_parallel_vosk_transcript: OK!")
+
+
+class AudioStreamTests(SimpleTestCase):
+    """Validate the streamed decoding of the audio to transcribe."""
+
+    def fake_process(self, data: bytes, returncode: int = 0) -> MagicMock:
+        """Return an ffmpeg process writing data on its standard output."""
+        process = MagicMock(stdout=io.BytesIO(data), stderr=io.BytesIO(b"error"))
+        process.wait.return_value = returncode
+        process.poll.return_value = returncode
+        return process
+
+    @patch("pod.video_encode_transcript.transcript_model.TRANSCRIPTION_NORMALIZE", True)
+    def test_get_decode_command(self) -> None:
+        """Seek, resample and normalize the audio to raw PCM on stdout."""
+        command = get_decode_command("audio.mp3", 16000, 30, 12)
+        self.assertEqual(command[command.index("-ss") + 1], "30")
+        self.assertEqual(command[command.index("-t") + 1], "12")
+        self.assertLess(command.index("-t"), command.index("-i"))
+        self.assertEqual(command[command.index("-ar") + 1], "16000")
+        self.assertTrue(command[command.index("-af") + 1].startswith("loudnorm"))
+        self.assertEqual(command[-3:], ["-f", "s16le", "-"])
+        self.assertNotIn("-ss", get_decode_command("audio.mp3", 16000))
+        print(" --->  test_get_decode_command: OK!")
+
+    @patch("pod.video_encode_transcript.transcript_model.subprocess.Popen")
+    def test_stream_audio(self, mock_popen) -> None:
+        """Yield bounded buffers, then raise if ffmpeg failed."""
+        mock_popen.return_value = self.fake_process(b"0123456789")
+        self.assertEqual(
+            list(stream_audio("audio.mp3", 16000, 4)), [b"0123", b"4567", b"89"]
+        )
+        mock_popen.return_value = self.fake_process(b"0123", 1)
+        with self.assertRaises(RuntimeError):
+            list(stream_audio("audio.mp3", 16000, 4))
+        # A stopped reading kills the decoder
+        process = self.fake_process(b"0123456789")
+        process.poll.return_value = None
+        mock_popen.return_value = process
+        audio = stream_audio("audio.mp3", 16000, 4)
+        next(audio)
+        audio.close()
+        process.kill.assert_called_once()
+        print(" --->  test_stream_audio: OK!")
+
+    @patch("pod.video_encode_transcript.transcript_model.subprocess.Popen")
+    def test_stream_audio_windows(self, mock_popen) -> None:
+        """Convert each window of samples to float32."""
+        samples = np.array([0, 16384, -32768, 8192, 0], dtype=np.int16)
+        mock_popen.return_value = self.fake_process(samples.tobytes())
+        windows = list(stream_audio_windows("audio.mp3", 2, 1))
+        self.assertEqual([len(window) for window in windows], [2, 2, 1])
+        self.assertEqual(windows[0].dtype, np.float32)
+        self.assertEqual(list(windows[1]), [-1.0, 0.25])
+        # Each window but the last one is followed by the start of the next one
+        mock_popen.return_value = self.fake_process(samples.tobytes())
+        windows = list(stream_audio_windows("audio.mp3", 2, 1, overlap=0.5))
+        self.assertEqual([len(window) for window in windows], [3, 3, 1])
+        self.assertEqual(list(windows[0]), [0.0, 0.5, -1.0])
+        print(" --->  test_stream_audio_windows: OK!")
+
+    def test_add_window_segments(self) -> None:
+        """Offset the segments of a Whisper window and number them."""
+        transcription = {"text": "", "segments": [], "language": "fr"}
+        window = {
+            "text": " Bonjour",
+            "segments": [
+                {
+                    "id": 0,
+                    "start": 1.0,
+                    "end": 2.0,
+                    "text": " Bonjour",
+                    "words": [{"word": " Bonjour", "start": 1.0, "end": 2.0}],
+                }
+            ],
+        }
+        add_window_segments(transcription, window, 0)
+        add_window_segments(transcription, window, 30)
+        segments = transcription["segments"]
+        self.assertEqual([segment["id"] for segment in segments], [0, 1])
+        self.assertEqual(segments[1]["start"], 31.0)
+        self.assertEqual(segments[1]["words"][0]["end"], 32.0)
+        self.assertEqual(window["segments"][0]["start"], 1.0)
+        self.assertEqual(transcription["text"], " Bonjour Bonjour")
+        # The words of the overlap are kept from one window only
+        transcription = {"text": "", "segments": [], "language": "fr"}
+        window["segments"][0]["words"].append({"word": " toi", "start": 9.5, "end": 10})
+        text = add_window_segments(transcription, window, 0, float("-inf"), 9)
+        self.assertEqual(text, " Bonjour")
+        self.assertEqual(transcription["segments"][0]["end"], 2.0)
+        self.assertEqual(add_window_segments(transcription, window, 0, 3, 9), "")
+        self.assertEqual(len(transcription["segments"]), 1)
+        print(" --->  test_add_window_segments: OK!")
+
+
+class VoiceActivityDetectionTests(SimpleTestCase):
+    """Validate the detection of the speech segments and their transcription."""
+
+    def test_get_frame_levels(self) -> None:
+        """Measure the level of each frame, the last one being completed."""
+        samples = np.array([32767, -32767, 0, 0, 328], dtype=np.int16)
+        levels = get_frame_levels(samples.tobytes(), 2)
+        self.assertEqual(len(levels), 3)
+        self.assertAlmostEqual(levels[0], 0, delta=0.01)
+        self.assertLess(levels[1], -100)
+        self.assertAlmostEqual(levels[2], -43, delta=0.1)
+        print(" --->  test_get_frame_levels: OK!")
+
+    @patch(
+        "pod.video_encode_transcript.transcript_model.TRANSCRIPTION_VAD_MIN_SILENCE", 2
+    )
+    @patch("pod.video_encode_transcript.transcript_model.TRANSCRIPTION_VAD_PADDING", 0.5)
+    def test_get_speech_segments(self) -> None:
+        """Join the speech split by short silences and pad the segments."""
+        # frames of 1 s: speech, short silence, speech, long silence, speech
+        levels = np.array([-80, -20, -80, -20, -80, -80, -80, -20, -80], float)
+        self.assertEqual(get_speech_segments(levels, 1), [(0.5, 4.0), (6.5, 2.0)])
+        self.assertEqual(get_speech_segments(np.full(4, -80.0), 1), [])
+        self.assertEqual(get_speech_segments(np.full(4, -20.0), 1), [(0, 4)])
+        print(" --->  test_get_speech_segments: OK!")
+
+    @patch("pod.video_encode_transcript.transcript_model.stream_audio")
+    def test_detect_speech_segments(self, mock_stream) -> None:
+        """Report the ratio of the audio skipped as silence."""
+        second = np.zeros(16000, np.int16)
+        speech = np.full(16000, 8192, np.int16)
+        mock_stream.return_value = [
+            second.tobytes(),
+            speech.tobytes(),
+            second.tobytes(),
+            second.tobytes(),
+            second.tobytes(),
+        ]
+        segments, msg = detect_speech_segments("audio.mp3", 5)
+        self.assertEqual(segments, [(0.5, 2.0)])
+        self.assertIn("1 speech segments, 60.0% of the audio skipped", msg)
+        print(" --->  test_detect_speech_segments: OK!")
+
+    @patch("pod.video_encode_transcript.transcript_model.transcribe_vosk_chunk")
+    def test_vosk_speech_transcript(self, mock_chunk) -> None:
+        """Transcribe each speech segment, keeping the original timeline."""
+        mock_chunk.side_effect = lambda path, model, start, chunk_duration: [
+            [word("speech%s" % start, start + 1)],
+            [],
+        ]
+        msg, webvtt, all_text = main_vosk_transcript(
+            "audio.mp3", 600, "model", [(12.5, 4), (300, 10)]
+        )
+        self.assertEqual(
+            [call.args[2:] for call in mock_chunk.call_args_list], [(12.5, 4), (300, 10)]
+        )
+        self.assertEqual(
+            [caption.start for caption in webvtt.captions],
+            ["00:00:13.500", "00:05:01.000"],
+        )
+        self.assertEqual(all_text, "speech12.5 speech300 ")
+        self.assertIn("2 speech segments", msg)
+        print(" --->  test_vosk_speech_transcript: OK!")
@@ -0,0 +1,116 @@
+"""
+Unit tests for the cache of the transcriptions of identical audios.
+
+Run with `python manage.py test pod.video_encode_transcript.tests.test_transcription_cache`
+"""
+
+from datetime import timedelta
+from io import StringIO
+from unittest.mock import patch
+
+from django.contrib.auth.models import User
+from django.core.files.base import ContentFile
+from django.core.management import call_command
+from django.test import TestCase
+from django.utils import timezone
+from webvtt import Caption, WebVTT
+
+from pod.video.models import Type, Video
+
+from ..fingerprint import get_transcription_fingerprint
+from ..models import EncodingAudio, TranscriptionCache
+from ..transcript import cache_transcription, main_threaded_transcript, start_transcript
+
+
+@patch("pod.video_encode_transcript.fingerprint.USE_TRANSCRIPTION_CACHE", True)
+class TranscriptionCacheTestCase(TestCase):
+    """TestCase for the transcription cache."""
+
+    fixtures = [
+        "initial_data.json",
+    ]
+
+    def setUp(self) -> None:
+        """Set up two videos with the same mp3 content."""
+        user = User.objects.create(username="pod", password="pod1234pod")
+        self.videos = []
+        for i in range(2):
+            video = Video.objects.create(
+                title="Video%s" % i,
+                owner=user,
+                video="test.mp4",
+                type=Type.objects.get(id=1),
+                transcript="fr",
+            )
+            audio = EncodingAudio.objects.create(video=video)
+            audio.source_file.save("audio.mp3", ContentFile(b"same audio content"))
+            self.addCleanup(audio.source_file.delete, save=False)
+            self.videos.append(video)
+        self.webvtt = WebVTT()
+        self.webvtt.captions.append(Caption("00:00:01.000", "00:00:02.000", "Bonjour"))
+
+    def test_transcription_fingerprint(self) -> None:
+        """Get the same fingerprint for the same audio, model and language."""
+        fingerprint = get_transcription_fingerprint(self.videos[0], "fr")
+        self.assertEqual(len(fingerprint), 64)
+        self.assertEqual(get_transcription_fingerprint(self.videos[1], "fr"), fingerprint)
+        self.assertNotEqual(
+            get_transcription_fingerprint(self.videos[0], "en"), fingerprint
+        )
+        with patch(
+            "pod.video_encode_transcript.fingerprint.USE_TRANSCRIPTION_CACHE", False
+        ):
+            self.assertIsNone(get_transcription_fingerprint(self.videos[0], "fr"))
+        print(" --->  test_transcription_fingerprint of TranscriptionCacheTestCase: OK!")
+
+    @patch("pod.video_encode_transcript.transcript.get_transcription_fingerprint")
+    @patch("pod.video_encode_transcript.transcript.threading.Thread")
+    def test_start_transcript_in_thread(self, mock_thread, mock_fingerprint) -> None:
+        """Look up the cache in the transcription thread, not in the request."""
+        start_transcript(self.videos[1].id)
+        mock_fingerprint.assert_not_called()
+        self.assertEqual(mock_thread.call_args.kwargs["target"], main_threaded_transcript)
+        mock_thread.return_value.start.assert_called_once()
+        print(" --->  test_start_transcript_in_thread of TranscriptionCacheTestCase: OK!")
+
+    @patch("pod.video_encode_transcript.transcript.TRANSCRIPTION_TYPE", "WHISPER")
+    @patch(
+        "pod.video_encode_transcript.transcript.TRANSCRIPTION_MODEL_PARAM",
+        {"WHISPER": {"fr": {"model": "small"}}},
+    )
+    @patch("pod.video_encode_transcript.transcript.start_transcripting")
+    @patch("pod.video_encode_transcript.transcript.save_vtt")
+    def test_reuse_cached_transcription(self, mock_save_vtt, mock_transcript) -> None:
+        """Save the cached WebVTT of the same audio instead of transcribing it."""
+        mock_save_vtt.return_value = ""
+        mock_transcript.return_value = ("", WebVTT())
+        start_transcript(self.videos[1].id, threaded=False)
+        mock_transcript.assert_called_once()
+        self.assertIn(
+            "store transcription", cache_transcription(self.videos[0], self.webvtt)
+        )
+        start_transcript(self.videos[1].id, threaded=False)
+        mock_transcript.assert_called_once()
+        video, webvtt = mock_save_vtt.call_args.args
+        self.assertEqual(video, self.videos[1])
+        self.assertEqual([caption.text for caption in webvtt.captions], ["Bonjour"])
+        self.assertEqual(TranscriptionCache.objects.get().hit_count, 1)
+        print(" --->  test_reuse_cached_transcription of TranscriptionCacheTestCase: OK!")
+
+    def test_transcription_cache_command(self) -> None:
+        """Report the cache size and evict the results not used for a while."""
+        cache_transcription(self.videos[0], self.webvtt)
+        self.assertEqual(cache_transcription(self.videos[1], WebVTT()), "")
+        out = StringIO()
+        call_command("transcription_cache", stdout=out)
+        self.assertIn("1 results", out.getvalue())
+        TranscriptionCache.objects.update(date_used=timezone.now() - timedelta(days=10))
+        out = StringIO()
+        call_command("transcription_cache", "--older-than", "30", stdout=out)
+        self.assertIn("0 results not used for 30 days evicted", out.getvalue())
+        call_command("transcription_cache", "--older-than", "5", stdout=out)
+        self.assertIn("1 results not used for 5 days evicted", out.getvalue())
+        self.assertFalse(TranscriptionCache.objects.exists())
+        print(
+            " --->  test_transcription_cache_command of TranscriptionCacheTestCase: OK!"
+        )
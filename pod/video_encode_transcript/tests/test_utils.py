@@ -4,9 +4,12 @@ Unit tests for Esup-Pod video encoding utilities.
 Run with `python manage.py test pod.video_encode_transcript.tests.test_utils`
 """
 
+import os
+import tempfile
 import unittest
+from unittest.mock import patch
 
-from ..encoding_utils import get_dressing_position_value, sec_to_timestamp
+from ..encoding_utils import get_dressing_position_value, probe_file, sec_to_timestamp
 
 
 class EncodingUtilitiesTests(unittest.TestCase):
@@ -33,3 +36,26 @@ class EncodingUtilitiesTests(unittest.TestCase):
         self.assertEqual(sec_to_timestamp(-1), "00:00:00.000")
         self.assertEqual(sec_to_timestamp(60.000), "00:01:00.000")
         print(" ---> sec_to_timestamp: OK! --- EncodginUtilsTest")
+
+    def test_probe_file(self) -> None:
+        """Probe a file once while its size and modification time are unchanged."""
+        with tempfile.NamedTemporaryFile(suffix=".mp4", delete=False) as file:
+            file.write(b"video")
+        self.addCleanup(os.remove, file.name)
+        info = {"format": {"duration": "10.0"}, "streams": []}
+        with patch(
+            "pod.video_encode_transcript.encoding_utils.get_info_from_video",
+            return_value=(info, ""),
+        ) as get_info_from_video:
+            self.assertEqual(probe_file(file.name)[0], info)
+            self.assertEqual(probe_file(file.name)[0], info)
+            self.assertEqual(get_info_from_video.call_count, 1)
+            # Another selection of streams is another probe
+            probe_file(file.name, "-select_streams v:0 ")
+            self.assertEqual(get_info_from_video.call_count, 2)
+            # The file changed
+            with open(file.name, "ab") as video_file:
+                video_file.write(b" changed")
+            probe_file(file.name)
+            self.assertEqual(get_info_from_video.call_count, 3)
+        print(" ---> probe_file: OK! --- EncodginUtilsTest")
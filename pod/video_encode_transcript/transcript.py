@@ -34,6 +34,11 @@ import time
 from tempfile import NamedTemporaryFile
 
 from .encoding_utils import sec_to_timestamp
+from .fingerprint import (
+    get_cached_transcription,
+    get_transcription_fingerprint,
+    save_cached_transcription,
+)
 
 if getattr(settings, "USE_PODFILE", False):
     __FILEPICKER__ = True
@@ -107,13 +112,16 @@ def start_transcript(video_id, threaded=True) -> None:
     Call to start transcript main function.
 
     Will launch transcript mode depending on configuration.
+    The transcription cache is looked up in the thread or task, not in the request.
     """
     if USE_RUNNER_MANAGER:
         log.info("Start transcription, with runner manager, for id: %s" % video_id)
-        # Load module here to prevent circular import
-        from .runner_manager import transcript_video
-
-        transcript_video(video_id)
+        if threaded:
+            t = threading.Thread(target=main_runner_manager_transcript, args=[video_id])
+            t.daemon = True
+            t.start()
+        else:
+            main_runner_manager_transcript(video_id)
     else:
         log.info("Start transcription, without runner manager, for id: %s" % video_id)
         if threaded:
@@ -128,12 +136,53 @@ def start_transcript(video_id, threaded=True) -> None:
             main_threaded_transcript(video_id)
 
 
+def main_runner_manager_transcript(video_id) -> None:
+    """Send the video to the runner manager, if its transcription is not cached."""
+    if reuse_transcription(video_id):
+        return
+    # Load module here to prevent circular import
+    from .runner_manager import transcript_video
+
+    transcript_video(video_id)
+
+
+def reuse_transcription(video_id) -> bool:
+    """Save the cached transcription of the same audio and model, if any."""
+    video = Video.objects.get(id=video_id)
+    fingerprint = get_transcription_fingerprint(
+        video, resolve_transcription_language(video)
+    )
+    if fingerprint is None:
+        return False
+    webvtt = get_cached_transcription(fingerprint)
+    if webvtt is None:
+        return False
+    log.info("Reuse the cached transcription for id: %s" % video_id)
+    msg = "\nREUSE CACHED TRANSCRIPTION: %s" % fingerprint
+    save_vtt_and_notify(video, msg, webvtt, cache=False)
+    return True
+
+
+def cache_transcription(video: Video, webvtt: WebVTT) -> str:
+    """Store the transcription of a video for its audio and model fingerprint."""
+    if not webvtt.captions:
+        return ""
+    lang = resolve_transcription_language(video)
+    fingerprint = get_transcription_fingerprint(video, lang)
+    if fingerprint is None:
+        return ""
+    save_cached_transcription(fingerprint, lang, webvtt)
+    return "\nstore transcription in cache: %s" % fingerprint
+
+
 def main_threaded_transcript(video_to_encode_id) -> None:
     """
     Transcript main function.
 
     Will check all configuration and file and launch transcript.
     """
+    if reuse_transcription(video_to_encode_id):
+        return
     change_encoding_step(video_to_encode_id, 5, "transcripting audio")
 
     video_to_encode = Video.objects.get(id=video_to_encode_id)
@@ -171,8 +220,10 @@ def main_threaded_transcript(video_to_encode_id) -> None:
     add_encoding_log(video_to_encode.id, msg)
 
 
-def save_vtt_and_notify(video_to_encode, msg, webvtt) -> None:
+def save_vtt_and_notify(video_to_encode, msg, webvtt, cache=True) -> None:
     """Call save vtt file function and notify by mail at the end."""
+    if cache:
+        msg += cache_transcription(video_to_encode, webvtt)
     msg += save_vtt(video_to_encode, webvtt)
     change_encoding_step(video_to_encode.id, 0, "done")
     video_to_encode.encoding_in_progress = False
@@ -7,10 +7,12 @@ import datetime as dt
 import json
 import logging
 import os
-import shlex
 import subprocess
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from datetime import timedelta
-from shlex import quote
+from functools import partial
 from timeit import default_timer as timer
 
 import numpy as np
@@ -22,9 +24,11 @@ try:
 except ImportError:
     from .. import settings as settings_local
 
+from .encoding_settings import FFMPEG_CMD
 from .encoding_utils import sec_to_timestamp
 
 DEBUG = getattr(settings_local, "DEBUG", False)
+FFMPEG_CMD = getattr(settings_local, "FFMPEG_CMD", FFMPEG_CMD)
 
 TRANSCRIPTION_MODEL_PARAM = getattr(settings_local, "TRANSCRIPTION_MODEL_PARAM", False)
 USE_TRANSCRIPTION = getattr(settings_local, "USE_TRANSCRIPTION", False)
@@ -44,6 +48,12 @@ TRANSCRIPTION_NORMALIZE_TARGET_LEVEL = getattr(
 TRANSCRIPTION_AUDIO_SPLIT_TIME = getattr(
     settings_local, "TRANSCRIPTION_AUDIO_SPLIT_TIME", 600
 )  # 10min
+# time in sec added to the end of each chunk or window transcribed
+TRANSCRIPTION_AUDIO_SPLIT_OVERLAP = getattr(
+    settings_local, "TRANSCRIPTION_AUDIO_SPLIT_OVERLAP", 2
+)
+# number of chunks transcribed at the same time by Vosk, 1 to transcribe them in turn
+TRANSCRIPTION_VOSK_WORKERS = getattr(settings_local, "TRANSCRIPTION_VOSK_WORKERS", 1)
 # time in sec for phrase length
 TRANSCRIPTION_STT_SENTENCE_MAX_LENGTH = getattr(
     settings_local, "TRANSCRIPTION_STT_SENTENCE_MAX_LENGTH", 2
@@ -51,30 +61,177 @@ TRANSCRIPTION_STT_SENTENCE_MAX_LENGTH = getattr(
 TRANSCRIPTION_STT_SENTENCE_BLANK_SPLIT_TIME = getattr(
     settings_local, "TRANSCRIPTION_STT_SENTENCE_BLANK_SPLIT_TIME", 0.5
 )
+# Number of models kept loaded by each transcripting worker process,
+# 0 to load them for each task
+TRANSCRIPTION_MODEL_POOL_SIZE = getattr(
+    settings_local, "TRANSCRIPTION_MODEL_POOL_SIZE", 2
+)
+# Size in MB of the model files kept loaded by each worker process, 0 for no limit
+TRANSCRIPTION_MODEL_MEMORY_BUDGET = getattr(
+    settings_local, "TRANSCRIPTION_MODEL_MEMORY_BUDGET", 0
+)
+TRANSCRIPTION_MODEL_PRELOAD = getattr(
+    settings_local, "TRANSCRIPTION_MODEL_PRELOAD", False
+)
+# Transcribe only the speech segments detected from the audio level
+TRANSCRIPTION_VAD = getattr(settings_local, "TRANSCRIPTION_VAD", False)
+# level in dBFS above which a frame contains speech
+TRANSCRIPTION_VAD_THRESHOLD = getattr(settings_local, "TRANSCRIPTION_VAD_THRESHOLD", -45)
+# time in sec of the shortest silence skipped
+TRANSCRIPTION_VAD_MIN_SILENCE = getattr(
+    settings_local, "TRANSCRIPTION_VAD_MIN_SILENCE", 2
+)
+# time in sec kept before and after each speech segment
+TRANSCRIPTION_VAD_PADDING = getattr(settings_local, "TRANSCRIPTION_VAD_PADDING", 0.5)
+# time in sec of the frames whose level is measured
+VAD_FRAME_DURATION = 0.02
 log = logging.getLogger(__name__)
 
 
+class TranscriptionModelPool:
+    """Least recently used transcription models kept loaded in a worker process.
+
+    The oldest models are evicted to keep at most `max_models` models, and
+    the size of their files under `memory_budget` MB (0 for no limit).
+    The loaded model is always kept, even when it is bigger than the budget.
+    """
+
+    def __init__(self, max_models: int, memory_budget: int) -> None:
+        """Initialize an empty pool."""
+        self.max_models = max_models
+        self.memory_budget = memory_budget * 1024 * 1024
+        self.models = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+    def get(self, key: str, loader, size: int = 0) -> tuple:
+        """Return the model of a key, loaded by `loader` if needed, and a log message."""
+        with self.lock:
+            if key in self.models:
+                self.models.move_to_end(key)
+                self.hits += 1
+                return self.models[key][0], "\nModel %s reused (hits %s, misses %s)." % (
+                    key,
+                    self.hits,
+                    self.misses,
+                )
+            self.misses += 1
+            # Free the memory of the evicted models before loading the new one
+            self.evict(size)
+            load_start = timer()
+            model = loader()
+            load_time = timer() - load_start
+            if self.max_models > 0:
+                self.models[key] = (model, size)
+            return model, "\nModel %s loaded in %0.3fs (hits %s, misses %s)." % (
+                key,
+                load_time,
+                self.hits,
+                self.misses,
+            )
+
+    def get_size(self) -> int:
+        """Return the size in bytes of the models of the pool."""
+        return sum(size for _, size in self.models.values())
+
+    def evict(self, size: int) -> None:
+        """Evict the oldest models to make room for a new model of a size."""
+        while self.models and (
+            len(self.models) >= self.max_models
+            or (self.memory_budget and self.get_size() + size > self.memory_budget)
+        ):
+            key, _ = self.models.popitem(last=False)
+            log.info("Transcription model %s evicted from the pool", key)
+
+
+# Disabled until enabled in a transcripting worker process (see enable_model_pool)
+MODEL_POOL = TranscriptionModelPool(0, TRANSCRIPTION_MODEL_MEMORY_BUDGET)
+
+
+def enable_model_pool():
+    """Keep the models loaded between the tasks of a transcripting worker process.
+
+    The pool is not used elsewhere: the transcriptions of the web processes
+    run in threads, and the models would stay loaded for the life of the process.
+    """
+    MODEL_POOL.max_models = TRANSCRIPTION_MODEL_POOL_SIZE
+
+
+def get_model_size(path: str) -> int:
+    """Return the size in bytes of the files of a model, 0 if not found."""
+    if os.path.isfile(path):
+        return os.path.getsize(path)
+    size = 0
+    for root, _, files in os.walk(path):
+        size += sum(os.path.getsize(os.path.join(root, name)) for name in files)
+    return size
+
+
+def get_model_path(model_param: dict) -> str:
+    """Return the path of the files of a model, from its parameters."""
+    model = model_param["model"]
+    if TRANSCRIPTION_TYPE == "WHISPER" and not os.path.exists(model):
+        # Whisper models are given by name and downloaded in the download root
+        return os.path.join(model_param.get("download_root") or "", "%s.pt" % model)
+    return model
+
+
+def load_model(lang):
+    """Get the model of a language from the pool of the worker, with a log message."""
+    model_param = TRANSCRIPTION_MODEL_PARAM[TRANSCRIPTION_TYPE][lang]
+    if TRANSCRIPTION_TYPE == "WHISPER":
+        loader = partial(
+            whisper.load_model,
+            model_param["model"],
+            download_root=model_param["download_root"],
+        )
+    else:
+        loader = partial(Model, model_param["model"])
+    return MODEL_POOL.get(
+        "%s-%s" % (TRANSCRIPTION_TYPE, lang),
+        loader,
+        get_model_size(get_model_path(model_param)),
+    )
+
+
 def get_model(lang):
     """Get model for Whisper or Vosk software to transcript audio."""
-    transript_model = Model(TRANSCRIPTION_MODEL_PARAM[TRANSCRIPTION_TYPE][lang]["model"])
+    transript_model, _ = load_model(lang)
     return transript_model
 
 
+def preload_models():
+    """Load the models of the configured languages, in the limits of the pool."""
+    if not USE_TRANSCRIPTION or not TRANSCRIPTION_MODEL_PRELOAD:
+        return
+    languages = list(TRANSCRIPTION_MODEL_PARAM.get(TRANSCRIPTION_TYPE, {}))
+    for lang in languages[: max(MODEL_POOL.max_models, 0)]:
+        _, msg = load_model(lang)
+        log.info(msg.strip())
+
+
 def start_transcripting(mp3filepath, duration, lang):
     """
     Start direct transcription.
 
-    Normalize the audio if set, get the model according to the lang and start transcript.
+    Get the model according to the lang and start transcript, the audio being
+    decoded, and normalized if set, while it is transcribed.
     """
-    if TRANSCRIPTION_NORMALIZE:
-        mp3filepath = normalize_mp3(mp3filepath)
+    speech_segments, vad_msg = None, ""
+    if TRANSCRIPTION_VAD:
+        speech_segments, vad_msg = detect_speech_segments(mp3filepath, duration)
     if TRANSCRIPTION_TYPE == "WHISPER":
-        msg, webvtt, all_text = main_whisper_transcript(mp3filepath, duration, lang)
+        msg, webvtt, all_text = main_whisper_transcript(
+            mp3filepath, duration, lang, speech_segments
+        )
     else:
-        transript_model = get_model(lang)
+        transript_model, model_msg = load_model(lang)
         msg, webvtt, all_text = start_main_transcript(
-            mp3filepath, duration, transript_model
+            mp3filepath, duration, transript_model, speech_segments
         )
+        msg = model_msg + msg
+    msg = vad_msg + msg
     if DEBUG:
         print(msg)
         print(webvtt)
@@ -83,100 +240,157 @@ def start_transcripting(mp3filepath, duration, lang):
     return msg, webvtt
 
 
-def start_main_transcript(mp3filepath, duration, transript_model):
+def start_main_transcript(mp3filepath, duration, transript_model, speech_segments=None):
     """Call transcription depending software type."""
     if TRANSCRIPTION_TYPE == "VOSK":
         msg, webvtt, all_text = main_vosk_transcript(
-            mp3filepath, duration, transript_model
+            mp3filepath, duration, transript_model, speech_segments
         )
     return msg, webvtt, all_text
 
 
-def convert_samplerate(audio_path, desired_sample_rate, trim_start, duration):
-    """Convert audio to subaudio and add good sample rate."""
-    sox_cmd = "sox {} --type raw --bits 16 --channels 1 --rate {} ".format(
-        quote(audio_path), desired_sample_rate
-    )
-    sox_cmd += "--encoding signed-integer --endian little --compression 0.0 "
-    sox_cmd += "--no-dither - trim {} {}".format(trim_start, duration)
+def get_decode_command(audio_path, sample_rate, start_trim=0, duration=None):
+    """Return the ffmpeg command decoding an audio to raw 16 bit mono PCM on stdout.
 
-    try:
-        output = subprocess.check_output(shlex.split(sox_cmd), stderr=subprocess.PIPE)
+    The loudness is normalized on the fly if set.
+    """
+    command = [FFMPEG_CMD, "-hide_banner", "-nostdin", "-loglevel", "error"]
+    if start_trim:
+        command += ["-ss", str(start_trim)]
+    if duration:
+        command += ["-t", str(duration)]
+    command += ["-i", audio_path, "-vn", "-ac", "1", "-ar", str(sample_rate)]
+    if TRANSCRIPTION_NORMALIZE:
+        command += ["-af", "loudnorm=I=%s" % TRANSCRIPTION_NORMALIZE_TARGET_LEVEL]
+    command += ["-acodec", "pcm_s16le", "-f", "s16le", "-"]
+    return command
 
-    except subprocess.CalledProcessError as e:
-        raise RuntimeError("SoX returned non-zero status: {}".format(e.stderr))
-    except OSError as e:
-        raise OSError(
-            e.errno,
-            "SoX not found, use {}hz files or install it: {}".format(
-                desired_sample_rate, e.strerror
-            ),
-        )
 
-    if TRANSCRIPTION_TYPE == "WHISPER":
-        return np.frombuffer(output, np.int16).flatten().astype(np.float32) / 32768.0
-    else:
-        return np.frombuffer(output, np.int16)
-
-
-def normalize_mp3(mp3filepath):
-    """Normalize the audio to good format and sound level."""
-    filename, file_extension = os.path.splitext(mp3filepath)
-    mp3normfile = "{}{}{}".format(filename, "_norm", file_extension)
-    normalize_cmd = "ffmpeg-normalize {} ".format(quote(mp3filepath))
-    normalize_cmd += "-c:a libmp3lame -b:a 192k --normalization-type ebu "
-    # normalize_cmd += \
-    # '--loudness-range-target 7.0 --true-peak 0.0 --offset 0.0 '
-    normalize_cmd += "--target-level {} -f -o {}".format(
-        TRANSCRIPTION_NORMALIZE_TARGET_LEVEL, quote(mp3normfile)
-    )
-    if DEBUG:
-        print(normalize_cmd)
+def stream_audio(audio_path, sample_rate, buffer_size, start_trim=0, duration=None):
+    """Yield the raw 16 bit mono PCM of an audio by buffers of buffer_size bytes.
+
+    The audio is decoded by ffmpeg while it is read, so the memory used does
+    not depend on the length of the audio.
+    """
     try:
-        subprocess.check_output(shlex.split(normalize_cmd), stderr=subprocess.PIPE)
-        return mp3normfile
-    except subprocess.CalledProcessError as e:
-        log.error("ffmpeg-normalize returned non-zero status: {}".format(e.stderr))
-        return mp3filepath
+        process = subprocess.Popen(
+            get_decode_command(audio_path, sample_rate, start_trim, duration),
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+        )
     except OSError as e:
-        log.error("ffmpeg-normalize not found {}".format(e.strerror))
-        return mp3filepath
+        raise OSError(e.errno, "ffmpeg not found: {}".format(e.strerror))
+    try:
+        for data in iter(partial(process.stdout.read, buffer_size), b""):
+            yield data
+        stderr = process.stderr.read()
+        if process.wait() != 0:
+            raise RuntimeError("ffmpeg returned non-zero status: {}".format(stderr))
+    finally:
+        if process.poll() is None:
+            # The reading was stopped before the end of the audio
+            process.kill()
+            process.wait()
+        process.stdout.close()
+        process.stderr.close()
+
+
+def stream_audio_windows(
+    audio_path, sample_rate, window_duration, start_trim=0, duration=None, overlap=0
+):
+    """Yield the float32 samples of an audio by windows of window_duration seconds.
 
+    The windows start every window_duration seconds, and each one but the last
+    is followed by the first overlap seconds of the next one.
+    """
+    overlap_size = int(sample_rate * overlap) * 2
+    window = b""
+    for data in stream_audio(
+        audio_path, sample_rate, sample_rate * window_duration * 2, start_trim, duration
+    ):
+        if window:
+            yield pcm_to_float(window + data[:overlap_size])
+        window = data
+    if window:
+        yield pcm_to_float(window)
+
+
+def pcm_to_float(data):
+    """Return the float32 samples of raw 16 bit PCM."""
+    return np.frombuffer(data, np.int16).astype(np.float32) / 32768.0
+
+
+def get_frame_levels(data, frame_size):
+    """Return the level in dBFS of each frame of frame_size samples of raw PCM."""
+    samples = np.frombuffer(data, np.int16).astype(np.float32)
+    # the last frame is completed with silence
+    samples = np.pad(samples, (0, -len(samples) % frame_size))
+    rms = np.sqrt(np.mean(samples.reshape(-1, frame_size) ** 2, axis=1))
+    return 20 * np.log10(rms / 32768.0 + 1e-10)
 
-# #################################
-# TRANSCRIPT VIDEO: MAIN FUNCTION
-# #################################
 
+def get_speech_segments(levels, frame_duration):
+    """Return the (start, duration) in sec of the speech in the frame levels.
 
-def convert_vosk_samplerate(audio_path, desired_sample_rate, trim_start, duration):
-    """Convert audio to the good sample rate."""
-    sox_cmd = "sox {} --type raw --bits 16 --channels 1 --rate {} ".format(
-        quote(audio_path), desired_sample_rate
+    The segments separated by a silence shorter than TRANSCRIPTION_VAD_MIN_SILENCE
+    are joined, then each one is padded by TRANSCRIPTION_VAD_PADDING.
+    """
+    speech = np.flatnonzero(levels > TRANSCRIPTION_VAD_THRESHOLD)
+    if not len(speech):
+        return []
+    # indexes of the speech frames followed by a long enough silence
+    gaps = np.flatnonzero(
+        (np.diff(speech) - 1) * frame_duration >= TRANSCRIPTION_VAD_MIN_SILENCE
+    )
+    starts = np.concatenate(([speech[0]], speech[gaps + 1]))
+    ends = np.concatenate((speech[gaps], [speech[-1]])) + 1
+    total = len(levels) * frame_duration
+    segments = []
+    for start, end in zip(starts, ends):
+        start = max(0.0, start * frame_duration - TRANSCRIPTION_VAD_PADDING)
+        end = min(total, end * frame_duration + TRANSCRIPTION_VAD_PADDING)
+        segments.append((round(float(start), 3), round(float(end - start), 3)))
+    return segments
+
+
+def detect_speech_segments(audio_path, duration):
+    """Detect the speech segments of an audio from the level of its frames.
+
+    Return the (start, duration) in sec of the segments and a message giving
+    the ratio of the audio skipped as silence.
+    """
+    vad_start = timer()
+    sample_rate = 16000
+    frame_size = int(sample_rate * VAD_FRAME_DURATION)
+    levels = np.concatenate(
+        [np.array([])]
+        + [
+            get_frame_levels(data, frame_size)
+            # one second by buffer, i.e. a whole number of frames
+            for data in stream_audio(audio_path, sample_rate, sample_rate * 2)
+        ]
+    )
+    segments = get_speech_segments(levels, VAD_FRAME_DURATION)
+    total = len(levels) * VAD_FRAME_DURATION or duration
+    speech = sum(segment_duration for _, segment_duration in segments)
+    msg = "\nVoice activity detection took %0.3fs: %s speech segments," % (
+        timer() - vad_start,
+        len(segments),
+    )
+    msg += " %0.1f%% of the audio skipped as silence." % (
+        100 * (1 - speech / total) if total else 0
     )
-    sox_cmd += "--encoding signed-integer --endian little --compression 0.0 "
-    sox_cmd += "--no-dither - trim {} {}".format(trim_start, duration)
+    return segments, msg
 
-    try:
-        output = subprocess.Popen(shlex.split(sox_cmd), stdout=subprocess.PIPE)
 
-    except subprocess.CalledProcessError as e:
-        raise RuntimeError("SoX returned non-zero status: {}".format(e.stderr))
-    except OSError as e:
-        raise OSError(
-            e.errno,
-            "SoX not found, use {}hz files or install it: {}".format(
-                desired_sample_rate, e.strerror
-            ),
-        )
-    return output
+# #################################
+# TRANSCRIPT VIDEO: MAIN FUNCTION
+# #################################
 
 
 def get_word_result_from_data(results, audio, rec):
-    """Get subsound from audio and add transcription to result parameter."""
-    while True:
-        data = audio.stdout.read(4000)
-        if len(data) == 0:
-            break
+    """Get subsound from audio buffers and add transcription to result parameter."""
+    for data in audio:
         if rec.AcceptWaveform(data):
             results.append(rec.Result())
     results.append(rec.Result())
@@ -258,8 +472,137 @@ def words_to_vtt(
     return all_text, webvtt
 
 
-def main_vosk_transcript(norm_mp3_file, duration, transript_model):
+def transcribe_vosk_chunk(norm_mp3_file, transript_model, start_trim, chunk_duration):
+    """Transcribe a chunk of the audio with its own recognizer.
+
+    Return the words of each result, their times offset by the chunk start.
+    """
+    desired_sample_rate = 16000
+    rec = KaldiRecognizer(transript_model, desired_sample_rate)
+    rec.SetWords(True)
+    audio = stream_audio(
+        norm_mp3_file, desired_sample_rate, 4000, start_trim, chunk_duration
+    )
+    results = []
+    get_word_result_from_data(results, audio, rec)
+    segments = []
+    for res in results:
+        segments.append(
+            [
+                dict(word, start=word["start"] + start_trim, end=word["end"] + start_trim)
+                for word in json.loads(res).get("result") or []
+            ]
+        )
+    return segments
+
+
+def merge_chunk_segments(chunks, split_time, overlap):
+    """Merge the segments of overlapping chunks, keeping each word from one chunk.
+
+    `chunks` is the ordered list of (start_trim, segments) of the chunks, each
+    chunk lasting split_time + overlap seconds. The words of the overlap are
+    kept from the first chunk before its middle, and from the next one after.
+    """
+    merged = []
+    for index, (start_trim, segments) in enumerate(chunks):
+        begin = start_trim + overlap / 2 if index > 0 else float("-inf")
+        end = (
+            start_trim + split_time + overlap / 2
+            if index < len(chunks) - 1
+            else float("inf")
+        )
+        for segment in segments:
+            words = [word for word in segment if begin <= word["start"] < end]
+            if words:
+                merged.append(words)
+    return merged
+
+
+def segments_to_webvtt(segments):
+    """Return the WebVTT and the text of the ordered lists of words."""
+    webvtt = WebVTT()
+    all_text = ""
+    for words in segments:
+        text = " ".join(word["word"] for word in words)
+        caption = Caption(
+            sec_to_timestamp(words[0]["start"]),
+            sec_to_timestamp(words[-1]["end"]),
+            text,
+        )
+        webvtt.captions.append(caption)
+        all_text += text + " "
+    return webvtt, all_text
+
+
+def main_vosk_speech_transcript(norm_mp3_file, speech_segments, transript_model):
+    """Vosk transcription of the speech segments only."""
+    msg = ""
+    inference_start = timer()
+    msg += "\nInference start %0.3fs." % inference_start
+    msg += "\nRunning inference on %s speech segments with %s workers." % (
+        len(speech_segments),
+        TRANSCRIPTION_VOSK_WORKERS,
+    )
+    with ThreadPoolExecutor(max_workers=max(TRANSCRIPTION_VOSK_WORKERS, 1)) as executor:
+        results = executor.map(
+            lambda segment: transcribe_vosk_chunk(
+                norm_mp3_file, transript_model, segment[0], segment[1]
+            ),
+            speech_segments,
+        )
+        # the words are already offset to the original timeline
+        webvtt, all_text = segments_to_webvtt(
+            [words for segments in results for words in segments if words]
+        )
+    inference_end = timer() - inference_start
+
+    msg += "\nInference took %0.3fs." % inference_end
+    return msg, webvtt, all_text
+
+
+def main_vosk_parallel_transcript(norm_mp3_file, duration, transript_model):
+    """Vosk transcription of overlapping chunks at the same time."""
+    msg = ""
+    inference_start = timer()
+    msg += "\nInference start %0.3fs." % inference_start
+    starts = list(range(0, duration, TRANSCRIPTION_AUDIO_SPLIT_TIME))
+    msg += "\nRunning inference on %s chunks with %s workers." % (
+        len(starts),
+        TRANSCRIPTION_VOSK_WORKERS,
+    )
+    # The recognizers share the model and release the GIL while decoding
+    with ThreadPoolExecutor(max_workers=TRANSCRIPTION_VOSK_WORKERS) as executor:
+        segments = executor.map(
+            partial(
+                transcribe_vosk_chunk,
+                norm_mp3_file,
+                transript_model,
+                chunk_duration=TRANSCRIPTION_AUDIO_SPLIT_TIME
+                + TRANSCRIPTION_AUDIO_SPLIT_OVERLAP,
+            ),
+            starts,
+        )
+        chunks = list(zip(starts, segments))
+
+    webvtt, all_text = segments_to_webvtt(
+        merge_chunk_segments(
+            chunks, TRANSCRIPTION_AUDIO_SPLIT_TIME, TRANSCRIPTION_AUDIO_SPLIT_OVERLAP
+        )
+    )
+    inference_end = timer() - inference_start
+
+    msg += "\nInference took %0.3fs." % inference_end
+    return msg, webvtt, all_text
+
+
+def main_vosk_transcript(norm_mp3_file, duration, transript_model, speech_segments=None):
     """Vosk transcription."""
+    if speech_segments is not None:
+        return main_vosk_speech_transcript(
+            norm_mp3_file, speech_segments, transript_model
+        )
+    if TRANSCRIPTION_VOSK_WORKERS > 1 and duration > TRANSCRIPTION_AUDIO_SPLIT_TIME:
+        return main_vosk_parallel_transcript(norm_mp3_file, duration, transript_model)
     msg = ""
     inference_start = timer()
     msg += "\nInference start %0.3fs." % inference_start
@@ -270,68 +613,70 @@ def main_vosk_transcript(norm_mp3_file, duration, transript_model):
 
     webvtt = WebVTT()
     all_text = ""
-    for start_trim in range(0, duration, TRANSCRIPTION_AUDIO_SPLIT_TIME):
-        audio = convert_vosk_samplerate(
-            norm_mp3_file,
-            desired_sample_rate,
-            start_trim,
-            TRANSCRIPTION_AUDIO_SPLIT_TIME,  # dur
+    # The whole audio is streamed to the recognizer by buffers
+    audio = stream_audio(norm_mp3_file, desired_sample_rate, 4000)
+    msg += "\nRunning inference."
+    results = []
+    get_word_result_from_data(results, audio, rec)
+    for res in results:
+        words = json.loads(res).get("result")
+        text = json.loads(res).get("text")
+        if not words:
+            continue
+        start_caption = words[0]["start"]
+        stop_caption = words[-1]["end"]
+        caption = Caption(
+            sec_to_timestamp(start_caption),
+            sec_to_timestamp(stop_caption),
+            text,
         )
-        msg += "\nRunning inference."
-        results = []
-        get_word_result_from_data(results, audio, rec)
-        for res in results:
-            words = json.loads(res).get("result")
-            text = json.loads(res).get("text")
-            if not words:
-                continue
-            start_caption = words[0]["start"]
-            stop_caption = words[-1]["end"]
-            caption = Caption(
-                sec_to_timestamp(start_caption),
-                sec_to_timestamp(stop_caption),
-                text,
-            )
-            webvtt.captions.append(caption)
-            """
-            text_caption = []
-            is_first_caption = True
-            all_text, webvtt = words_to_vtt(
-                words,
-                start_trim,
-                duration,
-                is_first_caption,
-                text_caption,
-                start_caption,
-                last_word_added,
-                all_text,
-                webvtt,
-            )
-            """
+        webvtt.captions.append(caption)
     inference_end = timer() - inference_start
 
     msg += "\nInference took %0.3fs." % inference_end
     return msg, webvtt, all_text
 
 
-def main_whisper_transcript(norm_mp3_file, duration, lang):
-    """Whisper transcription."""
+def main_whisper_transcript(norm_mp3_file, duration, lang, speech_segments=None):
+    """Whisper transcription, of the speech segments only if given."""
     msg = ""
     all_text = ""
     inference_start = timer()
     desired_sample_rate = 16000
     msg += "\nInference start %0.3fs." % inference_start
 
-    model = whisper.load_model(
-        TRANSCRIPTION_MODEL_PARAM[TRANSCRIPTION_TYPE][lang]["model"],
-        download_root=TRANSCRIPTION_MODEL_PARAM[TRANSCRIPTION_TYPE][lang][
-            "download_root"
-        ],
-    )
-    audio = convert_samplerate(norm_mp3_file, desired_sample_rate, 0, duration)
-    transcription = model.transcribe(
-        audio, language=lang, initial_prompt="prompt", word_timestamps=True
-    )
+    model, model_msg = load_model(lang)
+    msg += model_msg
+    # Whisper needs whole windows of audio, decoded one after the other
+    transcription = {"text": "", "segments": [], "language": lang}
+    if speech_segments is None:
+        speech_segments = [(0, None)]
+    # the words of the overlap are kept from the window before its middle
+    middle = TRANSCRIPTION_AUDIO_SPLIT_OVERLAP / 2
+    prompt = "prompt"
+    for start_trim, segment_duration in speech_segments:
+        windows = stream_audio_windows(
+            norm_mp3_file,
+            desired_sample_rate,
+            TRANSCRIPTION_AUDIO_SPLIT_TIME,
+            start_trim,
+            segment_duration,
+            TRANSCRIPTION_AUDIO_SPLIT_OVERLAP,
+        )
+        for index, audio in enumerate(windows):
+            window = model.transcribe(
+                audio, language=lang, initial_prompt=prompt, word_timestamps=True
+            )
+            window_start = start_trim + index * TRANSCRIPTION_AUDIO_SPLIT_TIME
+            text = add_window_segments(
+                transcription,
+                window,
+                window_start,
+                window_start + middle if index > 0 else float("-inf"),
+                window_start + TRANSCRIPTION_AUDIO_SPLIT_TIME + middle,
+            )
+            # the text of a window is the prompt of the next one
+            prompt = text or prompt
     dirname = os.path.dirname(norm_mp3_file)
     filename = os.path.basename(norm_mp3_file).replace(".mp3", ".vtt")
     vtt_writer = get_writer("vtt", dirname)
@@ -343,6 +688,52 @@ def main_whisper_transcript(norm_mp3_file, duration, lang):
     return msg, wvtt, all_text
 
 
+def add_window_segments(
+    transcription, window, start_trim, begin=float("-inf"), end=float("inf")
+):
+    """Add the segments of a Whisper window to the transcription.
+
+    Their times are offset by the window start and their ids follow the
+    previous ones. Only the words starting between begin and end are kept,
+    like in `merge_chunk_segments`. Return the text added.
+    """
+    text = ""
+    for segment in window["segments"]:
+        segment = offset_segment(segment, start_trim)
+        if segment.get("words"):
+            words = [word for word in segment["words"] if begin <= word["start"] < end]
+            if not words:
+                continue
+            segment.update(
+                start=words[0]["start"],
+                end=words[-1]["end"],
+                text="".join(word["word"] for word in words),
+                words=words,
+            )
+        elif not begin <= segment["start"] < end:
+            continue
+        segment["id"] = len(transcription["segments"])
+        transcription["segments"].append(segment)
+        text += segment["text"]
+    transcription["text"] += text
+    return text
+
+
+def offset_segment(segment, start_trim):
+    """Return a copy of a Whisper segment and of its words, offset by start_trim."""
+    segment = dict(
+        segment,
+        start=segment["start"] + start_trim,
+        end=segment["end"] + start_trim,
+    )
+    if segment.get("words"):
+        segment["words"] = [
+            dict(word, start=word["start"] + start_trim, end=word["end"] + start_trim)
+            for word in segment["words"]
+        ]
+    return segment
+
+
 def change_previous_end_caption(webvtt, start_caption):
     """Change the end time for caption."""
     if len(webvtt.captions) > 0:
@@ -9,6 +9,7 @@ from tempfile import NamedTemporaryFile
 
 import requests
 from celery import Celery
+from celery.signals import worker_process_init
 
 from ..main.settings import MEDIA_ROOT
 
@@ -58,6 +59,15 @@ transcripting_app.conf.task_routes = {
 transcripting_app.autodiscover_tasks(packages=None, related_name="", force=False)
 
 
+@worker_process_init.connect
+def preload_transcription_models(**kwargs):
+    """Keep the transcription models loaded in each worker process, preloaded if set."""
+    from .transcript_model import enable_model_pool, preload_models
+
+    enable_model_pool()
+    preload_models()
+
+
 # celery \
 # -A pod.video_encode_transcript.transcripting_tasks worker \
 # -l INFO -Q transcripting
@@ -22,6 +22,7 @@ import webvtt
 from django.conf import settings
 from django.core.handlers.wsgi import WSGIRequest
 from django.http import JsonResponse
+from django.utils import timezone
 from django.views.decorators.csrf import csrf_exempt
 
 from pod.recorder.models import Recording
@@ -32,7 +33,6 @@ from pod.video_encode_transcript.runner_manager_utils import (
     store_after_remote_encoding_video,
     store_remote_encoding_log_recording,
 )
-from pod.video_encode_transcript.task_queue import refresh_pending_task_ranks
 from pod.video_encode_transcript.transcript import save_vtt_and_notify
 from pod.video_encode_transcript.utils import send_email_item
 
@@ -256,6 +256,7 @@ def _authorize_notify_task(task: Task, bearer_token: str) -> JsonResponse | None
 def _apply_notify_payload_to_task(task: Task, data: NotifyTaskPayload) -> None:
     """Persist task status and append optional script output details."""
     task.status = str(data["status"])
+    task.date_notified = timezone.now()
 
     script_output = task.script_output or ""
     error_message = data.get("error_message")
@@ -267,7 +268,6 @@ def _apply_notify_payload_to_task(task: Task, data: NotifyTaskPayload) -> None:
 
     task.script_output = script_output
     task.save()
-    refresh_pending_task_ranks()
 
 
 @csrf_exempt
@@ -0,0 +1,179 @@
+"""Esup-Pod shared Elasticsearch client.
+
+All the search and index functions use the same client in a process,
+to keep its connection pool between calls. Requests go through `es_request`,
+which applies the timeout of the operation, skips the calls for a cooldown
+after repeated failures (circuit breaker) and collects latency metrics.
+"""
+
+from django.conf import settings
+from elasticsearch import Elasticsearch
+from elasticsearch.exceptions import ApiError, TransportError
+
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+ES_URL = getattr(settings, "ES_URL", ["http://elasticsearch.localhost:9200/"])
+ES_TIMEOUT = getattr(settings, "ES_TIMEOUT", 30)
+ES_MAX_RETRIES = getattr(settings, "ES_MAX_RETRIES", 10)
+ES_OPTIONS = getattr(settings, "ES_OPTIONS", {})
+ES_CONNECTIONS_PER_NODE = getattr(settings, "ES_CONNECTIONS_PER_NODE", 10)
+ES_OPERATION_TIMEOUTS = getattr(settings, "ES_OPERATION_TIMEOUTS", {})
+ES_CIRCUIT_BREAKER_THRESHOLD = getattr(settings, "ES_CIRCUIT_BREAKER_THRESHOLD", 5)
+ES_CIRCUIT_BREAKER_COOLDOWN = getattr(settings, "ES_CIRCUIT_BREAKER_COOLDOWN", 30)
+
+_client = None
+_client_lock = threading.Lock()
+
+
+class CircuitBreakerOpenError(TransportError):
+    """Raised instead of calling Elasticsearch while the circuit breaker is open."""
+
+
+class CircuitBreaker:
+    """Skip the calls to a service for a cooldown after repeated failures."""
+
+    def __init__(self, threshold, cooldown):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.failures = 0
+        self.opened_at = None
+        self.lock = threading.Lock()
+
+    def allow(self) -> bool:
+        """Return True if a call can be done.
+
+        Once the cooldown is over, calls are allowed again:
+        the next failure opens the circuit again.
+        """
+        with self.lock:
+            if self.opened_at is None:
+                return True
+            if time.monotonic() - self.opened_at >= self.cooldown:
+                self.opened_at = None
+                self.failures = self.threshold - 1
+                return True
+            return False
+
+    def reset(self) -> None:
+        """Close the circuit and forget the previous failures."""
+        with self.lock:
+            self.failures = 0
+            self.opened_at = None
+
+    def record_success(self) -> None:
+        """Close the circuit after a successful call."""
+        with self.lock:
+            self.failures = 0
+            self.opened_at = None
+
+    def record_failure(self) -> None:
+        """Count a failed call, and open the circuit after `threshold` failures."""
+        with self.lock:
+            self.failures += 1
+            if self.failures >= self.threshold and self.opened_at is None:
+                self.opened_at = time.monotonic()
+                logger.error(
+                    "Elasticsearch failed %s times, calls skipped for %s seconds."
+                    % (self.failures, self.cooldown)
+                )
+
+
+circuit_breaker = CircuitBreaker(
+    ES_CIRCUIT_BREAKER_THRESHOLD, ES_CIRCUIT_BREAKER_COOLDOWN
+)
+_metrics = {}
+_metrics_lock = threading.Lock()
+
+
+def get_es_client(operation=None) -> Elasticsearch:
+    """Return the Elasticsearch client of the process, with the operation timeout."""
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = Elasticsearch(
+                    ES_URL,
+                    request_timeout=ES_TIMEOUT,
+                    max_retries=ES_MAX_RETRIES,
+                    retry_on_timeout=True,
+                    connections_per_node=ES_CONNECTIONS_PER_NODE,
+                    **ES_OPTIONS,
+                )
+    if operation in ES_OPERATION_TIMEOUTS:
+        return _client.options(request_timeout=ES_OPERATION_TIMEOUTS[operation])
+    return _client
+
+
+def close_es_client() -> None:
+    """Close the connections of the Elasticsearch client of the process."""
+    global _client
+    with _client_lock:
+        if _client is not None:
+            _client.close()
+            _client = None
+
+
+def add_metric(operation, duration, error=False) -> None:
+    """Add a call to the latency metrics of the operation."""
+    with _metrics_lock:
+        metric = _metrics.setdefault(
+            operation, {"calls": 0, "errors": 0, "total_time": 0.0, "max_time": 0.0}
+        )
+        metric["calls"] += 1
+        metric["errors"] += int(error)
+        metric["total_time"] += duration
+        metric["max_time"] = max(metric["max_time"], duration)
+
+
+def get_es_metrics() -> dict:
+    """Return the calls, errors, total and max time (seconds) of each operation."""
+    with _metrics_lock:
+        return {operation: dict(metric) for operation, metric in _metrics.items()}
+
+
+def format_es_metrics() -> list:
+    """Return a line of latency metrics for each operation, to report them."""
+    return [
+        "Elasticsearch %s: %s calls, %s errors, %.3f s average, %.3f s max"
+        % (
+            operation,
+            metric["calls"],
+            metric["errors"],
+            metric["total_time"] / max(metric["calls"], 1),
+            metric["max_time"],
+        )
+        for operation, metric in sorted(get_es_metrics().items())
+    ]
+
+
+def es_request(operation, request):
+    """Call `request(client)` with the shared Elasticsearch client.
+
+    `operation` (search, index, delete, bulk, admin...) gives the timeout
+    (see ES_OPERATION_TIMEOUTS) and the name of the latency metric.
+    Connection errors, timeouts and server errors are counted
+    by the circuit breaker; while it is open, CircuitBreakerOpenError is raised.
+    """
+    if not circuit_breaker.allow():
+        raise CircuitBreakerOpenError(
+            "Elasticsearch calls skipped after repeated failures."
+        )
+    start = time.monotonic()
+    try:
+        result = request(get_es_client(operation))
+    except (TransportError, ApiError) as e:
+        if isinstance(e, TransportError) or e.status_code >= 500:
+            circuit_breaker.record_failure()
+        else:
+            circuit_breaker.record_success()
+        add_metric(operation, time.monotonic() - start, error=True)
+        raise
+    circuit_breaker.record_success()
+    duration = time.monotonic() - start
+    add_metric(operation, duration)
+    logger.debug("Elasticsearch %s done in %.3f seconds." % (operation, duration))
+    return result
@@ -5,15 +5,16 @@ from django.utils import translation
 from pod.video.models import Video
 from django.conf import settings
 from pod.video.context_processors import get_available_videos
-from pod.video_search.utils import index_es, delete_es
-from pod.video_search.utils import delete_index_es, create_index_es
-import time
+from pod.video_search.utils import index_es, delete_es, rebuild_index_es
+from pod.video_search.utils import ES_BULK_CHUNK_SIZE, ES_BULK_THREAD_COUNT
+from pod.video_search.utils import ES_INDEX_KEEP_VERSIONS
+from pod.video_search.client import close_es_client, format_es_metrics
 
 
 class Command(BaseCommand):
     """Indexes all or specified video in Elasticsearch."""
 
-    args = "--all or -id <video_id video_id ...>"
+    args = "--all [--resume-from <video_id>] [--force] or -id <video_id video_id ...>"
     help = "Indexes the specified video in Elasticsearch."
 
     def add_arguments(self, parser) -> None:
@@ -25,22 +26,49 @@ class Command(BaseCommand):
             dest="all",
             help="index all video",
         )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=ES_BULK_CHUNK_SIZE,
+            dest="batch_size",
+            help="number of videos sent in each bulk request (with --all)",
+        )
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=ES_BULK_THREAD_COUNT,
+            dest="workers",
+            help="number of bulk requests sent in parallel (with --all)",
+        )
+        parser.add_argument(
+            "--resume-from",
+            type=int,
+            default=0,
+            dest="resume_from",
+            help=(
+                "resume an interrupted indexation after this video id, "
+                "in the last index version (with --all)"
+            ),
+        )
+        parser.add_argument(
+            "--force",
+            action="store_true",
+            dest="force",
+            help="use the new index even if some videos were not indexed (with --all)",
+        )
+        parser.add_argument(
+            "--keep",
+            type=int,
+            default=ES_INDEX_KEEP_VERSIONS,
+            dest="keep",
+            help="number of old index versions to keep (with --all)",
+        )
 
     def handle(self, *args, **options) -> None:
         """Handle an index_videos command call."""
         translation.activate(settings.LANGUAGE_CODE)
         if options["all"]:
-            delete_index_es()
-            time.sleep(10)
-            create_index_es()
-            time.sleep(10)
-            iteration = 0
-            videos = get_available_videos()
-            for video in videos:
-                if iteration % 1000 == 0:
-                    time.sleep(10)
-                iteration += 1
-                index_es(video)
+            self.index_all(options)
         elif options["video_id"]:
             for video_id in options["video_id"]:
                 self.manage_es(video_id)
@@ -50,8 +78,60 @@ class Command(BaseCommand):
                     "****** Warning: you must give some arguments: %s ******" % self.args
                 )
             )
+        for line in format_es_metrics():
+            self.stdout.write(line)
+        close_es_client()
         translation.deactivate()
 
+    def index_all(self, options) -> None:
+        """Index all available videos in a new ES index version, then use it."""
+        report = rebuild_index_es(
+            get_available_videos(),
+            resume_from=options["resume_from"],
+            keep=options["keep"],
+            force=options["force"],
+            chunk_size=options["batch_size"],
+            thread_count=options["workers"],
+            progress=self.print_progress,
+        )
+        if report is None:
+            self.stdout.write(self.style.ERROR("Unable to create the new index."))
+            return
+        for error in report["errors"]:
+            self.stdout.write(self.style.ERROR("Video not indexed: %s" % error))
+        self.stdout.write(
+            self.style.SUCCESS(
+                "%s videos indexed (%.1f videos/s), %s errors, last video id: %s"
+                % (
+                    report["indexed"],
+                    report["rate"],
+                    len(report["errors"]),
+                    report["last_id"],
+                )
+            )
+        )
+        if not report["swapped"]:
+            self.stdout.write(
+                self.style.ERROR(
+                    "The search still uses the previous index. Resume the indexation "
+                    "in %s with --resume-from %s, or use it anyway with --force."
+                    % (report["index"], report["last_id"])
+                )
+            )
+            return
+        self.stdout.write(
+            self.style.SUCCESS("The search now uses the index %s." % report["index"])
+        )
+        for index in report["deleted_indices"]:
+            self.stdout.write(self.style.WARNING("Old index %s deleted." % index))
+
+    def print_progress(self, report) -> None:
+        """Print the progress of a bulk indexation."""
+        self.stdout.write(
+            "%s videos indexed (%.1f videos/s), last video id: %s"
+            % (report["indexed"], report["rate"], report["last_id"])
+        )
+
     def manage_es(self, video_id) -> None:
         """Index or delete a video in ES."""
         try:
@@ -0,0 +1,91 @@
+"""process_index_queue management command.
+
+Update the ElasticSearch index for the videos saved or deleted
+since the last call, when USE_ES_INDEX_QUEUE is True.
+This script must be executed regularly (for an example, with a CRON task).
+Example: crontab -e */1 * * * * python manage.py process_index_queue
+"""
+
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from pod.video.models import Video
+from pod.video_search.models import VideoToIndex
+from pod.video_search.utils import update_index_es, ES_BULK_CHUNK_SIZE
+from pod.video_search.client import close_es_client, format_es_metrics
+
+ES_INDEX_QUEUE_DELAY = getattr(settings, "ES_INDEX_QUEUE_DELAY", 30)
+
+
+class Command(BaseCommand):
+    """Command called by `python manage.py process_index_queue`."""
+
+    help = "Update the Elasticsearch index for the videos of the index queue."
+
+    def add_arguments(self, parser) -> None:
+        """Add arguments of process_index_queue command."""
+        parser.add_argument(
+            "--delay",
+            type=int,
+            default=ES_INDEX_QUEUE_DELAY,
+            help=(
+                "only update the videos not saved since this number of seconds, "
+                "to gather successive saves of a video"
+            ),
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=ES_BULK_CHUNK_SIZE,
+            dest="batch_size",
+            help="number of videos updated in each bulk request",
+        )
+
+    def handle(self, *args, **options) -> None:
+        """Process the index queue by batches."""
+        limit = timezone.now() - timedelta(seconds=options["delay"])
+        # The videos saved again after `limit` stay in the queue.
+        queue = VideoToIndex.objects.filter(date_update__lte=limit)
+        nb_updated = 0
+        nb_errors = 0
+        last_id = 0
+        while True:
+            entries = list(
+                queue.filter(id__gt=last_id).order_by("id")[: options["batch_size"]]
+            )
+            if not entries:
+                break
+            last_id = entries[-1].id
+            # The indexed document of a public video being encoded is kept:
+            # the video is queued again when its encoding ends.
+            encoding_ids = set(
+                Video.objects.filter(
+                    id__in=[entry.video_id for entry in entries],
+                    is_draft=False,
+                    encoding_in_progress=True,
+                ).values_list("id", flat=True)
+            )
+            video_ids = [
+                entry.video_id for entry in entries if entry.video_id not in encoding_ids
+            ]
+            report = update_index_es(
+                Video.objects.filter(is_draft=False, encoding_in_progress=False),
+                video_ids,
+            )
+            nb_updated += report["updated"]
+            nb_errors += len(report["errors"])
+            if report["errors"]:
+                # Keep the entries in the queue to try again at the next call.
+                self.stdout.write(
+                    self.style.ERROR("Index update errors: %s" % report["errors"])
+                )
+                continue
+            queue.filter(id__in=[entry.id for entry in entries]).delete()
+        self.stdout.write(
+            self.style.SUCCESS("%s index updates, %s errors." % (nb_updated, nb_errors))
+        )
+        for line in format_es_metrics():
+            self.stdout.write(line)
+        close_es_client()
@@ -1,6 +1,9 @@
 """Models for Esup-Pod video_search."""
 
 from django.conf import settings
+from django.db import models
+from django.utils import timezone
+from django.utils.translation import gettext_lazy as _
 from pod.video_search.utils import index_es, delete_es
 from pod.video.models import Video
 from django.dispatch import receiver
@@ -9,17 +12,50 @@ from django.db.models.signals import post_save, pre_delete
 import threading
 
 ES_URL = getattr(settings, "ES_URL", ["http://elasticsearch.localhost:9200/"])
+USE_ES_INDEX_QUEUE = getattr(settings, "USE_ES_INDEX_QUEUE", False)
 
 # do it with contributor, overlay, chapter etc.
 
 
+class VideoToIndex(models.Model):
+    """Video waiting to be updated in the ElasticSearch index.
+
+    There is only one entry per video: successive saves of a video
+    just postpone its update, until the queue is processed
+    by the `process_index_queue` command.
+    """
+
+    video_id = models.IntegerField(_("Video id"), unique=True)
+    date_update = models.DateTimeField(
+        _("Date of the last update"), default=timezone.now, db_index=True
+    )
+
+    class Meta:
+        verbose_name = _("Video to index")
+        verbose_name_plural = _("Videos to index")
+
+    def __str__(self) -> str:
+        """Render the video to index as string."""
+        return "%s - %s" % (self.video_id, self.date_update)
+
+
+def add_video_to_index_queue(video_id) -> None:
+    """Add a video in the index queue, or postpone its update."""
+    VideoToIndex.objects.update_or_create(
+        video_id=video_id, defaults={"date_update": timezone.now()}
+    )
+
+
 @receiver(post_save, sender=Video)
 def update_video_index(
     sender, instance=None, created=False, **kwargs
 ) -> None:  # pragma: no cover
-    """Start index_video as daemon thread."""
+    """Add the video in the index queue, or start index_video as daemon thread."""
     if ES_URL is None:
         return
+    if USE_ES_INDEX_QUEUE:
+        add_video_to_index_queue(instance.id)
+        return
     t = threading.Thread(target=index_video, args=[instance])
     t.daemon = True
     t.start()
@@ -37,9 +73,12 @@ def index_video(video) -> None:  # pragma: no cover
 def delete_video_index(
     sender, instance=None, created=False, **kwargs
 ) -> None:  # pragma: no cover
-    """Start delete_es as daemon thread."""
+    """Add the video in the index queue, or start delete_es as daemon thread."""
     if ES_URL is None:
         return
+    if USE_ES_INDEX_QUEUE:
+        add_video_to_index_queue(instance.id)
+        return
     # delete_es(instance)
     t = threading.Thread(target=delete_es, args=[instance.id])
     t.daemon = True
@@ -0,0 +1,61 @@
+"""Unit tests for Esup-Pod shared Elasticsearch client.
+
+*  run with 'python manage.py test pod.video_search.tests.test_client'
+"""
+
+from unittest.mock import patch, MagicMock
+
+from django.test import TestCase
+from elasticsearch.exceptions import ConnectionError
+
+from ..client import CircuitBreaker, CircuitBreakerOpenError
+from ..client import es_request, format_es_metrics, get_es_metrics
+
+
+class CircuitBreakerTestCase(TestCase):
+    """TestCase for the Elasticsearch circuit breaker."""
+
+    def test_circuit_breaker(self) -> None:
+        breaker = CircuitBreaker(threshold=2, cooldown=30)
+        self.assertTrue(breaker.allow())
+        breaker.record_failure()
+        self.assertTrue(breaker.allow())
+        breaker.record_failure()
+        # Opened after 2 failures
+        self.assertFalse(breaker.allow())
+        # Allowed again after the cooldown, opened again at the next failure
+        breaker.opened_at -= 30
+        self.assertTrue(breaker.allow())
+        breaker.record_failure()
+        self.assertFalse(breaker.allow())
+        breaker.opened_at -= 30
+        self.assertTrue(breaker.allow())
+        breaker.record_success()
+        breaker.record_failure()
+        self.assertTrue(breaker.allow())
+        print("--> test_circuit_breaker ok! ")
+
+    @patch("pod.video_search.client.get_es_client")
+    def test_es_request(self, mock_es) -> None:
+        breaker = CircuitBreaker(threshold=1, cooldown=30)
+        with patch("pod.video_search.client.circuit_breaker", breaker):
+            result = es_request("test_ok", lambda es: es.search(index="pod"))
+            self.assertEqual(result, mock_es.return_value.search.return_value)
+            mock_es.assert_called_with("test_ok")
+            self.assertEqual(get_es_metrics()["test_ok"]["calls"], 1)
+            self.assertEqual(get_es_metrics()["test_ok"]["errors"], 0)
+
+            request = MagicMock(side_effect=ConnectionError("refused"))
+            with self.assertRaises(ConnectionError):
+                es_request("test_error", request)
+            self.assertEqual(get_es_metrics()["test_error"]["errors"], 1)
+            # The circuit is open, Elasticsearch is not called anymore
+            with self.assertRaises(CircuitBreakerOpenError):
+                es_request("test_error", request)
+            self.assertEqual(request.call_count, 1)
+        self.assertIn(
+            "Elasticsearch test_error: 1 calls, 1 errors", "\n".join(format_es_metrics())
+        )
+        breaker.reset()
+        self.assertTrue(breaker.allow())
+        print("--> test_es_request ok! ")
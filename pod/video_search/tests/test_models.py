@@ -0,0 +1,86 @@
+"""Unit tests for Esup-Pod video search models.
+
+*  run with 'python manage.py test pod.video_search.tests.test_models'
+"""
+
+from datetime import timedelta
+from io import StringIO
+from unittest.mock import patch
+
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.test import TestCase
+from django.utils import timezone
+
+from pod.video.models import Video, Type
+from ..models import VideoToIndex, add_video_to_index_queue
+
+
+class VideoToIndexTestCase(TestCase):
+    """TestCase for the video search index queue."""
+
+    fixtures = [
+        "initial_data.json",
+    ]
+
+    def setUp(self) -> None:
+        """Set up required objects for next tests."""
+        self.user = User.objects.create(username="pod", password="pod1234pod")
+        self.v = Video.objects.create(
+            title="Video1",
+            owner=self.user,
+            video="test.mp4",
+            is_draft=False,
+            type=Type.objects.get(id=1),
+        )
+
+    def test_add_video_to_index_queue(self) -> None:
+        add_video_to_index_queue(self.v.id)
+        first_update = VideoToIndex.objects.get(video_id=self.v.id).date_update
+        add_video_to_index_queue(self.v.id)
+        add_video_to_index_queue(self.v.id)
+        # Successive saves of a video are gathered in one entry
+        self.assertEqual(VideoToIndex.objects.filter(video_id=self.v.id).count(), 1)
+        self.assertGreaterEqual(
+            VideoToIndex.objects.get(video_id=self.v.id).date_update, first_update
+        )
+        print("--> test_add_video_to_index_queue ok! ")
+
+    @patch("pod.video_search.management.commands.process_index_queue.update_index_es")
+    def test_process_index_queue(self, mock_update) -> None:
+        mock_update.return_value = {"updated": 2, "errors": []}
+        old_date = timezone.now() - timedelta(minutes=5)
+        VideoToIndex.objects.create(video_id=self.v.id, date_update=old_date)
+        VideoToIndex.objects.create(video_id=9999, date_update=old_date)
+        # Recently saved, wait for other saves
+        VideoToIndex.objects.create(video_id=10000)
+        call_command("process_index_queue", stdout=StringIO())
+        mock_update.assert_called_once()
+        self.assertEqual(mock_update.call_args.args[1], [self.v.id, 9999])
+        self.assertEqual(
+            list(VideoToIndex.objects.values_list("video_id", flat=True)), [10000]
+        )
+        # In case of error, the entries stay in the queue
+        mock_update.return_value = {"updated": 0, "errors": [10000]}
+        call_command("process_index_queue", delay=0, stdout=StringIO())
+        self.assertEqual(VideoToIndex.objects.count(), 1)
+        print("--> test_process_index_queue ok! ")
+
+    @patch("pod.video_search.management.commands.process_index_queue.update_index_es")
+    def test_process_index_queue_encoding(self, mock_update) -> None:
+        mock_update.return_value = {"updated": 0, "errors": []}
+        draft = Video.objects.create(
+            title="Video2",
+            owner=self.user,
+            video="test2.mp4",
+            type=Type.objects.get(id=1),
+            encoding_in_progress=True,
+        )
+        Video.objects.filter(id=self.v.id).update(encoding_in_progress=True)
+        VideoToIndex.objects.create(video_id=self.v.id)
+        VideoToIndex.objects.create(video_id=draft.id)
+        call_command("process_index_queue", delay=0, stdout=StringIO())
+        # The public video being encoded is neither indexed nor deleted
+        self.assertEqual(mock_update.call_args.args[1], [draft.id])
+        self.assertFalse(VideoToIndex.objects.exists())
+        print("--> test_process_index_queue_encoding ok! ")
@@ -3,11 +3,25 @@
 *  run with 'python manage.py test pod.video_search.tests.test_utils'
 """
 
+import os
+from unittest.mock import patch, MagicMock
+
 from django.test import TestCase
 from django.contrib.auth.models import User
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.core.files.uploadedfile import SimpleUploadedFile
+from elasticsearch.exceptions import ConnectionError
+from sorl.thumbnail import get_thumbnail
+from sorl.thumbnail.images import ImageFile
 
 from pod.video.models import Video, Type
-from ..utils import index_es, delete_es
+from pod.podfile.models import CustomImageModel, UserFolder
+from ..client import circuit_breaker, close_es_client
+from ..utils import index_es, delete_es, get_index_actions, bulk_index_es
+from ..utils import swap_index_alias_es, delete_old_index_versions_es
+from ..utils import rebuild_index_es, ES_INDEX, get_videos_to_index
+from ..utils import get_thumbnail_name, get_thumbnail_urls, update_index_es
 
 
 class VideoSearchTestUtils(TestCase):
@@ -19,6 +33,7 @@ class VideoSearchTestUtils(TestCase):
 
     def setUp(self) -> None:
         """Set up required objects for next tests."""
+        circuit_breaker.reset()
         self.user = User.objects.create(username="pod", password="pod1234pod")
         self.v = Video.objects.create(
             title="Video1",
@@ -28,6 +43,11 @@ class VideoSearchTestUtils(TestCase):
             type=Type.objects.get(id=1),
         )
 
+    def tearDown(self) -> None:
+        """Forget the Elasticsearch failures and connections of the test."""
+        circuit_breaker.reset()
+        close_es_client()
+
     def test_index_and_delete_es(self) -> None:
         res = index_es(self.v)
         self.assertTrue(res["result"] in ["created", "updated"])
@@ -36,3 +56,226 @@ class VideoSearchTestUtils(TestCase):
         self.assertEqual(delete["result"], "deleted")
         self.assertEqual(delete["_id"], str(self.v.id))
         print("--> test_index_and_delete_es ok! ")
+
+    def test_get_index_actions(self) -> None:
+        actions = get_index_actions([self.v])
+        self.assertEqual(len(actions), 1)
+        self.assertEqual(actions[0]["_id"], self.v.id)
+        self.assertEqual(actions[0]["_source"], self.v.get_json_to_index())
+        print("--> test_get_index_actions ok! ")
+
+    def test_get_index_actions_prefetched(self) -> None:
+        for i in range(3):
+            Video.objects.create(
+                title="Video prefetched %s" % i,
+                owner=self.user,
+                video="test.mp4",
+                is_draft=False,
+                type=Type.objects.get(id=1),
+                tags="tag%s" % i,
+            )
+        videos = get_videos_to_index(Video.objects.all())
+        actions = get_index_actions(list(videos))
+        for action in actions:
+            video = Video.objects.get(id=action["_id"])
+            self.assertEqual(action["_source"], video.get_json_to_index())
+        # The number of queries does not depend on the number of videos
+        with CaptureQueriesContext(connection) as all_videos:
+            get_index_actions(list(get_videos_to_index(Video.objects.all())))
+        with CaptureQueriesContext(connection) as one_video:
+            get_index_actions(
+                list(get_videos_to_index(Video.objects.filter(id=self.v.id)))
+            )
+        self.assertEqual(len(all_videos), len(one_video))
+        print("--> test_get_index_actions_prefetched ok! ")
+
+    def test_get_thumbnail_urls(self) -> None:
+        image_path = os.path.join(
+            os.path.dirname(os.path.dirname(os.path.dirname(__file__))),
+            "podfile",
+            "tests",
+            "testimage.jpg",
+        )
+        home, created = UserFolder.objects.get_or_create(name="home", owner=self.user)
+        thumbnail = CustomImageModel.objects.create(
+            name="testimage",
+            created_by=self.user,
+            folder=home,
+            file=SimpleUploadedFile(
+                name="testimage.jpg",
+                content=open(image_path, "rb").read(),
+                content_type="image/jpeg",
+            ),
+        )
+        # Do not start the indexation thread, which would create the thumbnail
+        Video.objects.filter(id=self.v.id).update(thumbnail=thumbnail)
+        self.v.refresh_from_db()
+        # Not generated yet, the thumbnail is not in the key value store
+        self.assertEqual(get_thumbnail_urls([self.v]), {})
+        thumbnail_url = self.v.get_thumbnail_url()
+        self.assertEqual(get_thumbnail_urls([self.v]), {self.v.id: thumbnail_url})
+        # The private sorl-thumbnail methods give the name of the public API
+        # with the installed version of sorl-thumbnail
+        self.assertEqual(
+            get_thumbnail_name(
+                ImageFile(self.v.thumbnail.file),
+                "x720",
+                {"crop": "center", "quality": 80},
+            ),
+            get_thumbnail(self.v.thumbnail.file, "x720", crop="center", quality=80).name,
+        )
+        # Without them, the thumbnail url is left to the video
+        with patch("pod.video_search.utils.thumbnail_default", MagicMock(backend=None)):
+            self.assertEqual(get_thumbnail_urls([self.v]), {})
+        self.v.thumbnail.delete()
+        print("--> test_get_thumbnail_urls ok! ")
+
+    @patch("pod.video_search.utils.helpers.bulk")
+    @patch("pod.video_search.client.get_es_client")
+    def test_bulk_index_es(self, mock_es, mock_bulk) -> None:
+        v2 = Video.objects.create(
+            title="Video2",
+            owner=self.user,
+            video="test.mp4",
+            is_draft=False,
+            type=Type.objects.get(id=1),
+        )
+        mock_bulk.side_effect = lambda es, actions, **kwargs: (len(actions), [])
+        progress = MagicMock()
+        report = bulk_index_es(
+            Video.objects.all(), chunk_size=1, thread_count=2, progress=progress
+        )
+        self.assertEqual(report["indexed"], 2)
+        self.assertEqual(report["errors"], [])
+        self.assertEqual(report["last_id"], v2.id)
+        self.assertEqual(progress.call_count, 2)
+        # refresh disabled during the load, then restored
+        put_settings = mock_es.return_value.indices.put_settings
+        self.assertEqual(
+            put_settings.call_args_list[0].kwargs["body"],
+            {"index": {"refresh_interval": "-1"}},
+        )
+        self.assertEqual(put_settings.call_count, 2)
+        mock_es.return_value.indices.refresh.assert_called_once()
+        # resume after the first video
+        report = bulk_index_es(Video.objects.all(), resume_from=self.v.id)
+        self.assertEqual(report["indexed"], 1)
+        self.assertEqual(report["last_id"], v2.id)
+        print("--> test_bulk_index_es ok! ")
+
+    @patch("pod.video_search.utils.ES_CONNECTIONS_PER_NODE", 1)
+    @patch("pod.video_search.utils.helpers.bulk")
+    @patch("pod.video_search.client.get_es_client")
+    def test_bulk_index_es_failed_chunk(self, mock_es, mock_bulk) -> None:
+        videos = [self.v] + [
+            Video.objects.create(
+                title="Video%s" % i,
+                owner=self.user,
+                video="test.mp4",
+                is_draft=False,
+                type=Type.objects.get(id=1),
+            )
+            for i in range(2, 4)
+        ]
+
+        def bulk(es, actions, **kwargs):
+            if actions[0]["_id"] == videos[1].id:
+                raise ConnectionError("refused")
+            return len(actions), []
+
+        mock_bulk.side_effect = bulk
+        with self.assertLogs("pod.video_search.utils", "WARNING") as logs:
+            report = bulk_index_es(Video.objects.all(), chunk_size=1, thread_count=4)
+        self.assertIn("limited to ES_CONNECTIONS_PER_NODE: 1", logs.output[0])
+        self.assertEqual(report["indexed"], 2)
+        self.assertEqual(report["errors"], [{"index": {"_id": videos[1].id}}])
+        # The resume starts again from the failed chunk
+        self.assertEqual(report["last_id"], videos[0].id)
+        print("--> test_bulk_index_es_failed_chunk ok! ")
+
+    @patch("pod.video_search.client.get_es_client")
+    def test_swap_index_alias_es(self, mock_es) -> None:
+        es = mock_es.return_value
+        es.indices.exists_alias.return_value = True
+        es.indices.get_alias.return_value = {"%s_v1" % ES_INDEX: {}}
+        swap_index_alias_es("%s_v2" % ES_INDEX)
+        es.indices.update_aliases.assert_called_once_with(
+            actions=[
+                {"remove": {"index": "%s_v1" % ES_INDEX, "alias": ES_INDEX}},
+                {"add": {"index": "%s_v2" % ES_INDEX, "alias": ES_INDEX}},
+            ]
+        )
+        # A former concrete index is removed with the alias creation
+        mock_es.return_value = es = MagicMock()
+        es.indices.exists_alias.return_value = False
+        es.indices.exists.return_value = True
+        swap_index_alias_es("%s_v2" % ES_INDEX)
+        es.indices.update_aliases.assert_called_once_with(
+            actions=[
+                {"remove_index": {"index": ES_INDEX}},
+                {"add": {"index": "%s_v2" % ES_INDEX, "alias": ES_INDEX}},
+            ]
+        )
+        print("--> test_swap_index_alias_es ok! ")
+
+    @patch("pod.video_search.client.get_es_client")
+    def test_delete_old_index_versions_es(self, mock_es) -> None:
+        es = mock_es.return_value
+        es.indices.get.return_value = {
+            "%s_v%s" % (ES_INDEX, version): {} for version in range(1, 5)
+        }
+        es.indices.exists_alias.return_value = True
+        es.indices.get_alias.return_value = {"%s_v4" % ES_INDEX: {}}
+        deleted = delete_old_index_versions_es(keep=1)
+        self.assertEqual(deleted, ["%s_v1" % ES_INDEX, "%s_v2" % ES_INDEX])
+        self.assertEqual(es.indices.delete.call_count, 2)
+        print("--> test_delete_old_index_versions_es ok! ")
+
+    @patch("pod.video_search.utils.delete_old_index_versions_es")
+    @patch("pod.video_search.utils.swap_index_alias_es")
+    @patch("pod.video_search.utils.bulk_index_es")
+    @patch("pod.video_search.client.get_es_client")
+    def test_rebuild_index_es(self, mock_es, mock_bulk, mock_swap, mock_delete) -> None:
+        mock_es.return_value.indices.get.return_value = {"%s_v1" % ES_INDEX: {}}
+        mock_bulk.return_value = {"indexed": 1, "errors": []}
+        mock_delete.return_value = ["%s_v1" % ES_INDEX]
+        report = rebuild_index_es(Video.objects.all())
+        index = mock_bulk.call_args.kwargs["index"]
+        self.assertTrue(index.startswith("%s_v" % ES_INDEX))
+        self.assertNotEqual(index, "%s_v1" % ES_INDEX)
+        mock_swap.assert_called_once_with(index)
+        self.assertEqual(report["index"], index)
+        self.assertEqual(report["deleted_indices"], ["%s_v1" % ES_INDEX])
+        # Resume in the last index version
+        rebuild_index_es(Video.objects.all(), resume_from=self.v.id)
+        self.assertEqual(mock_bulk.call_args.kwargs["index"], "%s_v1" % ES_INDEX)
+        self.assertEqual(mock_bulk.call_args.kwargs["resume_from"], self.v.id)
+        # Some videos not indexed: the alias and the old versions are kept
+        mock_bulk.return_value = {"indexed": 0, "errors": [{"index": {"_id": 1}}]}
+        report = rebuild_index_es(Video.objects.all(), resume_from=self.v.id)
+        self.assertFalse(report["swapped"])
+        self.assertEqual(report["deleted_indices"], [])
+        self.assertEqual(mock_swap.call_count, 2)
+        self.assertEqual(mock_delete.call_count, 2)
+        report = rebuild_index_es(Video.objects.all(), resume_from=self.v.id, force=True)
+        self.assertTrue(report["swapped"])
+        self.assertEqual(mock_swap.call_count, 3)
+        print("--> test_rebuild_index_es ok! ")
+
+    @patch("pod.video_search.utils.helpers.bulk")
+    @patch("pod.video_search.client.get_es_client")
+    def test_update_index_es(self, mock_es, mock_bulk) -> None:
+        mock_bulk.return_value = (
+            1,
+            [{"delete": {"_id": "9999", "status": 404}}],
+        )
+        report = update_index_es(Video.objects.all(), [self.v.id, 9999])
+        actions = mock_bulk.call_args.args[1]
+        self.assertEqual(len(actions), 2)
+        self.assertEqual(actions[0]["_id"], self.v.id)
+        self.assertEqual(
+            actions[1], {"_op_type": "delete", "_index": ES_INDEX, "_id": 9999}
+        )
+        # A video not in the index is not an error
+        self.assertEqual(report, {"updated": 1, "errors": []})
+        print("--> test_update_index_es ok! ")
@@ -1,13 +1,18 @@
 from datetime import datetime, timedelta
+from unittest.mock import patch
 
+from django.core.cache import cache
 from django.test import TestCase
 from django.test.client import RequestFactory
+from django.urls import reverse
 
 from pod.video_search.views import (
     get_filter_search,
     get_remove_selected_facet_link,
     get_result_aggregations,
 )
+from pod.video_search.client import circuit_breaker, close_es_client
+from pod.video_search.utils import invalidate_search_cache
 
 
 class VideoSearchTest(TestCase):
@@ -16,6 +21,7 @@ class VideoSearchTest(TestCase):
     ]
 
     def setUp(self):
+        circuit_breaker.reset()
         self.selected_facets = [
             "type_field.raw:value11",
             "tags_field.raw:value22",
@@ -25,6 +31,10 @@ class VideoSearchTest(TestCase):
             "disciplines.slug.raw:value3",
         ]
 
+    def tearDown(self):
+        circuit_breaker.reset()
+        close_es_client()
+
     def test_get_filter_search(self):
         start_date = datetime.now()
         end_date = start_date + timedelta(days=10)
@@ -100,3 +110,32 @@ class VideoSearchTest(TestCase):
         actual = get_result_aggregations(results, self.selected_facets)
 
         self.assertEqual(actual, results["aggregations"])
+
+    @patch("pod.video_search.client.get_es_client")
+    def test_search_videos_cache(self, mock_es):
+        cache.clear()
+        search = mock_es.return_value.search
+        search.side_effect = lambda index, body: {
+            "hits": {"hits": [], "total": {"value": 0}},
+            "aggregations": {"cursus": {"buckets": []}} if "aggs" in body else {},
+        }
+        url = reverse("video_search:search_videos")
+        response = self.client.get(url, {"q": "Video "})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(search.call_count, 1)
+        # Same normalised search: hits and aggregations are taken from the cache
+        response = self.client.get(url, {"q": "video"})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(search.call_count, 1)
+        # Next page loaded by ajax: no aggregations requested
+        self.client.get(
+            url, {"q": "video", "page": 1}, HTTP_X_REQUESTED_WITH="XMLHttpRequest"
+        )
+        self.assertEqual(search.call_count, 2)
+        self.assertNotIn("aggs", search.call_args.kwargs["body"])
+        # An index update invalidates the cached results
+        invalidate_search_cache()
+        self.client.get(url, {"q": "video"})
+        self.assertEqual(search.call_count, 3)
+        self.assertIn("aggs", search.call_args.kwargs["body"])
+        print("--> test_search_videos_cache ok! ")
@@ -1,114 +1,489 @@
 """Esup-Pod Video Search utilities."""
 
 from django.conf import settings
-from elasticsearch import Elasticsearch
-from elasticsearch.exceptions import TransportError
+from elasticsearch import helpers
+from elasticsearch.exceptions import ApiError, TransportError
 from django.utils import translation
+from django.core.cache import cache
+from django.contrib.sites.models import Site
+from sorl.thumbnail import default as thumbnail_default
+from sorl.thumbnail.conf import settings as thumbnail_settings
+from sorl.thumbnail.conf import defaults as thumbnail_defaults
+from sorl.thumbnail.images import ImageFile, deserialize_image_file
+from sorl.thumbnail.kvstores.base import add_prefix
+from sorl.thumbnail.models import KVStore
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from pod.video_search.client import es_request, ES_CONNECTIONS_PER_NODE
 
 import json
 import logging
+import time
 
 logger = logging.getLogger(__name__)
 
 DEBUG = getattr(settings, "DEBUG", True)
 
-ES_URL = getattr(settings, "ES_URL", ["http://elasticsearch.localhost:9200/"])
 ES_INDEX = getattr(settings, "ES_INDEX", "pod")
-ES_TIMEOUT = getattr(settings, "ES_TIMEOUT", 30)
-ES_MAX_RETRIES = getattr(settings, "ES_MAX_RETRIES", 10)
 ES_VERSION = getattr(settings, "ES_VERSION", 8)
-ES_OPTIONS = getattr(settings, "ES_OPTIONS", {})
+ES_BULK_CHUNK_SIZE = getattr(settings, "ES_BULK_CHUNK_SIZE", 500)
+ES_BULK_THREAD_COUNT = getattr(settings, "ES_BULK_THREAD_COUNT", 4)
+ES_INDEX_KEEP_VERSIONS = getattr(settings, "ES_INDEX_KEEP_VERSIONS", 1)
+
+# Cache key storing the name of the index being rebuilt, if any.
+REBUILD_INDEX_CACHE_KEY = "ES_REBUILD_INDEX"
+# Cache key of the version of the cached search results, changed on index updates.
+SEARCH_CACHE_VERSION_KEY = "ES_SEARCH_CACHE_VERSION"
+
+
+def get_search_cache_version() -> int:
+    """Return the current version of the cached search results."""
+    version = cache.get(SEARCH_CACHE_VERSION_KEY)
+    if version is None:
+        version = 1
+        cache.add(SEARCH_CACHE_VERSION_KEY, version, timeout=None)
+    return version
+
+
+def invalidate_search_cache() -> None:
+    """Invalidate the cached search results after an index update."""
+    try:
+        cache.incr(SEARCH_CACHE_VERSION_KEY)
+    except ValueError:
+        cache.set(SEARCH_CACHE_VERSION_KEY, 2, timeout=None)
 
 
 def index_es(video):
     """Get ElasticSearch index."""
     translation.activate(settings.LANGUAGE_CODE)
-    es = Elasticsearch(
-        ES_URL,
-        request_timeout=ES_TIMEOUT,
-        max_retries=ES_MAX_RETRIES,
-        retry_on_timeout=True,
-        **ES_OPTIONS,
-    )
-    if es.ping():
-        try:
-            data = video.get_json_to_index()
-            if data != "{}":
-                res = es.index(index=ES_INDEX, id=video.id, body=data, refresh=True)
-                if DEBUG:
-                    logger.info(res)
-                return res
-        except TransportError as e:
-            logger.error(
-                "An error occured during index creation: %s-%s: %s"
-                % (e.status_code, e.error, e.info)
+    try:
+        data = video.get_json_to_index()
+        if data != "{}":
+            res = es_request(
+                "index",
+                lambda es: es.index(index=ES_INDEX, id=video.id, body=data, refresh=True),
             )
-    else:
-        logger.warning(
-            "Elasticsearch did not responded to ping request at %s. Video %s not indexed."
-            % (ES_URL, video.id)
-        )
-    translation.deactivate()
+            rebuild_index = cache.get(REBUILD_INDEX_CACHE_KEY)
+            if rebuild_index:
+                es_request(
+                    "index",
+                    lambda es: es.index(index=rebuild_index, id=video.id, body=data),
+                )
+            invalidate_search_cache()
+            if DEBUG:
+                logger.info(res)
+            return res
+    except (TransportError, ApiError) as e:
+        logger.error("An error occured during index video %s: %s" % (video.id, e))
+    finally:
+        translation.deactivate()
 
 
 def delete_es(video_id):
     """Delete an Elasticsearch video entry by video id."""
-    es = Elasticsearch(
-        ES_URL,
-        request_timeout=ES_TIMEOUT,
-        max_retries=ES_MAX_RETRIES,
-        retry_on_timeout=True,
-        **ES_OPTIONS,
-    )
-    if es.ping():
-        try:
-            # Pass transport options to elasticsearch
-            es = es.options(ignore_status=[400, 404])
-            # Do the deletion
-            delete = es.delete(index=ES_INDEX, id=video_id, refresh=True)
-            if DEBUG:
-                logger.info(delete)
-            return delete
-        except TransportError as e:
-            logger.error(
-                "An error occured during delete video: %s-%s: %s"
-                % (e.status_code, e.error, e.info)
+    try:
+        # Pass transport options to elasticsearch
+        delete = es_request(
+            "delete",
+            lambda es: es.options(ignore_status=[400, 404]).delete(
+                index=ES_INDEX, id=video_id, refresh=True
+            ),
+        )
+        rebuild_index = cache.get(REBUILD_INDEX_CACHE_KEY)
+        if rebuild_index:
+            es_request(
+                "delete",
+                lambda es: es.options(ignore_status=[400, 404]).delete(
+                    index=rebuild_index, id=video_id
+                ),
             )
+        invalidate_search_cache()
+        if DEBUG:
+            logger.info(delete)
+        return delete
+    except (TransportError, ApiError) as e:
+        logger.error("An error occured during delete video %s: %s" % (video_id, e))
 
 
-def create_index_es():
-    """Create ElasticSearch index."""
-    es = Elasticsearch(
-        ES_URL,
-        request_timeout=ES_TIMEOUT,
-        max_retries=ES_MAX_RETRIES,
-        retry_on_timeout=True,
-        **ES_OPTIONS,
+def get_index_version_name() -> str:
+    """Return the name of a new versioned index, like `pod_v20240131120000`."""
+    return "%s_v%s" % (ES_INDEX, time.strftime("%Y%m%d%H%M%S"))
+
+
+def get_index_versions() -> list:
+    """Return the names of the versioned indices, from the oldest to the newest."""
+    indices = es_request("admin", lambda es: es.indices.get(index="%s_v*" % ES_INDEX))
+    return sorted(indices.keys())
+
+
+def get_aliased_indices() -> list:
+    """Return the names of the indices behind the ES_INDEX alias."""
+    if not es_request("admin", lambda es: es.indices.exists_alias(name=ES_INDEX)):
+        return []
+    aliases = es_request("admin", lambda es: es.indices.get_alias(name=ES_INDEX))
+    return list(aliases.keys())
+
+
+def is_concrete_index() -> bool:
+    """Return True if ES_INDEX is an index created before the use of an alias."""
+    return es_request(
+        "admin",
+        lambda es: es.indices.exists(index=ES_INDEX)
+        and not es.indices.exists_alias(name=ES_INDEX),
     )
+
+
+def create_index_version_es():
+    """Create a new versioned index from the search template, return its name."""
     template_file = "pod/video_search/search_template_fr.json"
     es_template = json.load(open(template_file))
+    index = get_index_version_name()
     try:
-        create = es.indices.create(index=ES_INDEX, body=es_template)  # ignore=[400, 404]
+        create = es_request(
+            "admin", lambda es: es.indices.create(index=index, body=es_template)
+        )
         logger.info(create)
-        return create
+        return index
     except TransportError as e:
         logger.error("An error occured during index creation: %s" % e.message)
+        return None
+
+
+def swap_index_alias_es(index):
+    """Atomically point the ES_INDEX alias to the given index.
+
+    A former index named ES_INDEX (created before the use of an alias)
+    is removed in the same operation.
+    """
+    actions = [
+        {"remove": {"index": old_index, "alias": ES_INDEX}}
+        for old_index in get_aliased_indices()
+        if old_index != index
+    ]
+    if is_concrete_index():
+        actions.append({"remove_index": {"index": ES_INDEX}})
+    actions.append({"add": {"index": index, "alias": ES_INDEX}})
+    swap = es_request("admin", lambda es: es.indices.update_aliases(actions=actions))
+    invalidate_search_cache()
+    logger.info(swap)
+    return swap
+
+
+def delete_old_index_versions_es(keep=ES_INDEX_KEEP_VERSIONS) -> list:
+    """Delete the versioned indices not behind the alias, except the `keep` newest."""
+    aliased_indices = get_aliased_indices()
+    old_indices = [
+        index for index in get_index_versions() if index not in aliased_indices
+    ]
+    old_indices = old_indices[: max(len(old_indices) - keep, 0)]
+    for index in old_indices:
+        logger.info(es_request("admin", lambda es: es.indices.delete(index=index)))
+    return old_indices
+
+
+def create_index_es():
+    """Create ElasticSearch index.
+
+    A new versioned index is created and the ES_INDEX alias points to it.
+    """
+    index = create_index_version_es()
+    if index is None:
+        return False
+    try:
+        return swap_index_alias_es(index)
+    except TransportError as e:
+        logger.error("An error occured during index alias creation: %s" % e.message)
         return False
 
 
 def delete_index_es():
-    """Delete ElasticSearch index."""
-    es = Elasticsearch(
-        ES_URL,
-        request_timeout=ES_TIMEOUT,
-        max_retries=ES_MAX_RETRIES,
-        retry_on_timeout=True,
-        **ES_OPTIONS,
-    )
+    """Delete ElasticSearch index, with all its versions."""
     try:
-        delete = es.indices.delete(index=ES_INDEX)
+        indices = get_index_versions()
+        if is_concrete_index():
+            indices.append(ES_INDEX)
+        if not indices:
+            return False
+        delete = es_request(
+            "admin", lambda es: es.indices.delete(index=",".join(indices))
+        )
         logger.info(delete)
         return delete
     except TransportError as e:
         logger.error("An error occured during index video deletion: %s" % e.message)
         return False
+
+
+def rebuild_index_es(
+    videos, resume_from=0, keep=ES_INDEX_KEEP_VERSIONS, force=False, **kwargs
+):
+    """Rebuild the ES index without search outage.
+
+    The videos are indexed in a new versioned index while the search still
+    uses the current one, then the ES_INDEX alias is atomically swapped
+    to the new index and the old versions are deleted (except the `keep` newest).
+    If some videos were not indexed, the search keeps the current index and
+    the new one is kept to be resumed, unless `force` is True.
+    With `resume_from`, the newest versioned index is filled again
+    after this video id, to resume an interrupted rebuild.
+    Other keyword arguments are given to `bulk_index_es`.
+    """
+    if resume_from and get_index_versions():
+        index = get_index_versions()[-1]
+    else:
+        index = create_index_version_es()
+        resume_from = 0
+    if index is None:
+        return None
+    # Videos saved during the rebuild are indexed in both indices.
+    cache.set(REBUILD_INDEX_CACHE_KEY, index, timeout=None)
+    try:
+        report = bulk_index_es(videos, resume_from=resume_from, index=index, **kwargs)
+        report["swapped"] = force or not report["errors"]
+        if report["swapped"]:
+            swap_index_alias_es(index)
+    finally:
+        cache.delete(REBUILD_INDEX_CACHE_KEY)
+    report["index"] = index
+    report["deleted_indices"] = []
+    if report["swapped"]:
+        report["deleted_indices"] = delete_old_index_versions_es(keep)
+    return report
+
+
+def get_videos_to_index(videos):
+    """Return the queryset of videos with the related objects of their documents.
+
+    The documents of any number of videos are then built
+    with a fixed number of queries.
+    """
+    return (
+        videos.defer(None)
+        .select_related("owner", "type", "thumbnail")
+        .prefetch_related(
+            "tags",
+            "discipline",
+            "channel",
+            "theme",
+            "contributor_set",
+            "chapter_set",
+            "overlay_set",
+        )
+    )
+
+
+def get_thumbnail_name(source, geometry_string, options):
+    """Return the name of a thumbnail, as computed by sorl-thumbnail.
+
+    The public `get_thumbnail` would generate the missing thumbnails, so the
+    name is computed with private methods of the sorl-thumbnail backend.
+    If they are not available (sorl-thumbnail upgrade), None is returned
+    and the thumbnail url is computed by the video.
+    """
+    backend = thumbnail_default.backend
+    try:
+        if thumbnail_settings.THUMBNAIL_PRESERVE_FORMAT:
+            options.setdefault("format", backend._get_format(source))
+        for key, value in backend.default_options.items():
+            options.setdefault(key, value)
+        for key, attr in backend.extra_options:
+            value = getattr(thumbnail_settings, attr)
+            if value != getattr(thumbnail_defaults, attr):
+                options.setdefault(key, value)
+        return backend._get_thumbnail_filename(source, geometry_string, options)
+    except (AttributeError, TypeError) as e:
+        logger.warning("Unable to compute the sorl-thumbnail name: %s" % e)
+        return None
+
+
+def get_thumbnail_urls(videos, size="x720") -> dict:
+    """Return the thumbnail url of the videos, by video id.
+
+    The thumbnails already generated are read in bulk from the sorl-thumbnail
+    key value store, the other videos are not in the result.
+    """
+    keys = {}
+    for video in videos:
+        if video.thumbnail:
+            name = get_thumbnail_name(
+                ImageFile(video.thumbnail.file), size, {"crop": "center", "quality": 80}
+            )
+            if name is None:
+                continue
+            thumbnail = ImageFile(name, thumbnail_default.storage)
+            keys[add_prefix(thumbnail.key)] = video.id
+    kvstore_cache = getattr(thumbnail_default.kvstore, "cache", cache)
+    values = kvstore_cache.get_many(keys.keys())
+    missing_keys = [key for key in keys if not isinstance(values.get(key), str)]
+    values.update(
+        KVStore.objects.filter(key__in=missing_keys).values_list("key", "value")
+    )
+    domain = Site.objects.get_current().domain
+    return {
+        keys[key]: "".join(["//", domain, deserialize_image_file(value).url])
+        for key, value in values.items()
+        if isinstance(value, str)
+    }
+
+
+def get_index_actions(videos, index=ES_INDEX) -> list:
+    """Return the ES bulk actions to index each video of the list."""
+    actions = []
+    thumbnail_urls = get_thumbnail_urls(videos)
+    for video in videos:
+        data = video.get_json_to_index(thumbnail_urls.get(video.id))
+        if data != "{}":
+            actions.append({"_index": index, "_id": video.id, "_source": data})
+    return actions
+
+
+def set_index_refresh_interval(interval, index=ES_INDEX):
+    """Set the refresh interval of the ES index, return the previous one."""
+    index_settings = es_request("admin", lambda es: es.indices.get_settings(index=index))
+    # The settings are given by concrete index, even when `index` is an alias.
+    previous = None
+    for concrete_settings in index_settings.values():
+        previous = (
+            concrete_settings.get("settings", {}).get("index", {}).get("refresh_interval")
+        )
+    es_request(
+        "admin",
+        lambda es: es.indices.put_settings(
+            index=index, body={"index": {"refresh_interval": interval}}
+        ),
+    )
+    return previous
+
+
+def bulk_index_es(
+    videos,
+    chunk_size=ES_BULK_CHUNK_SIZE,
+    thread_count=ES_BULK_THREAD_COUNT,
+    resume_from=0,
+    progress=None,
+    index=ES_INDEX,
+) -> dict:
+    """Index a queryset of videos in ES with the _bulk API.
+
+    Documents are built by chunks of `chunk_size` videos in the calling thread
+    (database access stays in this thread) and sent to ES by a pool of
+    `thread_count` workers sharing the client. The index refresh is disabled
+    during the load and restored at the end.
+    Videos are indexed in `index` by ascending id, starting after `resume_from`.
+    `progress` is called after each chunk with the current report.
+    Return a report with the number of indexed videos, the errors
+    and the last video id of the chunks indexed without error before
+    the first failed one, to resume an interrupted indexation.
+    """
+    translation.activate(settings.LANGUAGE_CODE)
+    if thread_count > ES_CONNECTIONS_PER_NODE:
+        # More workers would only wait for a connection of the client pool.
+        logger.warning(
+            "Bulk workers limited to ES_CONNECTIONS_PER_NODE: %s"
+            % ES_CONNECTIONS_PER_NODE
+        )
+        thread_count = ES_CONNECTIONS_PER_NODE
+    report = {"indexed": 0, "errors": [], "last_id": resume_from, "rate": 0}
+    videos = get_videos_to_index(videos).filter(id__gt=resume_from).order_by("id")
+    start = time.time()
+    previous_interval = set_index_refresh_interval("-1", index)
+    try:
+        with ThreadPoolExecutor(max_workers=thread_count) as executor:
+            pending = deque()
+            chunk = []
+            for video in videos.iterator(chunk_size=chunk_size):
+                chunk.append(video)
+                if len(chunk) == chunk_size:
+                    pending.append(submit_bulk_chunk(executor, chunk, index))
+                    chunk = []
+                if len(pending) >= thread_count:
+                    wait_bulk_chunk(pending.popleft(), report, start, progress)
+            if chunk:
+                pending.append(submit_bulk_chunk(executor, chunk, index))
+            while pending:
+                wait_bulk_chunk(pending.popleft(), report, start, progress)
+    finally:
+        set_index_refresh_interval(previous_interval, index)
+        es_request("admin", lambda es: es.indices.refresh(index=index))
+        invalidate_search_cache()
+        translation.deactivate()
+    return report
+
+
+def submit_bulk_chunk(executor, chunk, index=ES_INDEX) -> tuple:
+    """Build the documents of a chunk of videos and send them to the pool."""
+    actions = get_index_actions(chunk, index)
+    future = executor.submit(
+        es_request,
+        "bulk",
+        lambda es: helpers.bulk(
+            es, actions, chunk_size=len(actions), raise_on_error=False
+        ),
+    )
+    return future, [video.id for video in chunk]
+
+
+def wait_bulk_chunk(pending_chunk, report, start, progress=None) -> None:
+    """Wait for a bulk chunk to be sent to ES and update the report.
+
+    The chunks are waited in the order of the video ids: the last id only
+    moves forward while no chunk has failed, so that resuming from it
+    indexes the failed videos again.
+    """
+    future, video_ids = pending_chunk
+    try:
+        success, errors = future.result()
+        report["indexed"] += success
+    except (TransportError, ApiError) as e:
+        logger.error("An error occured during bulk indexation: %s" % e)
+        errors = [{"index": {"_id": video_id}} for video_id in video_ids]
+    if not report["errors"] and not errors:
+        report["last_id"] = video_ids[-1]
+    report["errors"] += errors
+    report["rate"] = report["indexed"] / max(time.time() - start, 0.001)
+    if progress:
+        progress(report)
+
+
+def update_index_es(videos, video_ids) -> dict:
+    """Update the ES index for a list of video ids, with one bulk request.
+
+    The videos of the `videos` queryset are indexed, the other ids are deleted
+    from the index. Return a report with the number of updated videos
+    and the errors.
+    """
+    translation.activate(settings.LANGUAGE_CODE)
+    videos = list(get_videos_to_index(videos.filter(id__in=video_ids)))
+    indices = [ES_INDEX]
+    rebuild_index = cache.get(REBUILD_INDEX_CACHE_KEY)
+    if rebuild_index:
+        indices.append(rebuild_index)
+    actions = []
+    for index in indices:
+        actions += get_index_actions(videos, index)
+        actions += [
+            {"_op_type": "delete", "_index": index, "_id": video_id}
+            for video_id in set(video_ids) - set(video.id for video in videos)
+        ]
+    report = {"updated": 0, "errors": []}
+    try:
+        report["updated"], errors = es_request(
+            "bulk",
+            lambda es: helpers.bulk(
+                es,
+                actions,
+                chunk_size=ES_BULK_CHUNK_SIZE,
+                raise_on_error=False,
+                refresh=True,
+            ),
+        )
+        # A missing document to delete is not an error.
+        report["errors"] = [
+            error for error in errors if error.get("delete", {}).get("status") != 404
+        ]
+    except (TransportError, ApiError) as e:
+        logger.error("An error occured during index update: %s" % e)
+        report["errors"] = video_ids
+    invalidate_search_cache()
+    translation.deactivate()
+    return report
@@ -1,7 +1,9 @@
 """Pod video_search views."""
 
 from django.shortcuts import render
-from elasticsearch import Elasticsearch
+from elasticsearch.exceptions import ApiError, TransportError
+from pod.video_search.client import es_request
+from pod.video_search.utils import get_search_cache_version
 from pod.video_search.forms import SearchForm
 from django.conf import settings
 from django.contrib import messages
@@ -9,15 +11,17 @@ from pod.video.models import Video
 from pod.main.utils import is_ajax
 from django.utils.translation import gettext_lazy as _
 from django.utils.html import strip_tags
+from django.core.cache import cache
 
-# import json
+import hashlib
+import json
+import logging
+
+logger = logging.getLogger(__name__)
 
-ES_URL = getattr(settings, "ES_URL", ["http://elasticsearch.localhost:9200/"])
 ES_INDEX = getattr(settings, "ES_INDEX", "pod")
-ES_TIMEOUT = getattr(settings, "ES_TIMEOUT", 30)
-ES_MAX_RETRIES = getattr(settings, "ES_MAX_RETRIES", 10)
 ES_VERSION = getattr(settings, "ES_VERSION", 8)
-ES_OPTIONS = getattr(settings, "ES_OPTIONS", {})
+ES_SEARCH_CACHE_TIMEOUT = getattr(settings, "ES_SEARCH_CACHE_TIMEOUT", 300)
 
 
 def get_filter_search(selected_facets, start_date, end_date):
@@ -87,6 +91,110 @@ def get_result_aggregations(result, selected_facets):
     return result["aggregations"]
 
 
+def get_search_aggs() -> dict:
+    """Return the terms aggregations of the search facets."""
+    aggsAttrs = [
+        "owner_full_name",
+        "type.title",
+        "disciplines.title",
+        "tags.name",
+        "channels.title",
+    ]
+    aggs = {}
+    for attr in aggsAttrs:
+        aggs[attr.replace(".", "_")] = {
+            "terms": {
+                "field": attr + ".raw",
+                "size": 5,
+                "order": {"_count": "desc"},
+            }
+        }
+
+    # add cursus and main_lang 'cursus', 'main_lang',
+    aggs["cursus"] = {
+        "terms": {"field": "cursus.keyword", "size": 5, "order": {"_count": "desc"}}
+    }
+    aggs["main_lang"] = {
+        "terms": {"field": "main_lang.keyword", "size": 5, "order": {"_count": "desc"}}
+    }
+    return aggs
+
+
+def get_search_cache_key(name, search_key, page=None) -> str:
+    """Return the cache key of a part of a search result.
+
+    The search words, facets and dates are normalised, so that equivalent
+    searches share their results. The key changes with each index update.
+    """
+    search_word, selected_facets, start_date, end_date = search_key
+    normalised_key = json.dumps(
+        [
+            " ".join(search_word.lower().split()),
+            sorted(set(selected_facets)),
+            start_date,
+            end_date,
+            page,
+        ],
+        default=str,
+    )
+    return "search_%s_%s_%s" % (
+        name,
+        get_search_cache_version(),
+        hashlib.sha256(normalised_key.encode("utf-8")).hexdigest(),
+    )
+
+
+def get_search_results(request, bodysearch, search_key, page) -> tuple:
+    """Return the hits (ids and total) and the aggregations of a search.
+
+    Aggregations are only displayed on the search page, not for the next pages
+    loaded by ajax, and are cached separately from the hits of each page.
+    Elasticsearch is only requested for the missing parts.
+    """
+    selected_facets = search_key[1]
+    aggregations = None
+    if not is_ajax(request):
+        aggregations = cache.get(get_search_cache_key("aggs", search_key))
+        if aggregations is None:
+            bodysearch["aggs"] = get_search_aggs()
+    hits = cache.get(get_search_cache_key("hits", search_key, page))
+    if hits is not None and "aggs" not in bodysearch:
+        return hits, aggregations
+    if hits is not None:
+        # Only the aggregations are needed
+        bodysearch["size"] = 0
+    try:
+        result = es_request(
+            "search", lambda es: es.search(index=ES_INDEX, body=bodysearch)
+        )
+    except (TransportError, ApiError) as e:
+        logger.error("An error occured during video search: %s" % e)
+        messages.error(
+            request, _("The search is unavailable for now, please try again later.")
+        )
+        return {"ids": [], "total": 0}, {}
+    # if settings.DEBUG:
+    #    print(json.dumps(result, indent=4))
+    if hits is None:
+        hits = {
+            "ids": [hit["_id"] for hit in result["hits"]["hits"]],
+            "total": result["hits"]["total"]["value"],
+        }
+        cache.set(
+            get_search_cache_key("hits", search_key, page),
+            hits,
+            timeout=ES_SEARCH_CACHE_TIMEOUT,
+        )
+    if "aggs" in bodysearch:
+        aggregations = get_result_aggregations(result, selected_facets)
+        cache.set(
+            get_search_cache_key("aggs", search_key),
+            aggregations,
+            timeout=ES_SEARCH_CACHE_TIMEOUT,
+        )
+    return hits, aggregations
+
+
 def get_search_page(request) -> int:
     """Return page number to start search from Elasticsearch."""
     page = request.GET.get("page", "0")
@@ -100,21 +208,6 @@ def get_search_page(request) -> int:
 
 def search_videos(request):
     """Send a search request to ES."""
-    es = Elasticsearch(
-        ES_URL,
-        request_timeout=ES_TIMEOUT,
-        max_retries=ES_MAX_RETRIES,
-        retry_on_timeout=True,
-        **ES_OPTIONS,
-    )
-    aggsAttrs = [
-        "owner_full_name",
-        "type.title",
-        "disciplines.title",
-        "tags.name",
-        "channels.title",
-    ]
-
     # SEARCH FORM
     search_word = ""
     start_date = None
@@ -169,7 +262,6 @@ def search_videos(request):
         "from": search_from,
         "size": size,
         "query": {},
-        "aggs": {},
         "highlight": {
             "pre_tags": ["<mark>"],
             "post_tags": ["</mark>"],
@@ -201,33 +293,13 @@ def search_videos(request):
     else:
         bodysearch["query"]["function_score"]["query"] = query
 
-    for attr in aggsAttrs:
-        bodysearch["aggs"][attr.replace(".", "_")] = {
-            "terms": {
-                "field": attr + ".raw",
-                "size": 5,
-                "order": {"_count": "desc"},
-            }
-        }
-
-    # add cursus and main_lang 'cursus', 'main_lang',
-    bodysearch["aggs"]["cursus"] = {
-        "terms": {"field": "cursus.keyword", "size": 5, "order": {"_count": "desc"}}
-    }
-    bodysearch["aggs"]["main_lang"] = {
-        "terms": {"field": "main_lang.keyword", "size": 5, "order": {"_count": "desc"}}
-    }
-
     # if settings.DEBUG:
     #    print(json.dumps(bodysearch, indent=4))
 
-    result = es.search(index=ES_INDEX, body=bodysearch)
-
-    # if settings.DEBUG:
-    #    print(json.dumps(result, indent=4))
+    search_key = (search_word, selected_facets, start_date, end_date)
+    hits, aggregations = get_search_results(request, bodysearch, search_key, page)
 
     remove_selected_facet = get_remove_selected_facet_link(request, selected_facets)
-    aggregations = get_result_aggregations(result, selected_facets)
 
     full_path = (
         request.get_full_path()
@@ -235,12 +307,11 @@ def search_videos(request):
         .replace("&page=%s" % page, "")
     )
 
-    list_videos_id = [hit["_id"] for hit in result["hits"]["hits"]]
-    videos = Video.objects.filter(id__in=list_videos_id)
+    videos = Video.objects.filter(id__in=hits["ids"])
     num_result = 0
     # In case of desynchronization with Elasticsearch, this result could be false.
     # So, don't forget to reindex if necessary
-    num_result = result["hits"]["total"]["value"]
+    num_result = hits["total"]
     videos.has_next = ((page + 1) * size) < num_result
     videos.next_page_number = page + 1
 